@@ -1,18 +1,26 @@
-import pandas as pd
+import os
+from etm_evs.results_query import ResultsDataset
+from etm_evs.mun_maps import GeometryCache, build_geometry_cache, render_small_multiples
 
-# local path, file too big
-results = pd.read_csv('/home/tevito/Documents/EPA/Year2/Q2/SEN9120/vm_results/seed_run/seed_run/EtmEVsModel_1/variables_Municipality.csv', \
-    nrows=1000000)
+# local path, file too big to load at once, so it is aggregated while streaming
+results = ResultsDataset().register(
+    '/home/tevito/Documents/EPA/Year2/Q2/SEN9120/vm_results/seed_run/seed_run/EtmEVsModel_1')
 
-# take one run
-results = results[results['iteration'] == 0]
+# take one run, remove the warm-up (the first week if it was not reported) and calculate per mun
+means = results.scan('Municipality').filter('iteration', '==', 0).trim_warmup('auto', default=672) \
+    .groupby('obj_id').mean().collect()
 
-# remove first week (warm-up)
-results.drop(results[(results['t'] < 672)].index, inplace=True)
-results['t'] = results['t'] - 672
+# save
+means.to_csv('mun_mean.csv')
 
-# calculate per mun
-results = results.groupby('obj_id').mean()
+# simplified municipality geometries are cached once, next to the shapefile
+geometry_cache = '../geo_files/gemeenten_simplified.npz'
+if os.path.exists(geometry_cache):
+    cache = GeometryCache.load(geometry_cache)
+else:
+    cache = build_geometry_cache('../geo_files/gemeentenzonderwater.shp', geometry_cache)
 
-# save
-results.to_csv('mun_mean.csv')
\ No newline at end of file
+# map VTG capacity and power demand per municipality
+for variable in ['current_vtg_capacity', 'current_power_demand']:
+    values = cache.align(means.index, means[variable])
+    render_small_multiples(cache, values[None, :], [variable], '../figures/map_{}.png'.format(variable), ncols=1)
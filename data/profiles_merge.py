@@ -1,29 +1,10 @@
-import pandas as pd
+from etm_evs.results_query import ResultsDataset
 
-# load profile results
-exp1 = pd.read_csv('./profiles/experiment1/variables_EtmEVsModel.csv')
-exp2 = pd.read_csv('./profiles/experiment2/variables_EtmEVsModel.csv')
-exp3 = pd.read_csv('./profiles/experiment3/variables_EtmEVsModel.csv')
+# register profile results as one dataset, samples of experiment n get offset n * 1000
+results = ResultsDataset()
+results.register('./profiles/experiment1', sample_offset=1000)
+results.register('./profiles/experiment2', sample_offset=2000)
+results.register('./profiles/experiment3', sample_offset=3000)
 
-# load samples
-exp1_sample = pd.read_csv('./profiles/experiment1/parameters_sample.csv')
-exp2_sample = pd.read_csv('./profiles/experiment2/parameters_sample.csv')
-exp3_sample = pd.read_csv('./profiles/experiment3/parameters_sample.csv')
-
-# add sample to results
-exp1_t = exp1.merge(exp1_sample, on='sample_id', how='left')
-exp1_t['sample_id'] = exp1_t['sample_id'] + 1000
-exp2_t = exp2.merge(exp2_sample, on='sample_id', how='left')
-exp2_t['sample_id'] = exp2_t['sample_id'] + 2000
-exp3_t = exp3.merge(exp3_sample, on='sample_id', how='left')
-exp3_t['sample_id'] = exp3_t['sample_id'] + 3000
-
-# concat results to 1 file
-results = pd.concat([exp1_t, exp2_t, exp3_t])
-
-# remove first week (warm-up)
-results.drop(results[(results['t'] < 672)].index, inplace=True)
-results['t'] = results['t'] - 672
-
-# save results
-results.to_csv('all_profiles.csv', index=False)
+# remove the warm-up (reported per run, the first week for runs without it), add samples and stream the result to 1 file
+results.scan('EtmEVsModel').trim_warmup('auto', default=672).join_parameters().to_csv('all_profiles.csv')
@@ -1,12 +1,11 @@
-import pandas as pd
+from etm_evs.results_query import ResultsDataset
 
 # load the runs with different seeds
-results = pd.read_csv('seed_run/variables_EtmEVsModel.csv')
+results = ResultsDataset().register('seed_run')
 
-# remove warm-up period
-results.drop(results[(results['t'] < 672)].index, inplace=True)
-results['t'] = results['t'] - 672
+# remove warm-up period and average per run
+means = results.scan('EtmEVsModel').trim_warmup('auto', default=672).groupby('iteration').mean().collect()
 
 # get stats and save as LaTex table
-stats = results.groupby('iteration').mean().describe()
+stats = means.describe()
 stats.to_latex('seed_table.tex')
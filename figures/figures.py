@@ -1,5 +1,5 @@
 import pandas as pd
-from model import EtmEVsModel
+from etm_evs.model import EtmEVsModel
 
 parameters = {
     'steps': 96 * 1,
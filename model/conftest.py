@@ -0,0 +1,31 @@
+import json
+import pytest
+from etm_evs import PARAMS
+from etm_evs.data_providers import SyntheticDataProvider
+from etm_evs.model import EtmEVsModel
+
+
+@pytest.fixture
+def make_params():
+    """params.json of the package on a synthetic region of n_municipalities, with overrides"""
+    def make(n_municipalities=4, **overrides):
+        with open(PARAMS) as file:
+            params = json.load(file)
+        params['data'] = SyntheticDataProvider(n_municipalities=n_municipalities)
+        params.update(overrides)
+        return params
+    return make
+
+@pytest.fixture
+def params(make_params):
+    """four days of hourly ticks of 200 EVs, half of them smart, in six municipalities"""
+    return make_params(6, n_evs=200, steps=96, seed=3, tick_minutes=60, p_smart=0.5)
+
+@pytest.fixture
+def run():
+    """runs a model (EtmEVsModel by default) of params and returns it"""
+    def run_model(params, model_class=EtmEVsModel):
+        model = model_class(params)
+        model.run(display=False)
+        return model
+    return run_model
@@ -1,7 +1,31 @@
+import numpy as np
 from ema_workbench import (Model, RealParameter,
-                           ScalarOutcome,  
+                           ScalarOutcome, TimeSeriesOutcome, ArrayOutcome,
                            Constant, IntegerParameter)
-from model import EtmEVsModel
+from ema_workbench.em_framework.callbacks import DefaultCallback
+from etm_evs.model import EtmEVsModel
+from etm_evs.ema_outcomes import MUNICIPALITY_SERIES, ResolvingCallback, series_names
+
+
+class SeriesCallback(ResolvingCallback, DefaultCallback):
+    """stores spilled time series outcomes (see ema_outcomes.py) in the float32 result arrays"""
+
+
+def add_series_outcomes(model, series=True, spill=None):
+    """
+    adds time series outcomes (names of ema_outcomes.SERIES and MUNICIPALITY_SERIES, True for the
+    model level series) to a problem, with spill a directory for the spill files of the workers;
+    run with perform_experiments(..., callback=SeriesCallback)
+    """
+    names = series_names(series)
+    model.constants = list(model.constants) + [Constant('series_outcomes', ','.join(names))]
+    if spill is not None:
+        model.constants = list(model.constants) + [Constant('series_spill', spill)]
+    model.outcomes = list(model.outcomes) + [
+        ArrayOutcome(name, dtype=np.float32) if name in MUNICIPALITY_SERIES else TimeSeriesOutcome(name, dtype=np.float32)
+        for name in names]
+    return model
+
 
 def ema_problem(problem):
     
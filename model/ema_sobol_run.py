@@ -1,11 +1,9 @@
-from ema_workbench import (MultiprocessingEvaluator,SequentialEvaluator, ema_logging, save_results, load_results)
-from SALib.analyze import sobol
-from ema_workbench.em_framework.evaluators import SOBOL
-from ema_workbench.em_framework.salib_samplers import get_SALib_problem
+import os
+from ema_workbench import MultiprocessingEvaluator, ema_logging
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 from ema_problem_definitions import ema_problem
+from etm_evs.data_providers import DATA_DIRECTORY
+from etm_evs.sobol_stream import StreamingSobol, ema_evaluate
 
 ema_logging.LOG_FORMAT = '%(message)s'
 ema_logging.log_to_stderr(ema_logging.INFO)
@@ -13,7 +11,11 @@ ema_logging.log_to_stderr(ema_logging.INFO)
 # import problem definition
 model = ema_problem(2)
 
+# indices are updated per batch of base samples, sampling stops once all confidence
+# intervals (95%) are within +-0.05, the state file allows an interrupted study to resume
+sobol = StreamingSobol.from_ema_model(model, seed=650, path=os.path.join(DATA_DIRECTORY, 'ema', 'sobol_state.npz'))
+
 with MultiprocessingEvaluator(model) as evaluator:
-    experiment_SOBOL, outcomes_SOBOL = evaluator.perform_experiments(scenarios = 650, uncertainty_sampling=SOBOL)
+    indices = sobol.run(ema_evaluate(evaluator), threshold=0.05, batch_size=32, max_base=650)
 
-sobol_results = save_results((experiment_SOBOL, outcomes_SOBOL), '../data/ema/sobol_results.tar.gz')
+pd.concat(indices, names=['outcome', 'parameter']).to_csv(os.path.join(DATA_DIRECTORY, 'ema', 'sobol_indices.csv'))
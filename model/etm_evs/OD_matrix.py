@@ -1,9 +1,14 @@
-import pandas as pd
+from .lazy_imports import lazy_module
+from .data_providers import data_provider
 
+pd = lazy_module('pandas')
 
-def generate_OD(g, m):
-    OD = pd.read_csv("../data/afstand7.csv", sep=";")
-    gemeenten = pd.read_csv('../data/gemeenten.csv')
+
+def generate_OD(g, m, data=None):
+    """OD matrix as a dict of DataFrames (destination_id, p_flow, distance) per origin, data is a provider or path"""
+    data = data_provider(data)
+    OD = data.distances()
+    gemeenten = data.municipalities()
 
     OD = pd.merge(how='left', left=OD, right=gemeenten, left_on='origin_id', right_on='GM_CODE')
     OD = OD[['origin_id', 'destination_id', 'GM_NAAM', 'total_cost', 'AANT_INW']]
@@ -13,17 +18,15 @@ def generate_OD(g, m):
     OD = OD[['origin_id', 'destination_id', 'origin','destination', 'total_cost','INW_origin','INW_destination']]
     # Computed distances used rijksdriehoekscoordinates, so distances in meters
     # Will be converted to KM.
-    OD['distance'] = OD['total_cost'].fillna(0).apply(lambda x: x/1000)
-    OD[['origin_id','destination_id','origin','destination','distance','INW_origin','INW_destination']]
-
+    OD['distance'] = OD['total_cost'].fillna(0) / 1000
 
-    OD['flow'] = OD.apply(lambda row: g * ((row['INW_origin'] * row['INW_destination']) / (row['distance']**m) if row['distance'] != 0 else 0), axis=1)
-    #OD = OD.pivot(index='origin_id', columns='destination_id', values='distance')
+    # python floats instead of numpy arrays, numpy's power differs from python's in the last bit
+    OD['flow'] = [g * ((inw_origin * inw_destination) / (distance ** m)) if distance != 0 else 0
+                  for inw_origin, inw_destination, distance in
+                  zip(OD['INW_origin'].tolist(), OD['INW_destination'].tolist(), OD['distance'].tolist())]
     OD['sum_flow'] = OD.groupby('origin')['flow'].transform('sum')
     OD['p_flow'] = OD['flow'] / OD['sum_flow'] * 100
     OD = dict(tuple(OD[['origin_id','destination_id','p_flow', 'distance']].groupby('origin_id')))
     for key, index in OD.items():
         index.drop('origin_id', axis=1, inplace=True)
     return OD
-
-
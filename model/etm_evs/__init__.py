@@ -0,0 +1,14 @@
+import os
+
+"""
+Agent based model of the charging of electric vehicles and the vehicle to grid
+capacity they offer, per municipality of the Netherlands
+
+The model is etm_evs.model.EtmEVsModel, the command line is etm_evs.cli (the
+etm-evs command of the installed package). Importing the package itself does
+not import agentpy or the other dependencies of the model.
+"""
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# default parameters of the model
+PARAMS = os.path.join(PACKAGE_DIRECTORY, 'params.json')
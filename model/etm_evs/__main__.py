@@ -0,0 +1,4 @@
+from .cli import main
+
+# python -m etm_evs, the command line without installing the package
+main()
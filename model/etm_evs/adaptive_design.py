@@ -0,0 +1,240 @@
+import argparse
+import itertools
+from timeit import default_timer as timer
+import numpy as np
+from scipy.interpolate import LinearNDInterpolator
+from scipy.spatial import Delaunay, cKDTree
+from scipy.spatial.distance import pdist
+from scipy.stats import qmc
+from .lazy_imports import lazy_module
+from .fanout import OUTCOME_ONLY, run_profiles
+
+pd = lazy_module('pandas')
+
+"""
+Adaptive experimental design over a scenario grid
+
+scenarios_full.csv enumerates every combination of the levels of
+VTG_percentage, p_smart and pref_home. AdaptiveDesign runs a subset of
+those rows: the corners of the grid and a Latin hypercube snapped to the
+grid, then in every iteration the points of the grid nearest to the centres
+(or the midpoints of the longest edges) of the Delaunay simplices of the run
+points with the largest error estimate. The error estimate of a simplex is
+the change of the outcome over its vertices relative to the range of all
+outcomes, times its longest edge (in coordinates scaled to the unit cube). A
+simplex whose vertices lie on both sides of a threshold (e.g. a capacity
+limit for max_power_demand) counts as the full range, so the boundary of the
+threshold is refined first.
+
+Outcome-only parameters (fanout.OUTCOME_ONLY, VTG_percentage) do not take
+part in the triangulation: every run point is run for all their levels of
+the grid with the fan-out, at the cost of one model run. The design and the
+results are rows of the scenario csv and of fanout.run_profiles, so the
+analysis scripts read them like the full grid; emulate interpolates an
+outcome for the rows that were not run.
+
+Usage, from the model directory:
+python -m etm_evs.adaptive_design ../data/scenarios_full.csv scenarios_adaptive.csv results_adaptive.csv
+    --outcome max_power_demand --threshold 9000 --budget 14 --set n_evs=1000 steps=192
+"""
+
+
+def grid_factors(scenarios):
+    """names of the columns of a scenario grid that vary"""
+    return [name for name in scenarios.columns if scenarios[name].nunique() > 1]
+
+
+class AdaptiveDesign:
+    """subset of the points of a scenario grid that is refined where an outcome changes"""
+
+    def __init__(self, scenarios, outcome, threshold=None, run=None, seed=0):
+        self.scenarios = scenarios.reset_index(drop=True)
+        self.outcome = outcome
+        self.threshold = threshold
+        # function from a list of parameter dicts to the DataFrame of run_profiles
+        self.run_profiles = run if run is not None else run_profiles
+        self.seed = seed
+        factors = grid_factors(self.scenarios)
+        self.outcome_only = [name for name in factors if name in OUTCOME_ONLY]
+        self.factors = [name for name in factors if name not in OUTCOME_ONLY]
+        if not self.factors:
+            raise ValueError('the scenarios only vary in outcome-only parameters, one run covers them')
+        # points of the grid (combinations of the factors) and their rows, ordered by the outcome-only values
+        values = self.scenarios[self.factors].to_numpy(dtype=float)
+        points, inverse = np.unique(values, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.lexsort(self.scenarios[self.outcome_only].to_numpy(dtype=float).T[::-1]) \
+            if self.outcome_only else np.arange(len(self.scenarios))
+        self.rows = [order[inverse[order] == point] for point in range(len(points))]
+        low = points.min(axis=0)
+        span = points.max(axis=0) - low
+        self.coordinates = (points - low) / np.where(span > 0, span, 1)
+        self.tree = cKDTree(self.coordinates)
+        self.outcomes = np.full(len(self.scenarios), np.nan)
+        self.done = []
+        self.results = []
+        # runs and largest error estimate after every iteration
+        self.history = []
+
+    def nearest(self, coordinates):
+        """grid point nearest to scaled coordinates"""
+        return int(self.tree.query(coordinates)[1])
+
+    def initial_design(self, n):
+        """the corners of the grid and n points of a Latin hypercube, snapped to the grid"""
+        d = len(self.factors)
+        corners = np.array(list(itertools.product([0, 1], repeat=d)), dtype=float)
+        sample = qmc.LatinHypercube(d, seed=self.seed).random(n) if n else np.empty((0, d))
+        points = []
+        for coordinates in np.vstack([corners, sample]):
+            point = self.nearest(coordinates)
+            if point not in points:
+                points.append(point)
+        return points
+
+    def run_points(self, points):
+        """runs the scenarios of the grid points, each point with all its outcome-only values in one model run"""
+        rows = np.concatenate([self.rows[point] for point in points])
+        results = self.run_profiles(self.scenarios.loc[rows].to_dict(orient='records'))
+        results.index = rows
+        self.results.append(results)
+        self.outcomes[rows] = results[self.outcome].to_numpy(dtype=float)
+        self.done.extend(points)
+
+    def simplices(self):
+        """simplices of the Delaunay triangulation of the run points, as arrays of grid points"""
+        done = np.array(self.done)
+        if len(self.factors) == 1:
+            order = done[np.argsort(self.coordinates[done, 0])]
+            return [order[i:i + 2] for i in range(len(order) - 1)]
+        return [done[simplex] for simplex in Delaunay(self.coordinates[done]).simplices]
+
+    def scale(self):
+        """range of the outcomes of the run points"""
+        observed = self.outcomes[~np.isnan(self.outcomes)]
+        span = observed.max() - observed.min() if len(observed) else 0
+        return span if span > 0 else 1
+
+    def score(self, simplex):
+        """error estimate of a simplex"""
+        values = [self.outcomes[self.rows[point]] for point in simplex]
+        # outcomes per outcome-only value (columns) where every vertex has the same values
+        block = np.vstack(values) if len({len(v) for v in values}) == 1 else np.concatenate(values)[:, None]
+        change = np.nanmax(np.nanmax(block, axis=0) - np.nanmin(block, axis=0)) / self.scale()
+        if self.threshold is not None and np.any((block > self.threshold).any(axis=0) &
+                                                 (block <= self.threshold).any(axis=0)):
+            change = 1.0
+        return change * pdist(self.coordinates[simplex]).max()
+
+    def candidates(self, simplex):
+        """grid points nearest to the centre of a simplex and to the midpoints of its edges, longest first"""
+        vertices = self.coordinates[simplex]
+        edges = sorted(itertools.combinations(range(len(simplex)), 2),
+                       key=lambda edge: -np.linalg.norm(vertices[edge[0]] - vertices[edge[1]]))
+        for coordinates in [vertices.mean(axis=0)] + [(vertices[i] + vertices[j]) / 2 for i, j in edges]:
+            yield self.nearest(coordinates)
+
+    def refine(self, batch, tolerance=0.0):
+        """up to batch new grid points from the simplices with the largest error estimate above tolerance"""
+        scored = sorted(((self.score(simplex), simplex) for simplex in self.simplices()), key=lambda item: -item[0])
+        points = []
+        largest = scored[0][0] if scored else 0
+        for score, simplex in scored:
+            if len(points) == batch or score <= tolerance:
+                break
+            for point in self.candidates(simplex):
+                if point not in self.done and point not in points:
+                    points.append(point)
+                    break
+        return points, largest
+
+    def run(self, budget, initial=None, batch=4, tolerance=0.0):
+        """
+        runs the initial design (initial Latin hypercube points, the factors
+        + 1 by default) and refines it until budget model runs, until no
+        simplex has an error estimate above tolerance or until every point of
+        the simplices to refine has been run
+        """
+        initial = len(self.factors) + 1 if initial is None else initial
+        self.run_points(self.initial_design(initial)[:budget])
+        while len(self.done) < budget:
+            points, largest = self.refine(min(batch, budget - len(self.done)), tolerance)
+            self.history.append({'runs': len(self.done), 'largest_error': largest})
+            if not points:
+                break
+            self.run_points(points)
+        return self
+
+    def design(self):
+        """the rows of the scenarios that were run, in the order of the grid"""
+        return self.scenarios.loc[np.sort(np.concatenate([self.rows[point] for point in self.done]))]
+
+    def results_frame(self):
+        """parameters and reporters of the rows that were run, in the order of the grid"""
+        return pd.concat(self.results).sort_index()
+
+    def emulate(self, outcome=None):
+        """
+        outcome for every row of the scenarios, interpolated linearly between
+        the run points for every outcome-only value
+        """
+        outcome = self.outcome if outcome is None else outcome
+        if len({len(rows) for rows in self.rows}) != 1:
+            raise ValueError('emulating needs the same outcome-only values for every point of the grid')
+        results = self.results_frame()
+        values = np.full(len(self.scenarios), np.nan)
+        values[results.index] = results[outcome].to_numpy(dtype=float)
+        done = np.array(self.done)
+        rows = np.vstack(self.rows)
+        for column in range(rows.shape[1]):
+            known = values[rows[done, column]]
+            if len(self.factors) == 1:
+                order = np.argsort(self.coordinates[done, 0])
+                estimate = np.interp(self.coordinates[:, 0], self.coordinates[done[order], 0], known[order])
+            else:
+                estimate = LinearNDInterpolator(self.coordinates[done], known)(self.coordinates)
+            values[rows[:, column]] = estimate
+        values[results.index] = results[outcome].to_numpy(dtype=float)
+        return pd.Series(values, index=self.scenarios.index, name=outcome)
+
+
+def main():
+    from .cli import parse_overrides, worker_context
+    parser = argparse.ArgumentParser(description='Run a scenario grid adaptively, refined where an outcome changes')
+    parser.add_argument('scenarios', help='csv with one scenario per row, e.g. ../data/scenarios_full.csv')
+    parser.add_argument('design', help='csv with the scenarios that were run')
+    parser.add_argument('output', help='csv with the parameters and reporters per scenario that was run')
+    parser.add_argument('--outcome', default='max_power_demand')
+    parser.add_argument('--threshold', type=float, help='refine where the outcome crosses this value first')
+    parser.add_argument('--budget', type=int, default=20, help='model runs')
+    parser.add_argument('--initial', type=int, help='Latin hypercube points besides the corners')
+    parser.add_argument('--batch', type=int, default=4, help='model runs per iteration')
+    parser.add_argument('--tolerance', type=float, default=0.0, help='stop when no error estimate exceeds this')
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes, -1 for all cores')
+    parser.add_argument('--set', nargs='*', default=[], help='parameter overrides for every scenario, name=value')
+    parser.add_argument('--reference', help='results of the full grid, to report the error of the emulated outcome')
+    args = parser.parse_args()
+    scenarios = pd.read_csv(args.scenarios).assign(**parse_overrides(args.set))
+    context = worker_context() if args.jobs != 1 else None
+    design = AdaptiveDesign(scenarios, args.outcome, args.threshold,
+                            run=lambda profiles: run_profiles(profiles, args.jobs, context))
+    start = timer()
+    design.run(args.budget, args.initial, args.batch, args.tolerance)
+    print('{} of {} model runs ({} of {} scenarios) in {:.1f} seconds'.format(
+        len(design.done), len(design.rows), len(design.design()), len(scenarios), timer() - start))
+    design.design().to_csv(args.design, index=False)
+    design.results_frame().to_csv(args.output, index=False)
+    if args.reference:
+        reference = pd.read_csv(args.reference)[args.outcome].to_numpy(dtype=float)
+        emulated = design.emulate().to_numpy()
+        error = np.abs(emulated - reference)
+        print('emulated {}: mean absolute error {:.4g}, largest {:.4g} (range {:.4g})'.format(
+            args.outcome, error.mean(), error.max(), np.ptp(reference)))
+        if args.threshold is not None:
+            agree = (emulated > args.threshold) == (reference > args.threshold)
+            print('above the threshold: {} of {} scenarios classified as in the full grid'.format(
+                agree.sum(), len(agree)))
+
+
+if __name__ == '__main__':
+    main()
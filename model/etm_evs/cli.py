@@ -0,0 +1,182 @@
+import argparse
+import importlib.metadata
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+from . import PACKAGE_DIRECTORY, PARAMS
+
+"""
+Command line entry point of the model
+
+Works from any directory, the default parameters are the params.json of the
+package. With the package installed (pip install -e . in the repository) the
+command is etm-evs, otherwise python -m etm_evs from the model directory.
+
+etm-evs run [--params params.json] [--set n_evs=2000 steps=672] [--log model.log]
+etm-evs sweep ../data/scenarios_full.csv results.csv [--jobs -1]
+etm-evs bench [--n_evs 2000] [--steps 672] [--workers 4]
+etm-evs replay 1000003 [--set n_evs=174000] [--output trace.csv] [--log model.log --debug]
+
+Sweep workers of an installed package are started from a forkserver that has
+already imported the model (where the platform supports it), so a worker does
+not pay the import of agentpy and its dependencies again.
+"""
+
+# directory that contains the package, new interpreters import it from there
+SOURCE_DIRECTORY = os.path.dirname(PACKAGE_DIRECTORY)
+
+
+def installed():
+    """whether the package is installed, so that new interpreters import it from any directory"""
+    try:
+        importlib.metadata.distribution('etm-evs')
+    except importlib.metadata.PackageNotFoundError:
+        return False
+    return True
+
+
+def worker_context(preload=('etm_evs.model',)):
+    """multiprocessing context whose workers start with the preload modules imported"""
+    # the forkserver does not get sys.path of this process, it only finds an installed package
+    if installed() and 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(list(preload))
+        return context
+    return multiprocessing.get_context()
+
+
+def parse_overrides(overrides):
+    """parameters from name=value pairs (values are json)"""
+    params = {}
+    for override in overrides:
+        name, value = override.split('=', 1)
+        try:
+            params[name] = json.loads(value)
+        except ValueError:
+            params[name] = value
+    return params
+
+
+def read_params(path, overrides=()):
+    """parameters from a json file, overridden by name=value pairs (values are json)"""
+    with open(path) as file:
+        params = json.load(file)
+    params.update(parse_overrides(overrides))
+    return params
+
+
+def run(args):
+    from .model import EtmEVsModel
+    model = EtmEVsModel(read_params(args.params, args.set))
+    start = timer()
+    model.run(display=False)
+    reporters = {name: value.tolist() if hasattr(value, 'tolist') else value
+                 for name, value in model.reporters.items()}
+    reporters['run_time'] = timer() - start
+    print(json.dumps(reporters, indent=1, default=str))
+
+
+def sweep(args):
+    import pandas as pd
+    from .fanout import group_profiles, run_profiles
+    profiles = pd.read_csv(args.scenarios).to_dict(orient='records')
+    print('{} scenarios, {} model runs'.format(len(profiles), len(group_profiles(profiles))))
+    start = timer()
+    run_profiles(profiles, args.jobs, worker_context()).to_csv(args.output, index=False)
+    print('completed in {:.1f} seconds'.format(timer() - start))
+
+
+def replay(args):
+    import pandas as pd
+    from .replay import replay as replay_evs
+    start = timer()
+    trace = replay_evs(read_params(args.params, args.set), args.keys, 'DEBUG' if args.debug else None)
+    if args.output:
+        trace.to_csv(args.output, index=False)
+    else:
+        with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.max_rows', None):
+            print(trace.to_string(index=False))
+    print('replayed {} EVs over {} ticks in {:.1f} seconds'.format(
+        trace['key'].nunique(), trace['t'].nunique(), timer() - start))
+
+
+def import_time():
+    """seconds to import the model in a new interpreter, and the part of it spent in agentpy"""
+    code = ('from timeit import default_timer as timer; start = timer(); import agentpy; middle = timer(); '
+            'import etm_evs.model; print(middle - start, timer() - middle)')
+    output = subprocess.run([sys.executable, '-c', code], cwd=SOURCE_DIRECTORY, capture_output=True, text=True,
+                            check=True).stdout.split()
+    return float(output[0]), float(output[1])
+
+
+def _ready(_):
+    from . import model  # already imported in preloaded workers
+    return os.getpid()
+
+
+def spawn_time(context, workers):
+    """seconds until all workers of a pool have imported the model"""
+    start = timer()
+    with ProcessPoolExecutor(workers, mp_context=context) as executor:
+        list(executor.map(_ready, range(workers)))
+    return timer() - start
+
+
+def bench(args):
+    agentpy_seconds, model_seconds = import_time()
+    print('import: agentpy {:.2f} s, model modules {:.3f} s'.format(agentpy_seconds, model_seconds))
+    print('{} workers, seconds until all imported the model: spawn {:.2f} s'.format(
+        args.workers, spawn_time(multiprocessing.get_context('spawn'), args.workers)))
+    context = worker_context()
+    # the first pool also starts the forkserver, later pools fork from it
+    print('{} workers, preloaded: first pool {:.2f} s, next pool {:.2f} s'.format(
+        args.workers, spawn_time(context, args.workers), spawn_time(context, args.workers)))
+    from .model import EtmEVsModel
+    params = read_params(args.params, args.set)
+    params.update(n_evs=args.n_evs, steps=args.steps)
+    model = EtmEVsModel(params)
+    start = timer()
+    model.sim_setup()
+    setup = timer() - start
+    start = timer()
+    while model.running:
+        model.sim_step()
+    steps = timer() - start
+    print('{} EVs: setup {:.2f} s, {} steps {:.2f} s ({:.1f} ms per step)'.format(
+        len(model.EVs), setup, args.steps, steps, 1000 * steps / args.steps))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run, sweep or benchmark the EV model')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run one model and print its reporters')
+    sweep_parser = commands.add_parser('sweep', help='run every row of a scenario csv')
+    sweep_parser.add_argument('scenarios', help='csv with one scenario per row')
+    sweep_parser.add_argument('output', help='csv with the parameters and reporters per scenario')
+    sweep_parser.add_argument('--jobs', type=int, default=-1, help='worker processes, -1 for all cores')
+    bench_parser = commands.add_parser('bench', help='import, worker start, setup and step times')
+    bench_parser.add_argument('--n_evs', type=int, default=2000)
+    bench_parser.add_argument('--steps', type=int, default=672)
+    bench_parser.add_argument('--workers', type=int, default=4)
+    replay_parser = commands.add_parser('replay', help='per tick trace of some EVs of a run, re-simulated alone')
+    replay_parser.add_argument('keys', type=int, nargs='+', help='EV keys')
+    replay_parser.add_argument('--output', help='csv of the trace, printed without it')
+    replay_parser.add_argument('--debug', action='store_true', help='debug messages of these EVs in the log file')
+    for command in [run_parser, bench_parser, replay_parser]:
+        command.add_argument('--params', default=PARAMS)
+        command.add_argument('--set', nargs='*', default=[], help='parameter overrides, name=value')
+        command.add_argument('--log', help='file for the model log, no log file without it')
+    args = parser.parse_args()
+    if getattr(args, 'log', None):
+        logging.basicConfig(filename=args.log, filemode='w', format='%(name)s - %(levelname)s - %(message)s',
+                            level=logging.INFO)
+    {'run': run, 'sweep': sweep, 'bench': bench, 'replay': replay}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+import argparse
+import json
+import logging
+import math
+from timeit import default_timer as timer
+import numpy as np
+import agentpy as ap
+from . import PARAMS
+from .lazy_imports import lazy_module
+from .components import EV, Municipality, draw_ev_attributes
+from .fleet import ChargePref, Location, NO_TIME
+from .fleet_kernels import FleetKernels, MIN_CHUNK, STATE_FIELDS
+from .model import EtmEVsModel
+from .OD_matrix import generate_OD
+from .rng import Purpose
+from .warmup import WarmupDetector
+
+pd = lazy_module('pandas')
+
+"""
+Mean-field cohort engine
+
+CohortModel runs the model without EV agents. The fleet is a set of cohorts,
+each standing for a weight of EVs. A cohort holds the state of an EV
+(location, battery, departure and return times, charging deadline,
+plugged_in, smart, charge_pref, stick_to_pref) in the arrays of
+fleet_kernels.FleetKernels and is stepped by the same kernels, so it follows
+the rules of EV.step, charge, discharge and determine_power_demand. The random
+draws of a tick are not drawn. Every cohort that meets one is split into a
+cohort per outcome, weighted by its probability:
+
+- weekend departures: stay (1 - weekend_week_ratio) or leave
+- arrivals: stick_to_pref (pref_strictness) or not
+- arrivals home: every departure and dwell offset of their distribution
+
+After every tick the cohorts of a class with the same state whose batteries
+fall in the same bin (cohort_soc_bin kWh) are merged into their weighted
+mean; state that is no longer read (the times of finished trips, passed
+cheapest timesteps) does not keep cohorts apart. The cohorts are thus a
+histogram over location, state of charge and deadline per class.
+
+A class is one municipality pair with its commute distance and a set of setup
+draws. The cohort_classes classes (default 100) are a systematic sample of
+the municipality pairs, in proportion to their EV flows and ordered by
+distance, with a Latin hypercube over departure, dwell time, battery volume and
+energy rate (fleet_sampling='lhs'). Each class is split by the probabilities of
+smart charging, charging preference and the setup offsets. The run time
+depends on the classes and the states they branch into (most of them smart
+EVs with their own cheapest timesteps), not on n_evs. With the default classes
+it is faster than the agent model with kernels from about 30000 EVs.
+
+The reporters are those of EtmEVsModel.end. paired_runs, calibrate and
+validate compare them with the agent model, and the parameter
+cohort_calibration (a dict or json file of outcome: [a, b]) reports
+a + b * value instead of value.
+
+Usage, from the model directory:
+python -m etm_evs.cohort_model --n_evs 2000 --days 7 --scenarios 8 --output cohort_calibration.json
+"""
+
+# parameters of EtmEVsModel that need agents or municipalities
+UNSUPPORTED = ['event_log', 'series_outcomes', 'fanout', 'region', 'kernels', 'fleet_cache', 'warm_start',
+               'save_steady_state', 'subfleet', 'telemetry', 'replay', 'trace']
+# outcomes of a split draw, the arrays of a cohort besides STATE_FIELDS
+FORCED_FIELDS = ['forced_stay', 'forced_stick', 'forced_offset_dep', 'forced_offset_dwell']
+COHORT_FIELDS = STATE_FIELDS + ['weight'] + FORCED_FIELDS
+# state that must be equal for cohorts to merge, besides the class, the battery bin, the deadline and the state
+# that only matters in some locations (see CohortKernels.merge_key)
+MERGE_FIELDS = ['location', 'departure_time', 'offset_dep', 'smart', 'charge_pref', 'plugged_in', 'force_charge']
+# continuous state of merged cohorts, their weighted mean
+MEAN_FIELDS = ['current_battery_volume', 'battery_percentage', 'battery_level_at_charging_start',
+               'needed_battery_level_at_charging_end']
+OUTCOMES = ['min_average_battery_percentage', 'mean_average_battery_percentage', 'min_power_demand',
+            'mean_power_demand', 'max_power_demand', 'min_VTG_capacity', 'mean_VTG_capacity', 'max_VTG_capacity',
+            'min_mean_charging', 'mean_mean_charging', 'max_mean_charging']
+# scenario parameters of the calibration design and their ranges (the real uncertainties of ema_problem(1))
+SCENARIO_RANGES = {'p_smart': (0, 1), 'weekend_week_ratio': (0, 1), 'p_pref': (0, 1), 'pref_home': (0, 1),
+                   'pref_strictness': (0, 1), 'VTG_percentage': (0, 1)}
+# odd multipliers of the two 64 bit hashes of the merge key, for its columns and the cheapest timesteps
+HASH = np.random.default_rng(0).integers(1, 2 ** 62, size=(2, 4096)) | 1
+
+
+def offset_pmf(offset, tick_scale, resolution=100000):
+    """
+    [(value, probability)] of the offsets in ticks that EV.step draws,
+    round(int(uniform(-offset, offset)) / tick_scale)
+    """
+    u = (np.arange(resolution) + 0.5) / resolution
+    values = np.round(np.trunc(-offset + 2 * offset * u) / tick_scale).astype(np.int64)
+    found, counts = np.unique(values, return_counts=True)
+    return [(int(value), count / resolution) for value, count in zip(found, counts)]
+
+
+def outcomes_of(probability):
+    """[(True, probability), (False, 1 - probability)] without impossible outcomes"""
+    probability = min(max(float(probability), 0.0), 1.0)
+    return [(value, p) for value, p in [(True, probability), (False, 1 - probability)] if p > 0]
+
+
+class CohortKernels(FleetKernels):
+    """FleetKernels over weighted cohorts, draws are split into a cohort per outcome"""
+
+    def __init__(self, model, state, soc_bin=1.0, threads=1, chunk_size='auto'):
+        self.soc_bin = float(soc_bin)
+        super().__init__(model, state, threads, chunk_size)
+        self.offsets = {name: offset_pmf(model.p[name], model.tick_scale) for name in ('offset_dep', 'offset_dwell')}
+        # the number of cohorts changes every tick, auto splits them evenly over the threads
+        self.tuner = None
+        if chunk_size == 'auto':
+            self.size = None
+
+    def chunk_size(self):
+        return self.size or max(MIN_CHUNK, math.ceil(self.n / self.threads))
+
+    def cohort_state(self):
+        return {name: getattr(self, name) for name in COHORT_FIELDS}
+
+    def split(self, mask, field, outcomes):
+        """copies of the cohorts where mask for every (value, probability) of field"""
+        rows = np.flatnonzero(mask)
+        if not len(rows) or (len(outcomes) == 1 and outcomes[0][1] == 1):
+            if len(rows):
+                getattr(self, field)[rows] = outcomes[0][0]
+            return
+        keep = np.flatnonzero(~mask)
+        take = np.concatenate([keep] + [rows] * len(outcomes))
+        state = {name: values[take] for name, values in self.cohort_state().items()}
+        state['weight'] = state['weight'] * np.concatenate(
+            [np.ones(len(keep))] + [np.full(len(rows), probability) for _, probability in outcomes])
+        state[field][len(keep):] = np.concatenate([np.full(len(rows), value) for value, _ in outcomes])
+        self.set_state(state)
+
+    def split_draws(self, t):
+        """splits the cohorts that draw in tick t, with the conditions of FleetKernels.move"""
+        model = self.model
+        if model.weekend:
+            leave_home = (self.location == Location.HOME) & (t % (self.departure_time + self.offset_dep) == 0)
+            self.split(leave_home, 'forced_stay', outcomes_of(1 - model.p.weekend_week_ratio))
+        self.split(self.arriving(t), 'forced_stick', outcomes_of(model.p.pref_strictness))
+        self.split(self.arriving(t, home=True), 'forced_offset_dep', self.offsets['offset_dep'])
+        self.split(self.arriving(t, home=True), 'forced_offset_dwell', self.offsets['offset_dwell'])
+
+    def arriving(self, t, home=False):
+        """cohorts that arrive in tick t, at home or at any location"""
+        onroad = self.location == Location.ONROAD
+        if home:
+            return onroad & (self.arrival_time_work != t) & (self.arrival_time_home == t)
+        return onroad & ((self.arrival_time_work == t) | (self.arrival_time_home == t))
+
+    def draw_weekend_stay(self, rows, t):
+        return self.forced_stay[rows]
+
+    def draw_stick_to_pref(self, rows, t):
+        return self.forced_stick[rows]
+
+    def draw_offset(self, rows, t, purpose, offset):
+        return (self.forced_offset_dep if purpose == Purpose.OFFSET_DEP else self.forced_offset_dwell)[rows]
+
+    def step(self):
+        self.split_draws(self.model.t)
+        super().step()
+        self.merge()
+
+    def totals(self):
+        """model totals of the tick, weighted by the EVs of every cohort"""
+        model = self.model
+        weight = self.weight
+        total = weight.sum()
+        model.average_battery_percentage = np.dot(weight, self.battery_percentage) / total
+        model.total_current_power_demand = np.dot(weight, self.current_power_demand)
+        model.total_VTG_capacity = np.dot(weight, self.VTG_capacity)
+        model.mean_charging = np.dot(weight, self.charging) / total
+
+    def municipality_step(self):
+        """the cohorts have no municipalities"""
+
+    def merge_key(self):
+        """
+        columns of the state that decides the rest of the run of a cohort,
+        state that is no longer read is left out: arrival and return times of
+        finished trips, the dwell offset after the arrival at work, stick_to_pref
+        of EVs with a charging preference and cheapest timesteps that have passed
+        """
+        t = self.model.t
+        location = self.location
+        to_work = (location == Location.ONROAD) & (self.arrival_time_work > t)
+        to_home = (location == Location.ONROAD) & (self.arrival_time_home > t)
+        no_pref = self.charge_pref == ChargePref.NONE
+        # the live cheapest timesteps of smart parked cohorts, as two hashes
+        hashes = np.zeros((2, self.n), dtype=np.int64)
+        rows = np.flatnonzero(self.smart & (location != Location.ONROAD) & (self.n_cheapest > 0))
+        if len(rows):
+            width = int(self.n_cheapest[rows].max())
+            cheapest = self.cheapest[rows, :width]
+            cheapest = np.where((np.arange(width) < self.n_cheapest[rows, None]) & (cheapest > t), cheapest, 0)
+            hashes[:, rows] = HASH[:, :width] @ cheapest.T
+        must_finish = self.time_charging_must_finish
+        return [self.key] + [getattr(self, name).astype(np.int64) for name in MERGE_FIELDS] + [
+            np.where(to_work, self.arrival_time_work, NO_TIME), np.where(to_home, self.arrival_time_home, NO_TIME),
+            np.where(location == Location.WORK, self.return_time, NO_TIME),
+            np.where((location == Location.HOME) | to_work, self.offset_dwell, 0),
+            no_pref & self.stick_decided & self.stick_to_pref, ~no_pref | self.stick_decided,
+            np.where(np.isnan(must_finish), NO_TIME, np.nan_to_num(must_finish)).astype(np.int64),
+            np.floor(self.current_battery_volume / self.soc_bin).astype(np.int64), hashes[0], hashes[1]]
+
+    def groups(self):
+        """
+        (first cohort, group of every cohort) of the cohorts with the same merge
+        key, compared by two 64 bit hashes of it
+        """
+        columns = self.merge_key()
+        hashes = np.zeros((2, self.n), dtype=np.int64)
+        for column, multipliers in zip(columns, HASH.T):
+            hashes += multipliers[:, None] * column.astype(np.int64)
+        order = np.lexsort(hashes)
+        sorted_hashes = hashes[:, order]
+        starts = np.concatenate([[True], (sorted_hashes[:, 1:] != sorted_hashes[:, :-1]).any(axis=0)])
+        inverse = np.empty(self.n, dtype=np.int64)
+        inverse[order] = np.cumsum(starts) - 1
+        return order[starts], inverse
+
+    def merge(self):
+        """merges the cohorts of a class with the same state and battery bin into their weighted mean"""
+        first, inverse = self.groups()
+        if len(first) == self.n:
+            return
+        weight = np.bincount(inverse, weights=self.weight)
+        state = {name: values[first] for name, values in self.cohort_state().items()}
+        for name in MEAN_FIELDS:
+            # the mean as a deviation from the first cohort keeps equal values exact, a full battery stays full
+            values = getattr(self, name)
+            deviation = values - state[name][inverse]
+            state[name] = state[name] + np.bincount(inverse, weights=self.weight * deviation) / weight
+        state['weight'] = weight
+        self.set_state(state)
+
+
+class CohortModel(EtmEVsModel):
+    """EtmEVsModel with a fleet of weighted cohorts instead of EV agents"""
+
+    def setup(self):
+        unsupported = [name for name in UNSUPPORTED if self.p.get(name)]
+        if unsupported:
+            raise ValueError('the cohort engine does not support {}'.format(unsupported))
+        start = timer()
+        self.setup_run()
+        self.municipalities_data = self.data.municipalities().set_index('GM_CODE')
+        self.region = None
+        self.OD = generate_OD(self.p.g, self.p.m, self.data)
+        self.municipalities = ap.AgentList(self, 0, Municipality)
+        self.EVs = ap.AgentList(self, 0, EV)
+        self.number_evs = self.p.n_evs
+        self.cohorts = CohortKernels(self, self.class_state(self.p.get('cohort_classes', 100)),
+                                     self.p.get('cohort_soc_bin', 1.0), self.p.get('threads', 1),
+                                     self.p.get('chunk_size', 'auto'))
+        self.split_classes()
+        if self.p.get('warmup') is not None:
+            self.warmup = WarmupDetector(self, self.p.warmup, self.p.get('horizon'))
+        logging.info('Cohort model init completed in {} seconds, {} cohorts'.format(
+            timer() - start, self.cohorts.n))
+
+    def sample_pairs(self, n):
+        """(commute distance, home id, work id) of n municipality pairs, a systematic sample by EV flow"""
+        inhabitants = self.municipalities_data['AANT_INW']
+        total = inhabitants.sum()
+        distance, weight, home, work = [], [], [], []
+        for key, OD in self.OD.items():
+            distance.append(OD['distance'].values)
+            weight.append(inhabitants[key] / total * np.nan_to_num(OD['p_flow'].values) / 100)
+            home.append(np.full(len(OD), key, dtype=object))
+            work.append(OD['destination_id'].values)
+        distance, weight, home, work = [np.concatenate(values) for values in (distance, weight, home, work)]
+        order = np.argsort(distance, kind='stable')
+        cumulative = np.cumsum(weight[order])
+        u = (np.arange(n) + self.streams.random(0, 0, Purpose.DESTINATION)) / n
+        index = order[np.minimum(np.searchsorted(cumulative, u * cumulative[-1], side='right'), len(order) - 1)]
+        return distance[index], home[index], work[index]
+
+    def class_state(self, n):
+        """cohort arrays of n classes, one cohort each before the splits of split_classes"""
+        keys = np.arange(n, dtype=np.int64)
+        fleet = draw_ev_attributes(self.streams, ap.AttrDict(dict(self.p, fleet_sampling='lhs')), keys)
+        fleet['commute_distance'], self.class_home, self.class_work = self.sample_pairs(n)
+        travel_time, distance_per_tick, energy_required, battery_volume = self.trips(keys, fleet)
+        nan = np.full(n, np.nan)
+        zeros = np.zeros(n)
+        no_time = np.full(n, NO_TIME, dtype=np.int64)
+        false = np.zeros(n, dtype=bool)
+        departure_time = fleet['departure_time']
+        return {
+            # as EV.setup and EtmEVsModel.setup
+            'battery_volume': battery_volume, 'current_battery_volume': battery_volume * 0.9,
+            'energy_rate': np.asarray(fleet['energy_rate']), 'charging_speed': np.asarray(fleet['charging_speed']),
+            'energy_required': energy_required, 'distance_per_tick': distance_per_tick,
+            'battery_percentage': np.full(n, 100.0), 'current_power_demand': nan.copy(),
+            'energy_charged': zeros.copy(), 'VTG_capacity': zeros.copy(), 'VTG_base': zeros.copy(),
+            'VTG_bound': zeros.copy(), 'battery_level_at_charging_start': battery_volume.copy(),
+            'needed_battery_level_at_charging_end': battery_volume.copy(),
+            'time_charging_must_finish': departure_time.astype(float),
+            'key': keys, 'departure_time': departure_time.copy(), 'dwell_time': fleet['dwell_time'],
+            'return_time': departure_time + fleet['dwell_time'], 'travel_time': travel_time,
+            'arrival_time_home': no_time.copy(), 'arrival_time_work': no_time.copy(),
+            'offset_dep': np.zeros(n, dtype=np.int64), 'offset_dwell': np.zeros(n, dtype=np.int64),
+            'smart': false.copy(), 'plugged_in': false.copy(), 'charging': false.copy(),
+            'force_charge': false.copy(), 'moving': false.copy(), 'id': keys.copy(),
+            'location': np.full(n, Location.HOME, dtype=np.int8),
+            'charge_pref': np.full(n, ChargePref.NONE, dtype=np.int8), 'stick_to_pref': false.copy(),
+            'stick_decided': false.copy(), 'n_cheapest': np.zeros(n, dtype=np.int64),
+            'cheapest': np.zeros((n, 1), dtype=np.int64),  # widened by choose_cheapest_timesteps as needed
+            'home_index': np.full(n, -1, dtype=np.int64), 'work_index': np.full(n, -1, dtype=np.int64),
+            'stamp': np.zeros(n, dtype=np.int64), 'weight': np.full(n, self.p.n_evs / n),
+            'forced_stay': false.copy(), 'forced_stick': false.copy(),
+            'forced_offset_dep': np.zeros(n, dtype=np.int64), 'forced_offset_dwell': np.zeros(n, dtype=np.int64),
+        }
+
+    def split_classes(self):
+        """splits every class by smart charging, charging preference and the setup offsets"""
+        cohorts = self.cohorts
+        cohorts.split(np.ones(cohorts.n, dtype=bool), 'smart', outcomes_of(self.p.p_smart))
+        p_pref = min(max(float(self.p.p_pref), 0.0), 1.0)
+        pref_home = min(max(float(self.p.pref_home), 0.0), 1.0)
+        preferences = [(ChargePref.NONE, 1 - p_pref), (ChargePref.HOME, p_pref * pref_home),
+                       (ChargePref.WORK, p_pref * (1 - pref_home))]
+        cohorts.split(np.ones(cohorts.n, dtype=bool), 'charge_pref', [(value, p) for value, p in preferences if p > 0])
+        cohorts.split(np.ones(cohorts.n, dtype=bool), 'offset_dep', cohorts.offsets['offset_dep'])
+        cohorts.split(np.ones(cohorts.n, dtype=bool), 'offset_dwell', cohorts.offsets['offset_dwell'])
+        cohorts.time_charging_must_finish[:] = cohorts.departure_time + cohorts.offset_dep
+
+    def step(self):
+        self.update_calendar()
+        self.fill_history()
+        self.calc_ma_price_history()
+        self.cohorts.step()
+
+    def end(self):
+        super().end()
+        logging.info('{} cohorts at the end of the run'.format(self.cohorts.n))
+        calibration = self.p.get('cohort_calibration')
+        if calibration:
+            if isinstance(calibration, str):
+                with open(calibration) as file:
+                    calibration = json.load(file)
+            for name, value in apply_calibration(self.reporters, calibration).items():
+                self.report(name, value)
+
+
+def apply_calibration(reporters, calibration):
+    """reporters corrected by a calibration {outcome: [a, b]} as a + b * value"""
+    return {name: calibration[name][0] + calibration[name][1] * value if name in calibration else value
+            for name, value in reporters.items()}
+
+
+def scenario_profiles(params, n, seed=0):
+    """n parameter dicts with the scenario parameters of SCENARIO_RANGES drawn uniformly"""
+    rng = np.random.default_rng(seed)
+    return [dict(params, **{name: float(rng.uniform(low, high)) for name, (low, high) in SCENARIO_RANGES.items()})
+            for _ in range(n)]
+
+
+def paired_runs(profiles, outcomes=OUTCOMES):
+    """
+    DataFrame with the reporters of the agent model (array kernels) and the
+    cohort engine for every profile, as agents_<outcome> and cohorts_<outcome>,
+    and their run times
+    """
+    rows = []
+    for profile in profiles:
+        row = {}
+        for engine, model_class, extra in [('agents', EtmEVsModel, {'kernels': True}), ('cohorts', CohortModel, {})]:
+            start = timer()
+            model = model_class(dict(profile, **extra))
+            model.run(display=False)
+            row[engine + '_seconds'] = timer() - start
+            row.update({engine + '_' + name: model.reporters.get(name, np.nan) for name in outcomes})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def calibrate(runs, outcomes=OUTCOMES):
+    """linear correction {outcome: [a, b]} of the cohort outcomes to the agent outcomes of paired runs"""
+    calibration = {}
+    for name in outcomes:
+        cohorts = runs['cohorts_' + name].values
+        agents = runs['agents_' + name].values
+        if len(runs) > 2 and np.ptp(cohorts) > 0:
+            b, a = np.polyfit(cohorts, agents, 1)
+        else:
+            a, b = np.mean(agents - cohorts), 1.0
+        calibration[name] = [float(a), float(b)]
+    return calibration
+
+
+def validate(runs, calibration=None, outcomes=OUTCOMES):
+    """DataFrame per outcome with the mean absolute error of the cohort engine relative to the agent model"""
+    rows = []
+    for name in outcomes:
+        agents = runs['agents_' + name].values
+        cohorts = runs['cohorts_' + name].values
+        scale = np.maximum(np.abs(agents), 1e-9)
+        row = {'outcome': name, 'agents_mean': agents.mean(),
+               'relative_error': np.mean(np.abs(cohorts - agents) / scale)}
+        if calibration is not None and name in calibration:
+            a, b = calibration[name]
+            row['calibrated_error'] = np.mean(np.abs(a + b * cohorts - agents) / scale)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate and validate the cohort engine against the agent model')
+    parser.add_argument('--params', default=PARAMS)
+    parser.add_argument('--n_evs', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--scenarios', type=int, default=8, help='half to calibrate, half to validate')
+    parser.add_argument('--classes', type=int, default=100)
+    parser.add_argument('--output', help='json file for the calibration, the parameter cohort_calibration')
+    args = parser.parse_args()
+    with open(args.params) as file:
+        params = json.load(file)
+    params.update(n_evs=args.n_evs, steps=args.days * 1440 // params.get('tick_minutes', 15),
+                  cohort_classes=args.classes)
+    runs = paired_runs(scenario_profiles(params, args.scenarios))
+    half = len(runs) // 2
+    calibration = calibrate(runs.iloc[:half])
+    print('run time: agents {:.1f} s, cohorts {:.1f} s per run'.format(
+        runs['agents_seconds'].mean(), runs['cohorts_seconds'].mean()))
+    with pd.option_context('display.width', 200):
+        print(validate(runs.iloc[half:], calibration).round(4).to_string(index=False))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(calibration, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,60 +2,66 @@ import numpy as np
 import agentpy as ap
 import logging
 import math
+from .rng import Purpose, triangular
 
 """
 All model compontents
 """
 
+# sampling of the setup distributions of the fleet, see draw_ev_attributes
+FLEET_SAMPLING = ('random', 'lhs')
+# setup distributions that are stratified with fleet_sampling='lhs'
+STRATIFIED = (Purpose.DEPARTURE, Purpose.DWELL, Purpose.BATTERY, Purpose.ENERGY_RATE)
+
 
 class EV(ap.Agent):
     """model class for electric vehicle agents. Most attributes are set to a value on the model level"""
 
-    def setup(self):
-        self.charging_speed = self.model.random.uniform(
-            self.p.charging_speed_min, self.p.charging_speed_max)
-        self.departure_time = int(self.model.random.triangular(
-            self.model.p.l_dep, self.model.p.m_dep, self.model.p.h_dep))
-        self.dwell_time = int(self.model.random.triangular(
-            self.model.p.l_dwell, self.model.p.m_dwell, self.model.p.h_dwell))
-        self.offset_dep = int(
-            self.model.random.uniform(-self.model.p.offset_dep, self.model.p.offset_dep))
-        self.offset_dwell = int(
-            self.model.random.uniform(-self.model.p.offset_dwell, self.model.p.offset_dwell))
+    def setup(self, key=None, attributes=None):
+        # key of the EV in the model's counter based random streams
+        self.key = self.id if key is None else key
+        if attributes is None:
+            # the model draws the attributes of all EVs at once, the same values are drawn here for a single EV
+            keys = np.array([self.key])
+            draws = dict(draw_ev_attributes(self.model.streams, self.model.p, keys),
+                         **draw_ev_choices(self.model.streams, self.model.p, keys))
+            attributes = {name: values.tolist()[0] for name, values in draws.items()}
+        self.charging_speed = attributes['charging_speed']
+        self.departure_time = attributes['departure_time']
+        self.dwell_time = attributes['dwell_time']
+        self.offset_dep = attributes['offset_dep']
+        self.offset_dwell = attributes['offset_dwell']
         self.current_location = 'home'
         self.arrival_time_home = None
         self.arrival_time_work = None
         self.moving = False
         self.charging = None
         self.return_time = self.departure_time + self.dwell_time
-        self.battery_volume = self.model.random.triangular(
-            self.model.p.l_vol, self.model.p.m_vol, self.model.p.h_vol)
-        self.energy_rate = self.model.random.triangular(
-            self.model.p.l_energy, self.model.p.m_energy, self.model.p.h_energy)
-        if self.model.random.uniform(0,1) < self.model.p.p_pref:
-            if self.model.random.uniform(0,1) < self.model.p.pref_home:
-                self.charge_pref = 'home' # Home
-            else:
-                self.charge_pref = 'work' # Work
-        else:
-            self.charge_pref = None
+        self.battery_volume = attributes['battery_volume']
+        self.energy_rate = attributes['energy_rate']
+        self.charge_pref = attributes['charge_pref']
         self.current_battery_volume = None
         self.battery_percentage = 100
         self.energy_required = None
-        self.smart = self.model.random.random() < self.model.p.p_smart
+        self.smart = attributes['smart']
         self.cheapest_timesteps = []
         self.current_power_demand = None
+        self.energy_charged = 0  # energy charged in the current tick
         self.battery_level_at_charging_start = self.battery_volume
         self.time_charging_must_finish = self.departure_time + self.offset_dep
         self.needed_battery_level_at_charging_end = self.battery_volume
         self.VTG_capacity = 0
+        # VTG capacity without the allowed percentage bound and the bound it is clamped by, see fanout.py
+        self.VTG_base = 0
+        self.VTG_bound = 0
         self.allowed_VTG_percentage = None
         self.force_charge = False
         self.plugged_in = False
         self.stick_to_pref = None
 
     def determine_strick_to_pref(self):
-        if self.model.random.uniform(0,1) <= self.model.p.pref_strictness:
+        if self.model.streams.uniform(self.key, self.model.clock, Purpose.STICK_TO_PREF) <= \
+                self.model.p.pref_strictness:
             self.stick_to_pref = True
         else:
             self.stick_to_pref = False
@@ -71,18 +77,21 @@ class EV(ap.Agent):
            function outputs cheapest predicted hours (ticks count of hour)
            hours can be set to charging? = true using this
         '''
-        if starting_time % 96 < ending_time % 96:
+        if self.model.telemetry is not None:
+            self.model.telemetry.count(schedules=1)
+        ticks_per_day = self.model.ticks_per_day
+        if starting_time % ticks_per_day < ending_time % ticks_per_day:
             # e.g. charging from 1AM to 3PM is from 1:00 - 3:00
             total_time_window = self.model.ma_price_history[starting_time %
-                                                            96:ending_time % 96]
+                                                            ticks_per_day:ending_time % ticks_per_day]
         else:
             total_time_window = self.model.ma_price_history[starting_time %
-                                                            96:] + self.model.ma_price_history[:ending_time % 96]
-        timesteps_needed = math.ceil(charge_needed/(self.charging_speed*0.25))
+                                                            ticks_per_day:] + self.model.ma_price_history[:ending_time % ticks_per_day]
+        timesteps_needed = math.ceil(charge_needed/(self.charging_speed*self.model.tick_hours))
         if timesteps_needed > (abs(ending_time-starting_time)):
             # charge all the available times
             logging.warning(
-                'not enough timesteps for car {} to charge'.format(self.id))
+                'not enough timesteps for car {} to charge'.format(self.key))
             self.cheapest_timesteps = [
                 i for i in range(starting_time, ending_time)]
         else:
@@ -94,16 +103,24 @@ class EV(ap.Agent):
                 i + starting_time for i in cheapest_timesteps]
 
     def departure_work(self):
+        if self.model.telemetry is not None:
+            self.model.telemetry.count(departures=1)
+        if self.model.events is not None:
+            self.model.events.departure(self, self.home_id, self.work_location_id)
         self.current_location = 'onroad'  # go onroad
         self.moving = True
         self.charging = False
         self.arrival_time_work = self.model.t + self.travel_time  # ETA
-        self.departure_time += 96  # update departure time
+        self.departure_time += self.model.ticks_per_day  # update departure time
         self.plugged_in = False
         self.model.municipalities.select(
             self.model.municipalities.id == self.home_id).current_EVs.remove(self)
 
     def departure_home(self):
+        if self.model.telemetry is not None:
+            self.model.telemetry.count(departures=1)
+        if self.model.events is not None:
+            self.model.events.departure(self, self.work_location_id, self.home_id)
         self.current_location = 'onroad'
         self.moving = True
         self.charging = False
@@ -113,6 +130,10 @@ class EV(ap.Agent):
             self.model.municipalities.id == self.work_location_id).current_EVs.remove(self)
 
     def arrive_work(self):
+        if self.model.telemetry is not None:
+            self.model.telemetry.count(arrivals=1)
+        if self.model.events is not None:
+            self.model.events.arrival(self)
         self.current_location = 'work'
         self.moving = False
         self.determine_strick_to_pref()
@@ -136,6 +157,10 @@ class EV(ap.Agent):
                 0, self.energy_required - self.current_battery_volume)))
 
     def arrive_home(self):
+        if self.model.telemetry is not None:
+            self.model.telemetry.count(arrivals=1)
+        if self.model.events is not None:
+            self.model.events.arrival(self)
         self.current_location = 'home'
         self.moving = False
         self.determine_strick_to_pref()
@@ -157,12 +182,14 @@ class EV(ap.Agent):
 
     def charge(self):
         if self.current_battery_volume < self.battery_volume:
-            increase = self.charging_speed * 0.25  # potential battery increase in 15min
+            increase = self.charging_speed * self.model.tick_hours  # potential battery increase in one tick
             self.charging = True
             # check if potential increase does not exceed battery volume
             if self.current_battery_volume + increase < self.battery_volume:
                 self.current_battery_volume += increase  # charge
+                self.energy_charged += increase
             else:
+                self.energy_charged += self.battery_volume - self.current_battery_volume
                 self.current_battery_volume = self.battery_volume  # set to max
         else:
             self.charging = False  # charging is false if the battery is full
@@ -171,7 +198,7 @@ class EV(ap.Agent):
         self.charging = False
         logging.debug('car {} is discharging'.format(self.id))
         self.current_battery_volume -= self.energy_rate * \
-            (self.model.p.average_driving_speed)  # energy consumption per 15min
+            (self.distance_per_tick)  # energy consumption per tick
     
     def determine_power_demand(self):
         if self.plugged_in:
@@ -180,7 +207,11 @@ class EV(ap.Agent):
 
             # if you are currently drawing power, you have a power demand
             if self.charging:
-                self.current_power_demand = self.charging_speed * 0.25
+                # demand of the 15 minute periods of the tick in which the EV charges, as the 15 minute model
+                # counts it, per 15 minutes so that it does not depend on the tick length (always one period
+                # for ticks of 15 minutes)
+                periods = min(self.model.tick_scale, max(1, math.ceil(self.energy_charged / (self.charging_speed * 0.25))))
+                self.current_power_demand = self.charging_speed * 0.25 * periods / self.model.tick_scale
             else:
                 self.current_power_demand = 0
 
@@ -190,9 +221,10 @@ class EV(ap.Agent):
 
             # if your car has not reached the latest charging bound (lcb)
             # if there is at least one timestep worth of charging more in the battery
-            if (self.current_battery_volume - self.charging_speed * 0.25) > \
-                    (self.needed_battery_level_at_charging_end - (self.charging_speed * 0.25 * (self.time_charging_must_finish - self.model.t))):
-                # if its smart and currently charging, you could now postpone some charging
+            if (self.current_battery_volume - self.charging_speed * self.model.tick_hours) > \
+                    (self.needed_battery_level_at_charging_end - (self.charging_speed * self.model.tick_hours * (self.time_charging_must_finish - self.model.t))):
+                # if its smart and currently charging, you could now postpone some charging (the charging of
+                # 15 minutes, at every tick length)
                 if self.smart:
                     # if you are smart, but not charging in this timestep, the VTG will not add
                     if any(i % self.model.t == 0 for i in self.cheapest_timesteps):
@@ -207,8 +239,8 @@ class EV(ap.Agent):
 
             # linear algebra to calculate the amount of VTG possible
             Intersection_Xcor_lcb = 0.5*(self.time_charging_must_finish + self.model.t) + (
-                (2 / self.charging_speed) * (self.current_battery_volume - self.needed_battery_level_at_charging_end))
-            Intersection_Ycor_lcb = 0.25*self.charging_speed * \
+                ((0.5 / self.model.tick_hours) / self.charging_speed) * (self.current_battery_volume - self.needed_battery_level_at_charging_end))
+            Intersection_Ycor_lcb = self.model.tick_hours*self.charging_speed * \
                 (-Intersection_Xcor_lcb + self.model.t) + \
                 self.current_battery_volume
             # distance lb = the amount of power you could empty until you reach the lower bound (lb)
@@ -216,27 +248,33 @@ class EV(ap.Agent):
             # distance lcb = the amount of power you could empty until you reach the latest charging bound (lcb)
             distance_lcb = self.current_battery_volume-Intersection_Ycor_lcb
 
-            self.VTG_capacity += max(min(distance_lb, distance_lcb,
+            self.VTG_base = self.VTG_capacity
+            self.VTG_bound = min(distance_lb, distance_lcb)
+            self.VTG_capacity += max(min(self.VTG_bound,
                                      self.allowed_VTG_percentage*self.battery_volume), 0)
 
         else:
             self.current_power_demand = 0
             self.VTG_capacity = 0
+            self.VTG_base = 0
+            self.VTG_bound = 0
             self.battery_level_at_charging_start = None
             self.time_charging_must_finish = None
             self.needed_battery_level_at_charging_end = None
 
     def step(self):
         """step function for EV, is called for every agent every time step"""
+        self.energy_charged = 0
         # move, determine location and destination
         if (self.model.t % (self.departure_time + self.offset_dep) == 0) and (self.current_location == 'home'):
             # check if weekend
             if self.model.weekend:
-                if self.model.random.uniform(0,1) < self.model.p.weekend_week_ratio:
+                if self.model.streams.uniform(self.key, self.model.clock, Purpose.WEEKEND) < \
+                        self.model.p.weekend_week_ratio:
                     depart = True
                 else:
                     depart = False
-                    self.departure_time += 96
+                    self.departure_time += self.model.ticks_per_day
             else:
                 depart = True
             
@@ -244,9 +282,11 @@ class EV(ap.Agent):
                     self.departure_work()
             elif depart:
                 logging.warning(
-                    'charge too low to go in morning, should not happen')
+                    'charge too low for EV {} to go in morning, should not happen'.format(self.key))
                 self.departure_time += 1
                 self.charge()
+                if self.model.telemetry is not None:
+                    self.model.telemetry.count(forced_charges=1)
 
             
         elif (self.model.t == self.arrival_time_work) and (self.current_location == 'onroad'):
@@ -259,12 +299,15 @@ class EV(ap.Agent):
                 # if not enough charge, wait until enough charge is available
                 self.return_time += 1
                 self.charge()
+                if self.model.telemetry is not None:
+                    self.model.telemetry.count(forced_charges=1)
         elif (self.model.t == self.arrival_time_home) and (self.current_location == 'onroad'):
             self.arrive_home()
-            self.offset_dep = int(self.model.random.uniform(-self.model.p.offset_dep,
-                                  self.model.p.offset_dep))  # Offset for the next day
-            self.offset_dwell = int(self.model.random.uniform(
-                -self.model.p.offset_dwell, self.model.p.offset_dwell))  # Offset for the next day
+            # offsets are given in 15 minutes, converted to ticks
+            self.offset_dep = round(int(self.model.streams.uniform(self.key, self.model.clock, Purpose.OFFSET_DEP,
+                -self.model.p.offset_dep, self.model.p.offset_dep)) / self.model.tick_scale)  # Offset for the next day
+            self.offset_dwell = round(int(self.model.streams.uniform(self.key, self.model.clock, Purpose.OFFSET_DWELL,
+                -self.model.p.offset_dwell, self.model.p.offset_dwell)) / self.model.tick_scale)  # Offset for the next day
             logging.debug('{} a new departure offset has been caculated {}'.format(
                 self.model.t, self.offset_dep))
 
@@ -316,6 +359,10 @@ class EV(ap.Agent):
         # determine current power demand and VTG capacity
         self.determine_power_demand()
 
+        # plug-in sessions and charging intervals for the event log
+        if self.model.events is not None:
+            self.model.events.observe(self)
+
         # final logging
         logging.debug('time {} battery_info car {} has {} percent battery, (absolute: {})'.format(
             self.model.t, self.id, self.battery_percentage, self.current_battery_volume))
@@ -354,3 +401,44 @@ class Municipality(ap.Agent):
         self.update_number_EVs()
         self.update_vtg()
         self.update_battery_percentage()
+
+
+def draw_ev_attributes(streams, p, keys):
+    """
+    Setup draws of the EVs with the given keys that do not depend on the
+    parameters that differ between scenarios (see draw_ev_choices). Times
+    are drawn in 15 minutes and rounded to ticks of tick_minutes. With the
+    parameter fleet_sampling='lhs' departure, dwell time, battery volume and
+    energy rate are drawn as a Latin hypercube over the fleet.
+    """
+    tick_scale = p.get('tick_minutes', 15) / 15
+    sampling = p.get('fleet_sampling', 'random')
+    if sampling not in FLEET_SAMPLING:
+        raise ValueError('unknown fleet_sampling {}, choose from {}'.format(sampling, FLEET_SAMPLING))
+    if sampling == 'lhs':
+        # Latin hypercube over the fleet: every stratum of each distribution is used by exactly one EV
+        u = {purpose: streams.stratified(keys, 0, purpose) for purpose in STRATIFIED}
+    else:
+        u = {purpose: streams.random(keys, 0, purpose) for purpose in STRATIFIED}
+    return {
+        'charging_speed': streams.uniform(keys, 0, Purpose.CHARGING_SPEED,
+            p.charging_speed_min, p.charging_speed_max),
+        'departure_time': np.round(np.trunc(triangular(u[Purpose.DEPARTURE],
+            p.l_dep, p.m_dep, p.h_dep)) / tick_scale).astype(np.int64),
+        'dwell_time': np.round(np.trunc(triangular(u[Purpose.DWELL],
+            p.l_dwell, p.m_dwell, p.h_dwell)) / tick_scale).astype(np.int64),
+        'offset_dep': np.round(np.trunc(streams.uniform(keys, 0, Purpose.OFFSET_DEP,
+            -p.offset_dep, p.offset_dep)) / tick_scale).astype(np.int64),
+        'offset_dwell': np.round(np.trunc(streams.uniform(keys, 0, Purpose.OFFSET_DWELL,
+            -p.offset_dwell, p.offset_dwell)) / tick_scale).astype(np.int64),
+        'battery_volume': triangular(u[Purpose.BATTERY], p.l_vol, p.m_vol, p.h_vol),
+        'energy_rate': triangular(u[Purpose.ENERGY_RATE], p.l_energy, p.m_energy, p.h_energy),
+    }
+
+
+def draw_ev_choices(streams, p, keys):
+    """charging preference and smart charging of the EVs with the given keys"""
+    pref = streams.random(keys, 0, Purpose.PREF) < p.p_pref
+    home = streams.random(keys, 0, Purpose.PREF_HOME) < p.pref_home
+    charge_pref = np.where(pref, np.where(home, 'home', 'work').astype(object), None)
+    return {'charge_pref': charge_pref, 'smart': streams.random(keys, 0, Purpose.SMART) < p.p_smart}
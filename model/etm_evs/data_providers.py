@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+from .lazy_imports import lazy_module
+
+pd = lazy_module('pandas')
+
+"""
+Input data of the model
+
+The model reads its data through a provider, given by the parameter `data`:
+the municipalities (GM_CODE, GM_NAAM, AANT_INW), the distances between them
+(origin_id, destination_id, total_cost in meters, all pairs, origin major)
+and the electricity prices per 15 minutes. version() identifies the
+municipalities and distances, it is part of the fleet cache key.
+
+- CSVDataProvider reads the csv files of the data directory
+- CachedDataProvider reads the same data from one .npz file
+- SyntheticDataProvider builds a small region in memory, for tests
+
+Build the .npz file of the csv data, from the model directory:
+python -m etm_evs.data_providers ../data/model_data.npz
+"""
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+DISTANCES_FILE = 'afstand7.csv'
+MUNICIPALITIES_FILE = 'gemeenten.csv'
+PRICES_FILE = 'prizes_electricity_365_days_per_15_minutes.csv'
+
+_file_hashes = {}
+
+
+def data_version(paths):
+    """hash of the contents of the input data files"""
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if signature not in _file_hashes:
+            file_digest = hashlib.sha1()
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    file_digest.update(block)
+            _file_hashes[signature] = file_digest.hexdigest()
+        digest.update(_file_hashes[signature].encode())
+    return digest.hexdigest()
+
+
+def data_provider(data=None):
+    """provider for the parameter `data`: None (the data directory), a directory, an .npz file or a provider"""
+    if data is None:
+        return CSVDataProvider()
+    if isinstance(data, str):
+        return CachedDataProvider(data) if data.endswith('.npz') else CSVDataProvider(data)
+    return data
+
+
+def read_prices(prices):
+    """
+    prices per 15 minutes of the parameter prices: a csv file with an
+    Electricity_price column (as the prices of the data), an .npy file or values
+    """
+    if not isinstance(prices, str):
+        return np.asarray(prices, dtype=float)
+    if prices.endswith('.npy'):
+        return np.load(prices)
+    return pd.read_csv(prices)['Electricity_price'].values
+
+
+class DataProvider:
+    """municipalities, distances and prices for the model"""
+
+    def municipalities(self):
+        """DataFrame with at least GM_CODE, GM_NAAM and AANT_INW"""
+        raise NotImplementedError
+
+    def distances(self):
+        """DataFrame with origin_id, destination_id and total_cost (meters, NaN if unknown) of all pairs"""
+        raise NotImplementedError
+
+    def prices(self):
+        """electricity price per 15 minutes of a year"""
+        raise NotImplementedError
+
+    def version(self):
+        """identifies the municipalities and distances"""
+        raise NotImplementedError
+
+
+class CSVDataProvider(DataProvider):
+    """the csv files of a data directory, by default ../data next to the model"""
+
+    def __init__(self, directory=None):
+        self.directory = DATA_DIRECTORY if directory is None else directory
+
+    def path(self, name):
+        if not os.path.isdir(self.directory):
+            # the default directory is the data directory of the repository, an installed package does not have it
+            raise FileNotFoundError('data directory {} does not exist, set the parameter data to a data directory or '
+                                    '.npz file (e.g. etm-evs run --set data=path/to/data)'.format(
+                                        os.path.normpath(self.directory)))
+        return os.path.join(self.directory, name)
+
+    def municipalities(self):
+        return pd.read_csv(self.path(MUNICIPALITIES_FILE))
+
+    def distances(self):
+        return pd.read_csv(self.path(DISTANCES_FILE), sep=';')
+
+    def prices(self):
+        return pd.read_csv(self.path(PRICES_FILE))['Electricity_price'].values
+
+    def version(self):
+        return data_version([self.path(DISTANCES_FILE), self.path(MUNICIPALITIES_FILE)])
+
+
+class ArrayDataProvider(DataProvider):
+    """data held as arrays: municipality codes, names, inhabitants, a distance matrix and prices"""
+
+    def __init__(self, codes, names, inhabitants, distance, prices):
+        self.codes = np.asarray(codes)
+        self.names = np.asarray(names)
+        self.inhabitants = np.asarray(inhabitants)
+        self.distance = np.asarray(distance, dtype=float)
+        self.price_values = np.asarray(prices, dtype=float)
+
+    def municipalities(self):
+        return pd.DataFrame({'GM_CODE': self.codes, 'GM_NAAM': self.names, 'AANT_INW': self.inhabitants})
+
+    def distances(self):
+        origin, destination = np.meshgrid(np.arange(len(self.codes)), np.arange(len(self.codes)), indexing='ij')
+        return pd.DataFrame({'origin_id': self.codes[origin.ravel()],
+                             'destination_id': self.codes[destination.ravel()],
+                             'total_cost': self.distance.ravel()})
+
+    def prices(self):
+        return self.price_values
+
+    def version(self):
+        digest = hashlib.sha1()
+        for values in [self.codes.astype(str), self.inhabitants.astype(np.int64), self.distance]:
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()
+
+
+class CachedDataProvider(ArrayDataProvider):
+    """the data stored in one .npz file, see build"""
+
+    def __init__(self, path):
+        self.path = path
+        with np.load(path) as arrays:
+            super().__init__(arrays['ids'], arrays['names'], arrays['inhabitants'], arrays['distance'],
+                             arrays['prices'])
+
+    def version(self):
+        return data_version([self.path])
+
+    @staticmethod
+    def build(provider, path):
+        """stores the data of a provider in an .npz file, the distances should be origin major like the csv"""
+        municipalities = provider.municipalities().set_index('GM_CODE')
+        distances = provider.distances()
+        codes = np.asarray(pd.unique(distances['origin_id'])).astype(str)
+        distance = distances['total_cost'].values.reshape(len(codes), len(codes))
+        destinations = np.asarray(distances['destination_id']).astype(str)
+        if len(destinations) != len(codes) ** 2 or not (destinations.reshape(len(codes), len(codes)) == codes).all():
+            raise ValueError('distances should contain all pairs, ordered by origin and destination')
+        np.savez(path, ids=codes, distance=distance,
+                 names=np.asarray(municipalities.loc[codes, 'GM_NAAM'], dtype=str),
+                 inhabitants=np.asarray(municipalities.loc[codes, 'AANT_INW']), prices=provider.prices())
+        return CachedDataProvider(path)
+
+
+class SyntheticDataProvider(ArrayDataProvider):
+    """small square grid of municipalities with straight line distances and a daily price cycle"""
+
+    def __init__(self, n_municipalities=4, spacing=10000, inhabitants=10000):
+        self.n_municipalities = n_municipalities
+        self.spacing = spacing
+        width = int(np.ceil(np.sqrt(n_municipalities)))
+        index = np.arange(n_municipalities)
+        xy = np.column_stack([index % width, index // width]) * spacing
+        distance = np.sqrt(((xy[:, None, :] - xy[None, :, :]) ** 2).sum(axis=2))
+        # prices are high in the early evening and low at night
+        quarter = np.arange(365 * 96)
+        prices = 40 + 15 * np.sin(2 * np.pi * (quarter % 96 - 44) / 96)
+        super().__init__(['GM{:04d}'.format(i + 1) for i in index], ['Municipality {}'.format(i + 1) for i in index],
+                         inhabitants * (index + 1), distance, prices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Store the csv input data of the model in one .npz file')
+    parser.add_argument('output', help='.npz file')
+    parser.add_argument('--directory', default=None, help='data directory, default ../data')
+    args = parser.parse_args()
+    provider = CachedDataProvider.build(CSVDataProvider(args.directory), args.output)
+    print('wrote {} municipalities to {}'.format(len(provider.codes), os.path.abspath(args.output)))
+
+
+if __name__ == '__main__':
+    main()
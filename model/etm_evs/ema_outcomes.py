@@ -0,0 +1,143 @@
+import os
+import uuid
+import numpy as np
+from .lazy_imports import lazy_module
+
+pd = lazy_module('pandas')
+
+"""
+Time series outcomes for the EMA workbench
+
+With the parameter `series_outcomes` (a list or comma separated string of the
+names below, or True for all model level series) the model reports its per
+tick results as float32 arrays. With `series_spill` set to a directory the
+arrays are written to spill files there and the model reports a small
+SpilledSeries handle instead, so the evaluator's result pipe only carries the
+path; SeriesCallback (ema_problem_definitions.py, with ResolvingCallback) reads
+them back into float32 result arrays and deletes the files. The municipality
+series, like the model series, start at the first tick. save_compact and
+load_compact store the experiments and outcomes of a study in one .npz file.
+"""
+
+# model level series, per tick, and the model list they are taken from
+SERIES = {
+    'power_demand_series': 'list_total_current_power_demand',
+    'VTG_capacity_series': 'list_total_VTG_capacity',
+    'battery_percentage_series': 'list_average_battery_percentage',
+    'mean_charging_series': 'list_mean_charging',
+}
+# series per tick (rows) and municipality (columns), and the municipality variable they record
+MUNICIPALITY_SERIES = {
+    'municipality_power_demand_series': 'current_power_demand',
+    'municipality_VTG_capacity_series': 'current_vtg_capacity',
+}
+
+
+def series_names(value):
+    """names of the requested series from the parameter series_outcomes"""
+    if value is True:
+        return list(SERIES)
+    if isinstance(value, str):
+        value = [name.strip() for name in value.split(',') if name.strip()]
+    names = list(value)
+    unknown = [name for name in names if name not in SERIES and name not in MUNICIPALITY_SERIES]
+    if unknown:
+        raise ValueError('unknown series outcomes {}, choose from {}'.format(
+            unknown, list(SERIES) + list(MUNICIPALITY_SERIES)))
+    return names
+
+
+class SeriesRecorder:
+    """collects the requested series of a model as float32 arrays"""
+
+    def __init__(self, model, names):
+        self.model = model
+        self.names = names
+        self.municipality_names = [name for name in names if name in MUNICIPALITY_SERIES]
+        self.rows = {name: [] for name in self.municipality_names}
+
+    def update(self):
+        """records the municipality series of the current tick"""
+        # like the model series, the values at setup (t=0) are not recorded
+        if self.model.t == 0:
+            return
+        for name in self.municipality_names:
+            values = [getattr(mun, MUNICIPALITY_SERIES[name]) for mun in self.model.municipalities]
+            self.rows[name].append([np.nan if value is None else value for value in values])
+
+    def outcomes(self):
+        """dict of series name and float32 array"""
+        outcomes = {}
+        for name in self.names:
+            if name in SERIES:
+                outcomes[name] = np.asarray(getattr(self.model, SERIES[name]), dtype=np.float32)
+            else:
+                outcomes[name] = np.asarray(self.rows[name], dtype=np.float32).reshape(
+                    -1, len(self.model.municipalities))
+        return outcomes
+
+
+class SpilledSeries:
+    """handle of an array written to a spill file, only the path is pickled"""
+
+    def __init__(self, path, shape):
+        self.path = path
+        self.shape = shape
+
+    def load(self, remove=True):
+        values = np.array(np.load(self.path, mmap_mode='r'))
+        if remove:
+            os.remove(self.path)
+        return values
+
+    def __repr__(self):
+        return 'SpilledSeries({!r}, {})'.format(self.path, self.shape)
+
+
+def spill(directory, values):
+    """writes an array to a new spill file in directory, returns its handle"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '{}-{}.npy'.format(os.getpid(), uuid.uuid4().hex))
+    partial = path + '.partial'
+    with open(partial, 'wb') as file:
+        np.save(file, values)
+    os.rename(partial, path)
+    return SpilledSeries(path, values.shape)
+
+
+def resolve(value):
+    """array of an outcome value that may be a spill handle (also wrapped in a 0-d object array)"""
+    if isinstance(value, np.ndarray) and value.dtype == object and value.ndim == 0:
+        value = value.item()
+    if isinstance(value, SpilledSeries):
+        return value.load()
+    return value
+
+
+class ResolvingCallback:
+    """mixin for an EMA workbench callback that loads the spilled outcomes of an experiment before storing them"""
+
+    def _store_outcomes(self, case_id, outcomes):
+        super()._store_outcomes(case_id, {name: resolve(value) for name, value in outcomes.items()})
+
+
+def save_compact(path, experiments, outcomes):
+    """stores experiments (DataFrame) and outcomes (dict of arrays) in one compressed .npz file"""
+    arrays = {}
+    for column in experiments.columns:
+        values = np.asarray(experiments[column])
+        arrays['experiment.' + column] = values.astype(str) if values.dtype.kind == 'O' else values
+    for name, values in outcomes.items():
+        values = np.asarray(values)
+        arrays['outcome.' + name] = values.astype(np.float32) if values.dtype == np.float64 and values.ndim > 1 \
+            else values
+    np.savez_compressed(path, **arrays)
+
+
+def load_compact(path):
+    """(experiments, outcomes) stored with save_compact"""
+    with np.load(path) as arrays:
+        experiments = pd.DataFrame({name[len('experiment.'):]: arrays[name] for name in arrays.files
+                                    if name.startswith('experiment.')})
+        outcomes = {name[len('outcome.'):]: arrays[name] for name in arrays.files if name.startswith('outcome.')}
+    return experiments, outcomes
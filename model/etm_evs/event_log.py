@@ -0,0 +1,185 @@
+import os
+import numpy as np
+from .lazy_imports import lazy_module
+from .fleet import LOCATION_CODES
+
+pd = lazy_module('pandas')
+
+"""
+Event sourced output of the EVs
+
+Instead of recording agent variables every tick, one record is written per
+trip, per plug-in session and per charging interval (consecutive ticks with
+the same power demand). Tables are stored column wise in append-only chunk
+files, <path>/<table>/part-00000.npz, ... The charging intervals are enough
+to rebuild the load profile of the model exactly (see load_profile).
+Ticks are model ticks, end ticks are exclusive.
+"""
+
+TABLES = {
+    'fleet': ['key', 'home_id', 'work_location_id', 'smart', 'charging_speed'],
+    'trips': ['key', 'origin_id', 'destination_id', 'departure', 'arrival', 'energy'],
+    'sessions': ['key', 'municipality_id', 'location', 'plug_in', 'plug_out', 'energy_charged', 'smart',
+                 'min_VTG_capacity'],
+    'charging': ['key', 'municipality_id', 'start', 'end', 'power'],
+}
+
+
+class ColumnWriter:
+    """buffers rows of one table and appends them as a chunk of column arrays"""
+
+    def __init__(self, path, columns, chunk_rows=100000):
+        self.path = path
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.rows = []
+        self.chunks = 0
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = zip(*self.rows)
+        np.savez(os.path.join(self.path, 'part-{:05d}.npz'.format(self.chunks)),
+                 **{name: np.asarray(values) for name, values in zip(self.columns, columns)})
+        self.chunks += 1
+        self.rows = []
+
+
+class EventLog:
+    """writes the events of the EVs of a model, hooked into the EV state changes"""
+
+    def __init__(self, path, model, chunk_rows=100000):
+        self.path = path
+        self.model = model
+        self.writers = {table: ColumnWriter(os.path.join(path, table), columns, chunk_rows)
+                        for table, columns in TABLES.items()}
+        # open trips, sessions and charging intervals and the last battery volume, per EV key
+        self.trips = {}
+        self.sessions = {}
+        self.intervals = {}
+        self.volume = {}
+        for ev in model.EVs:
+            self.writers['fleet'].append((ev.key, ev.home_id, ev.work_location_id, bool(ev.smart),
+                                          ev.charging_speed))
+            self.volume[ev.key] = ev.current_battery_volume
+            if ev.current_location == 'onroad':
+                # EVs of a warm start can start on the road
+                origin_id, destination_id = (ev.home_id, ev.work_location_id) if ev.arrival_time_work is not None \
+                    else (ev.work_location_id, ev.home_id)
+                self.departure(ev, origin_id, destination_id)
+
+    def departure(self, ev, origin_id, destination_id):
+        self.trips[ev.key] = (origin_id, destination_id, self.model.t, ev.current_battery_volume)
+
+    def arrival(self, ev):
+        origin_id, destination_id, departure, volume = self.trips.pop(ev.key)
+        self.writers['trips'].append((ev.key, origin_id, destination_id, departure, self.model.t,
+                                      volume - ev.current_battery_volume))
+
+    def observe(self, ev):
+        """called at the end of every EV step, opens and closes sessions and charging intervals"""
+        t = self.model.t
+        charged = max(0, ev.current_battery_volume - self.volume[ev.key])
+        self.volume[ev.key] = ev.current_battery_volume
+        plugged = ev.plugged_in and ev.current_location != 'onroad'
+        municipality_id = ev.home_id if ev.current_location == 'home' else ev.work_location_id
+        if plugged:
+            session = self.sessions.get(ev.key)
+            if session is not None and session[0] != municipality_id:
+                self.close_session(ev.key, t)
+                session = None
+            if session is None:
+                self.sessions[ev.key] = [municipality_id, LOCATION_CODES[ev.current_location], t, charged,
+                                         bool(ev.smart), ev.VTG_capacity]
+            else:
+                session[3] += charged
+                session[5] = min(session[5], ev.VTG_capacity)
+        elif ev.key in self.sessions:
+            self.close_session(ev.key, t)
+
+        power = ev.current_power_demand if plugged else 0
+        interval = self.intervals.get(ev.key)
+        if interval is not None and (interval[0] != municipality_id or interval[2] != power or not power):
+            self.close_interval(ev.key, t)
+            interval = None
+        if interval is None and power:
+            self.intervals[ev.key] = (municipality_id, t, power)
+
+    def close_session(self, key, t):
+        municipality_id, location, plug_in, energy, smart, min_vtg = self.sessions.pop(key)
+        self.writers['sessions'].append((key, municipality_id, location, plug_in, t, energy, smart, min_vtg))
+
+    def close_interval(self, key, t):
+        municipality_id, start, power = self.intervals.pop(key)
+        self.writers['charging'].append((key, municipality_id, start, t, power))
+
+    def close(self):
+        """ends open sessions and intervals after the last tick and writes all buffered rows"""
+        for key in list(self.sessions):
+            self.close_session(key, self.model.t + 1)
+        for key in list(self.intervals):
+            self.close_interval(key, self.model.t + 1)
+        for writer in self.writers.values():
+            writer.flush()
+
+
+def read_events(path, table):
+    """DataFrame of one table of an event log"""
+    directory = os.path.join(path, table)
+    parts = sorted(name for name in os.listdir(directory) if name.endswith('.npz'))
+    frames = []
+    for name in parts:
+        with np.load(os.path.join(directory, name)) as chunk:
+            frames.append(pd.DataFrame({column: chunk[column] for column in chunk.files}))
+    if not frames:
+        return pd.DataFrame(columns=TABLES[table])
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_profile(path, steps=None):
+    """
+    Total power demand per tick (1 .. steps) rebuilt from the charging
+    intervals. The values are summed in fleet order like the model does, so
+    they equal the recorded total_current_power_demand exactly.
+    """
+    fleet = read_events(path, 'fleet')
+    charging = read_events(path, 'charging')
+    if steps is None:
+        steps = int(charging['end'].max()) - 1 if len(charging) else 0
+    index = pd.Series(np.arange(len(fleet)), index=fleet['key']).loc[charging['key']].values
+    starts = charging['start'].values
+    ends = charging['end'].values
+    power = charging['power'].values
+    by_start = np.argsort(starts, kind='stable')
+    by_end = np.argsort(ends, kind='stable')
+    demand = np.zeros(len(fleet))
+    profile = np.empty(steps)
+    s = e = 0
+    for t in range(1, steps + 1):
+        while e < len(by_end) and ends[by_end[e]] <= t:
+            demand[index[by_end[e]]] = 0
+            e += 1
+        while s < len(by_start) and starts[by_start[s]] <= t:
+            if ends[by_start[s]] > t:
+                demand[index[by_start[s]]] = power[by_start[s]]
+            s += 1
+        profile[t - 1] = np.sum(demand)
+    return profile
+
+
+def municipality_profiles(path, steps=None):
+    """power demand per tick (rows, 1 .. steps) and municipality (columns) from the charging intervals"""
+    charging = read_events(path, 'charging')
+    if steps is None:
+        steps = int(charging['end'].max()) - 1 if len(charging) else 0
+    codes, column = np.unique(charging['municipality_id'].values, return_inverse=True)
+    change = np.zeros((steps + 2, len(codes)))
+    np.add.at(change, (np.minimum(charging['start'].values, steps + 1), column), charging['power'].values)
+    np.add.at(change, (np.minimum(charging['end'].values, steps + 1), column), -charging['power'].values)
+    return pd.DataFrame(np.cumsum(change, axis=0)[1:steps + 1], index=np.arange(1, steps + 1), columns=codes)
@@ -0,0 +1,226 @@
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .lazy_imports import lazy_module
+
+pd = lazy_module('pandas')
+
+"""
+Outcome-only parameters evaluated for many values from one run
+
+VTG_percentage only clamps the VTG capacity of an EV in
+EV.determine_power_demand, it does not change movement, charging or the
+battery. Every tick each EV keeps its VTG capacity without the clamp
+(VTG_base) and the bound it is clamped by (VTG_bound), so the total VTG
+capacity for any VTG_percentage is
+
+    sum(VTG_base + max(min(VTG_bound, VTG_percentage * battery_volume), 0))
+
+With the parameter fanout, e.g. {'VTG_percentage': [0, 0.25, 0.5]}, the model
+records these totals for every value; fanout_reporters gives the reporters
+of the run for each of them, exactly as separate runs would report them.
+run_profiles runs a list of parameter dicts (scenarios_full.csv) with one
+model per group of profiles that only differ in outcome-only parameters.
+
+Usage, from the model directory:
+python -m etm_evs.fanout ../data/scenarios_full.csv ../data/scenarios_full_results.csv --jobs -1
+
+OUTCOME_ONLY lists the outcome-only parameters and how their outcomes are
+recomputed; detect_outcome_only finds parameters that do not change the
+simulated state, test_fanout.py checks both agree.
+"""
+
+
+def vtg_reporters(totals):
+    """VTG reporters of the model (see EtmEVsModel.end) from the total VTG capacity per tick"""
+    if not totals:
+        return {}
+    # for some reason, storing a value of 0 gives an error in ema sobol analysis, so convert to 0.0000000001
+    min_value = min(totals)
+    if min_value == 0:
+        min_value = 0.0000000001
+    return {'min_VTG_capacity': min_value, 'mean_VTG_capacity': np.mean(totals),
+            'max_VTG_capacity': max(totals)}
+
+
+class VTGFanout:
+    """total VTG capacity per tick for a vector of VTG_percentage values"""
+
+    parameter = 'VTG_percentage'
+
+    def __init__(self, model, values):
+        self.model = model
+        self.values = [float(value) for value in values]
+        self.battery_volume = np.array(list(model.EVs.battery_volume), dtype=float)
+        self.totals = [[] for _ in self.values]
+
+    def update(self):
+        """records the totals of the current tick, like the model records total_VTG_capacity"""
+        total = self.model.total_VTG_capacity
+        if total is None or np.isnan(total):
+            return
+        base = self.model.ev_values('VTG_base')
+        bound = self.model.ev_values('VTG_bound')
+        volume = self.battery_volume
+        # a regional run only sums the EVs parked in the region, as the model total
+        present = self.model.region_mask()
+        if present is not None:
+            base, bound, volume = base[present], bound[present], volume[present]
+        for totals, value in zip(self.totals, self.values):
+            totals.append(np.sum(base + np.maximum(np.minimum(bound, value * volume), 0)))
+
+    def reporters(self, index):
+        totals = self.totals[index]
+        if self.model.warmup is not None:
+            totals = self.model.warmup.after_warmup(totals)
+        reporters = vtg_reporters(totals)
+        if 'VTG_capacity_series' in self.model.reporters:
+            reporters['VTG_capacity_series'] = np.asarray(self.totals[index], dtype=np.float32)
+        return reporters
+
+
+# outcome-only parameters and the recorder that evaluates them for other values
+OUTCOME_ONLY = {VTGFanout.parameter: VTGFanout}
+
+
+class Fanout:
+    """recorders of the parameter fanout of a model"""
+
+    def __init__(self, model, fanout):
+        unknown = [name for name in fanout if name not in OUTCOME_ONLY]
+        if unknown:
+            raise ValueError('{} are not outcome-only parameters, choose from {}'.format(unknown, list(OUTCOME_ONLY)))
+        self.model = model
+        self.recorders = {name: OUTCOME_ONLY[name](model, values) for name, values in fanout.items()}
+
+    def update(self):
+        for recorder in self.recorders.values():
+            recorder.update()
+
+    def reporters(self):
+        """list with the parameter values and reporters for every combination of the fanout values"""
+        rows = []
+        combinations = itertools.product(*[range(len(recorder.values)) for recorder in self.recorders.values()])
+        for indices in combinations:
+            row = dict(self.model.reporters)
+            for (name, recorder), index in zip(self.recorders.items(), indices):
+                row[name] = recorder.values[index]
+                row.update(recorder.reporters(index))
+            rows.append(row)
+        return rows
+
+
+def fanout_reporters(model):
+    """reporters of a model run with the parameter fanout, one dict per fanout value"""
+    return model.fanout.reporters()
+
+
+def group_profiles(profiles, names=tuple(OUTCOME_ONLY)):
+    """
+    groups parameter dicts that only differ in outcome-only parameters,
+    returns (profile, fanout, indices) per group
+    """
+    groups = {}
+    for index, profile in enumerate(profiles):
+        key = tuple(sorted((name, repr(value)) for name, value in profile.items() if name not in names))
+        groups.setdefault(key, []).append(index)
+    result = []
+    for indices in groups.values():
+        profile = dict(profiles[indices[0]])
+        fanout = {name: sorted({profiles[i][name] for i in indices}) for name in names if name in profile}
+        result.append((profile, fanout, indices))
+    return result
+
+
+def run_group(profile, fanout):
+    """runs one model, returns the reporters of every fanout value"""
+    from .model import EtmEVsModel  # model imports this module
+    model = EtmEVsModel(dict(profile, fanout=fanout))
+    model.run(display=False)
+    return fanout_reporters(model)
+
+
+def run_profiles(profiles, n_jobs=1, mp_context=None):
+    """
+    DataFrame with the parameters and reporters of every profile, in order,
+    running one model per group of profiles that only differ in outcome-only parameters
+    (mp_context, e.g. cli.worker_context(), is the multiprocessing context of the workers)
+    """
+    groups = group_profiles(profiles)
+    if n_jobs == 1:
+        results = [run_group(profile, fanout) for profile, fanout, _ in groups]
+    else:
+        with ProcessPoolExecutor(None if n_jobs == -1 else n_jobs, mp_context=mp_context) as executor:
+            results = list(executor.map(run_group, *zip(*[(profile, fanout) for profile, fanout, _ in groups])))
+    rows = [None] * len(profiles)
+    for (profile, fanout, indices), reporters in zip(groups, results):
+        by_values = {tuple(row[name] for name in fanout): row for row in reporters}
+        for index in indices:
+            values = tuple(profiles[index][name] for name in fanout)
+            rows[index] = dict(profiles[index], **{name: value for name, value in by_values[values].items()
+                                                    if name not in fanout})
+    return pd.DataFrame(rows)
+
+
+def fanout_evaluate(constants=None, outcomes=None, n_jobs=1):
+    """evaluate function for sobol_stream.StreamingSobol.run, runs the design rows with run_profiles"""
+
+    def evaluate(design):
+        profiles = [dict(constants or {}, **row) for row in design.to_dict('records')]
+        results = run_profiles(profiles, n_jobs)
+        names = outcomes if outcomes is not None else [name for name in results.columns if name not in profiles[0]]
+        return {name: results[name].values for name in names}
+
+    return evaluate
+
+
+def state_fingerprint(model):
+    """simulated state that outcome-only parameters may not change"""
+    return (model.list_total_current_power_demand, model.list_average_battery_percentage,
+            model.list_mean_charging, list(model.EVs.current_location), list(model.EVs.current_battery_volume))
+
+
+def changed_value(value):
+    """another valid value of a parameter, for detect_outcome_only"""
+    if 0 <= value <= 1:
+        # probabilities and shares
+        return 1 - value if value != 0.5 else 0.1
+    if isinstance(value, int):
+        return value + 1
+    return value * 0.5
+
+
+def detect_outcome_only(params, candidates=None):
+    """
+    names of the numeric parameters that change the reporters but not the
+    simulated state, found by running the model with each parameter changed
+    """
+    from .model import EtmEVsModel
+    reference = EtmEVsModel(params)
+    reference.run(display=False)
+    if candidates is None:
+        candidates = [name for name, value in params.items() if isinstance(value, (int, float))
+                      and not isinstance(value, bool) and name not in ('steps', 'seed', 'tick_minutes')]
+    found = []
+    for name in candidates:
+        model = EtmEVsModel(dict(params, **{name: changed_value(params[name])}))
+        model.run(display=False)
+        if state_fingerprint(model) == state_fingerprint(reference) and model.reporters != reference.reporters:
+            found.append(name)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run scenarios, one model per group of outcome-only parameters')
+    parser.add_argument('scenarios', help='csv with one scenario per row')
+    parser.add_argument('output', help='csv with the parameters and reporters per scenario')
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes, -1 for all cores')
+    args = parser.parse_args()
+    profiles = pd.read_csv(args.scenarios).to_dict(orient='records')
+    print('{} scenarios, {} model runs'.format(len(profiles), len(group_profiles(profiles))))
+    run_profiles(profiles, args.jobs).to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+import sys
+from enum import IntEnum
+import numpy as np
+
+"""
+Compact array representation of the EV fleet
+"""
+
+
+class Location(IntEnum):
+    """coded values of EV.current_location"""
+    HOME = 0
+    WORK = 1
+    ONROAD = 2
+
+
+class ChargePref(IntEnum):
+    """coded values of EV.charge_pref"""
+    NONE = 0
+    HOME = 1
+    WORK = 2
+
+
+LOCATION_CODES = {'home': Location.HOME, 'work': Location.WORK, 'onroad': Location.ONROAD}
+LOCATION_NAMES = {code: name for name, code in LOCATION_CODES.items()}
+PREF_CODES = {None: ChargePref.NONE, 'home': ChargePref.HOME, 'work': ChargePref.WORK}
+PREF_NAMES = {code: name for name, code in PREF_CODES.items()}
+
+# bits of the packed boolean flags
+SMART = 1
+PLUGGED_IN = 2
+CHARGING = 4
+FORCE_CHARGE = 8
+MOVING = 16
+STICK_TO_PREF = 32
+STICK_DECIDED = 64  # stick_to_pref is None until the first arrival
+FLAG_BITS = {'smart': SMART, 'plugged_in': PLUGGED_IN, 'charging': CHARGING,
+             'force_charge': FORCE_CHARGE, 'moving': MOVING}
+
+# sentinel for integer times that are None on the agent
+NO_TIME = np.iinfo(np.int32).min
+
+# energy quantities (kWh, kW, kWh/km, km and percentages), stored at fleet precision
+ENERGY_FIELDS = ['battery_volume', 'current_battery_volume', 'energy_rate', 'charging_speed',
+                 'energy_required', 'commute_distance', 'distance_per_tick', 'battery_percentage',
+                 'current_power_demand', 'energy_charged', 'VTG_capacity', 'VTG_base', 'VTG_bound',
+                 'allowed_VTG_percentage',
+                 'battery_level_at_charging_start', 'needed_battery_level_at_charging_end']
+# times in ticks
+TIME_FIELDS = ['departure_time', 'dwell_time', 'return_time', 'travel_time', 'arrival_time_home',
+               'arrival_time_work', 'time_charging_must_finish']
+OFFSET_FIELDS = ['offset_dep', 'offset_dwell']
+
+
+class Fleet:
+    """
+    Structure of arrays holding the state of all EVs.
+
+    Locations and preferences are enum coded, booleans are packed in one byte
+    per EV and the cheapest charging timesteps are stored as a bitset relative
+    to the first timestep of the charging window.
+    """
+
+    def __init__(self, n, municipality_ids, municipality_names=None,
+                 precision='float64', cheapest_words=2):
+        if precision not in ('float64', 'float32'):
+            raise ValueError('precision must be float64 or float32, got {}'.format(precision))
+        self.n = n
+        self.precision = precision
+        self.municipality_ids = np.asarray(municipality_ids)
+        self.municipality_names = np.asarray(
+            municipality_names if municipality_names is not None else municipality_ids)
+        for field in ENERGY_FIELDS:
+            setattr(self, field, np.full(n, np.nan, dtype=precision))
+        for field in TIME_FIELDS:
+            setattr(self, field, np.full(n, NO_TIME, dtype=np.int32))
+        for field in OFFSET_FIELDS:
+            setattr(self, field, np.zeros(n, dtype=np.int16))
+        self.home_id = np.zeros(n, dtype=np.int16)
+        self.work_location_id = np.zeros(n, dtype=np.int16)
+        self.current_location = np.zeros(n, dtype=np.uint8)
+        self.charge_pref = np.zeros(n, dtype=np.uint8)
+        self.flags = np.zeros(n, dtype=np.uint8)
+        self.cheapest_base = np.full(n, NO_TIME, dtype=np.int32)
+        self.cheapest_bits = np.zeros((n, cheapest_words), dtype=np.uint64)
+
+    @property
+    def fields(self):
+        """names of all arrays, in memory report order"""
+        return ENERGY_FIELDS + TIME_FIELDS + OFFSET_FIELDS + \
+            ['home_id', 'work_location_id', 'current_location', 'charge_pref', 'flags',
+             'cheapest_base', 'cheapest_bits']
+
+    def flag(self, bit):
+        """boolean array of one packed flag"""
+        return (self.flags & bit) != 0
+
+    def set_flag(self, bit, mask):
+        """set a packed flag to the values of a boolean array"""
+        mask = np.asarray(mask, dtype=bool)
+        self.flags = np.where(mask, self.flags | bit, self.flags & ~np.uint8(bit)).astype(np.uint8)
+
+    def stick_to_pref(self):
+        """stick_to_pref as 1 (True), 0 (False) or -1 (not decided yet)"""
+        decided = self.flag(STICK_DECIDED)
+        return np.where(decided, self.flag(STICK_TO_PREF).astype(np.int8), np.int8(-1))
+
+    def cheapest_timesteps(self, i):
+        """the cheapest timesteps of EV i as a list of ticks"""
+        base = int(self.cheapest_base[i])
+        if base == NO_TIME:
+            return []
+        bits = np.unpackbits(self.cheapest_bits[i].view(np.uint8), bitorder='little')
+        return [base + int(j) for j in np.flatnonzero(bits)]
+
+    def set_cheapest_timesteps(self, i, timesteps):
+        """store a list of ticks as the cheapest timesteps of EV i"""
+        self.cheapest_bits[i] = 0
+        if not timesteps:
+            self.cheapest_base[i] = NO_TIME
+            return
+        base = min(timesteps)
+        span = max(timesteps) - base
+        if span >= 64 * self.cheapest_bits.shape[1]:
+            words = span // 64 + 1
+            grown = np.zeros((self.n, words), dtype=np.uint64)
+            grown[:, :self.cheapest_bits.shape[1]] = self.cheapest_bits
+            self.cheapest_bits = grown
+        bits = np.zeros(64 * self.cheapest_bits.shape[1], dtype=np.uint8)
+        bits[np.asarray(timesteps) - base] = 1
+        self.cheapest_base[i] = base
+        self.cheapest_bits[i] = np.packbits(bits, bitorder='little').view(np.uint64)
+
+    @classmethod
+    def from_agents(cls, evs, municipality_ids, municipality_names=None, precision='float64'):
+        """build a fleet from a list of EV agents"""
+        evs = list(evs)
+        fleet = cls(len(evs), municipality_ids, municipality_names, precision)
+        index = {mun_id: i for i, mun_id in enumerate(fleet.municipality_ids)}
+        for field in ENERGY_FIELDS:
+            getattr(fleet, field)[:] = [np.nan if getattr(ev, field) is None else getattr(ev, field)
+                                        for ev in evs]
+        for field in TIME_FIELDS:
+            getattr(fleet, field)[:] = [NO_TIME if getattr(ev, field) is None else getattr(ev, field)
+                                        for ev in evs]
+        for field in OFFSET_FIELDS:
+            getattr(fleet, field)[:] = [getattr(ev, field) for ev in evs]
+        fleet.home_id[:] = [index[ev.home_id] for ev in evs]
+        fleet.work_location_id[:] = [index[ev.work_location_id] for ev in evs]
+        fleet.current_location[:] = [LOCATION_CODES[ev.current_location] for ev in evs]
+        fleet.charge_pref[:] = [PREF_CODES[ev.charge_pref] for ev in evs]
+        flags = np.zeros(len(evs), dtype=np.uint8)
+        for name, bit in FLAG_BITS.items():
+            flags |= np.array([bool(getattr(ev, name)) for ev in evs], dtype=bool) * np.uint8(bit)
+        flags |= np.array([ev.stick_to_pref is True for ev in evs], dtype=bool) * np.uint8(STICK_TO_PREF)
+        flags |= np.array([ev.stick_to_pref is not None for ev in evs], dtype=bool) * np.uint8(STICK_DECIDED)
+        fleet.flags = flags
+        for i, ev in enumerate(evs):
+            if ev.cheapest_timesteps:
+                fleet.set_cheapest_timesteps(i, ev.cheapest_timesteps)
+        return fleet
+
+    @classmethod
+    def from_model(cls, model, precision='float64'):
+        """build a fleet from the EVs of a model, indexing municipalities in model order"""
+        return cls.from_agents(model.EVs, list(model.municipalities.id),
+                               list(model.municipalities.name), precision)
+
+    def to_agents(self, evs):
+        """write the fleet state back to a list of EV agents (in fleet order)"""
+        stick = self.stick_to_pref()
+        for i, ev in enumerate(evs):
+            for field in ENERGY_FIELDS:
+                value = float(getattr(self, field)[i])
+                setattr(ev, field, None if np.isnan(value) else value)
+            for field in TIME_FIELDS:
+                value = int(getattr(self, field)[i])
+                setattr(ev, field, None if value == NO_TIME else value)
+            for field in OFFSET_FIELDS:
+                setattr(ev, field, int(getattr(self, field)[i]))
+            ev.home_id = self.municipality_ids[self.home_id[i]]
+            ev.work_location_id = self.municipality_ids[self.work_location_id[i]]
+            ev.current_location = LOCATION_NAMES[self.current_location[i]]
+            ev.charge_pref = PREF_NAMES[self.charge_pref[i]]
+            for name, bit in FLAG_BITS.items():
+                setattr(ev, name, bool(self.flags[i] & bit))
+            ev.stick_to_pref = None if stick[i] < 0 else bool(stick[i])
+            ev.cheapest_timesteps = self.cheapest_timesteps(i)
+
+    def memory_report(self):
+        """bytes used per field, plus the total and the bytes per EV"""
+        report = {field: getattr(self, field).nbytes for field in self.fields}
+        report['municipality_table'] = self.municipality_ids.nbytes + self.municipality_names.nbytes
+        total = sum(report.values())
+        report['total'] = total
+        report['per_ev'] = total / self.n if self.n else 0
+        return report
+
+    @classmethod
+    def estimate_memory(cls, n, n_municipalities=352, precision='float64', cheapest_words=2):
+        """memory report of a fleet of n EVs, without building it"""
+        row = cls(1, np.zeros(n_municipalities, dtype='<U6'), precision=precision,
+                  cheapest_words=cheapest_words)
+        report = {field: n * getattr(row, field).nbytes for field in row.fields}
+        report['municipality_table'] = 2 * row.municipality_ids.nbytes
+        total = sum(report.values())
+        report['total'] = total
+        report['per_ev'] = total / n if n else 0
+        return report
+
+
+def agent_memory(evs):
+    """approximate bytes held by EV agents: the instance, its __dict__ and the attribute values"""
+    total = 0
+    seen = set()
+    for ev in evs:
+        total += sys.getsizeof(ev) + sys.getsizeof(ev.__dict__)
+        for value in ev.__dict__.values():
+            # shared objects (model, parameters, interned strings) are counted once
+            if id(value) in seen:
+                continue
+            seen.add(id(value))
+            total += sys.getsizeof(value)
+            if isinstance(value, list):
+                total += sum(sys.getsizeof(i) for i in value)
+    return total
+
+
+def format_memory_report(report):
+    """memory report as a readable table"""
+    lines = ['{:<40}{:>14}'.format('field', 'bytes')]
+    for field, size in report.items():
+        if field in ('total', 'per_ev'):
+            continue
+        lines.append('{:<40}{:>14,}'.format(field, size))
+    lines.append('{:<40}{:>14,}'.format('total', report['total']))
+    lines.append('{:<40}{:>14,.1f}'.format('per EV', report['per_ev']))
+    return '\n'.join(lines)
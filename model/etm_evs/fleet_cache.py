@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from .lazy_imports import lazy_module
+from .data_providers import data_provider
+
+pd = lazy_module('pandas')
+
+"""
+On-disk cache of the initialized fleet
+
+The destinations and setup draws of all EVs only depend on a subset of the
+parameters, the seed and the input data. They are stored as .npy files (read
+back memory mapped) in a directory named after a hash of exactly those
+inputs, so scenarios that only differ in e.g. p_smart or VTG_percentage share
+one fleet. Smart charging, preferences and the allowed VTG percentage are
+drawn again for every run; the counter based streams make a cached fleet
+identical to a freshly built one.
+"""
+
+# parameters used to build the OD matrix and the EV draws
+INIT_PARAMETERS = ['g', 'm', 'n_evs', 'charging_speed_min', 'charging_speed_max',
+                   'l_dep', 'm_dep', 'h_dep', 'offset_dep', 'l_dwell', 'm_dwell', 'h_dwell',
+                   'offset_dwell', 'l_vol', 'm_vol', 'h_vol', 'l_energy', 'm_energy', 'h_energy', 'tick_minutes']
+# values of init parameters that may be left out
+DEFAULTS = {'tick_minutes': 15}
+# bump when the cached arrays or the way they are drawn change
+CACHE_VERSION = 1
+
+
+def cache_key(p, seed, data=None, region=None):
+    """
+    hash of the init parameters, the seed, the input data (a provider or path,
+    see data_providers.py) and the municipality codes of a regional model
+    """
+    inputs = {name: repr(float(p.get(name, DEFAULTS.get(name)))) for name in INIT_PARAMETERS}
+    inputs.update(seed=int(seed), data=data_provider(data).version(), version=CACHE_VERSION)
+    if p.get('fleet_sampling', 'random') != 'random':
+        inputs['fleet_sampling'] = p.get('fleet_sampling')
+    if region is not None:
+        inputs['region'] = list(region)
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def _mappable(values):
+    """array without python objects, strings become fixed width"""
+    values = np.asarray(values)
+    return values.astype(str) if values.dtype.kind == 'O' else values
+
+
+class FleetCache:
+    """cached OD matrix and EV draws for one set of init parameters, seed and data"""
+
+    def __init__(self, root, p, seed, data=None, region=None):
+        self.root = root
+        self.key = cache_key(p, seed, data, region)
+        self.path = os.path.join(root, self.key)
+
+    def exists(self):
+        return os.path.isdir(self.path)
+
+    def load(self):
+        """(OD, fleet) with the fleet as a dict of memory mapped arrays, None if not cached"""
+        if not self.exists():
+            return None
+        arrays = {name[:-4]: np.load(os.path.join(self.path, name), mmap_mode='r')
+                  for name in os.listdir(self.path) if name.endswith('.npy')}
+        od = pd.DataFrame({column[3:]: arrays.pop(column) for column in list(arrays) if column.startswith('od_')})
+        OD = {origin: rows.drop(columns='origin_id') for origin, rows in od.groupby('origin_id', sort=False)}
+        return OD, arrays
+
+    def save(self, OD, fleet):
+        """stores the OD matrix (dict of DataFrames per origin) and the fleet arrays"""
+        partial = '{}.partial-{}'.format(self.path, os.getpid())
+        os.makedirs(partial, exist_ok=True)
+        od = pd.concat([rows.assign(origin_id=origin) for origin, rows in OD.items()])
+        for column in ['origin_id', 'destination_id', 'p_flow', 'distance']:
+            np.save(os.path.join(partial, 'od_' + column), _mappable(od[column]))
+        for name, values in fleet.items():
+            np.save(os.path.join(partial, name), _mappable(values))
+        try:
+            os.rename(partial, self.path)
+        except OSError:
+            # another run stored the same fleet first
+            shutil.rmtree(partial, ignore_errors=True)
@@ -0,0 +1,497 @@
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer as timer
+import numpy as np
+from .fleet import ChargePref, Location, LOCATION_CODES, LOCATION_NAMES, PREF_CODES, NO_TIME
+from .rng import Purpose
+
+"""
+Array kernels of the EV step, run over chunks of the fleet on a thread pool
+
+With the parameter kernels=True the model keeps the state of its EVs in
+arrays (FleetKernels) and does every tick with NumPy operations over chunks
+of the fleet instead of stepping the EV agents:
+
+1. moves: departures, arrivals and the waits when the charge is too low
+2. cheapest charging timesteps of the smart EVs that arrived (serial, few EVs)
+3. plug-in decision, charge and discharge, battery percentage, power demand
+   and VTG capacity (EV.determine_power_demand)
+4. the model totals and the municipality reductions
+
+Steps 1 and 3 are elementwise and run chunk by chunk on a pool of threads
+(parameter threads, default 1); NumPy releases the GIL in these operations,
+so the chunks run on several cores. The municipality reductions are split in
+groups of municipalities. Every EV and every municipality is computed the
+same in any chunk and every total is one reduction over the whole fleet in
+agent order, so results do not depend on threads or chunk size and are those
+of the agent step. The EV agents are updated from the arrays at the end of
+the run (FleetKernels.sync).
+
+The chunk size (parameter chunk_size) is tuned during the first ticks by
+ChunkTuner unless it is given. The thread count is never derived from the
+machine unless threads='auto': runs in an ap.Experiment(n_jobs=-1) or a
+sweep over all cores should keep threads=1, otherwise every worker starts
+its own threads and the cores are oversubscribed; threads_per_worker gives
+the threads per run that fill the cores.
+
+The event log (event_log.py) needs the agent step and cannot be combined
+with the kernels.
+"""
+
+HOME = Location.HOME
+WORK = Location.WORK
+ONROAD = Location.ONROAD
+# EV attributes copied from the agents to the arrays and back, floats are NaN and times NO_TIME for None
+FLOAT_FIELDS = ['battery_volume', 'current_battery_volume', 'energy_rate', 'charging_speed', 'energy_required',
+                'distance_per_tick', 'battery_percentage', 'current_power_demand', 'energy_charged',
+                'VTG_capacity', 'VTG_base', 'VTG_bound', 'battery_level_at_charging_start',
+                'needed_battery_level_at_charging_end', 'time_charging_must_finish']
+INT_FIELDS = ['key', 'departure_time', 'dwell_time', 'return_time', 'travel_time', 'arrival_time_home',
+              'arrival_time_work', 'offset_dep', 'offset_dwell']
+BOOL_FIELDS = ['smart', 'plugged_in', 'charging', 'force_charge', 'moving']
+# all arrays of the state, cheapest has a row of timesteps per EV (the first n_cheapest are used)
+STATE_FIELDS = FLOAT_FIELDS + INT_FIELDS + BOOL_FIELDS + [
+    'id', 'location', 'charge_pref', 'stick_to_pref', 'stick_decided', 'n_cheapest', 'cheapest', 'home_index',
+    'work_index', 'stamp']
+# smallest chunk the tuner tries, below it the NumPy call overhead dominates
+MIN_CHUNK = 1024
+
+
+def available_cores():
+    """cores this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def threads_per_worker(n_jobs):
+    """threads per run that fill the cores when n_jobs runs (-1 for all cores) run at the same time"""
+    cores = available_cores()
+    workers = cores if n_jobs == -1 else max(1, n_jobs)
+    return max(1, cores // workers)
+
+
+def resolve_threads(threads):
+    """thread count of the parameter threads, an int or 'auto' for all available cores"""
+    if threads == 'auto':
+        return available_cores()
+    threads = int(threads)
+    if threads < 1:
+        raise ValueError('threads should be at least 1 or auto, not {}'.format(threads))
+    return threads
+
+
+class ChunkTuner:
+    """
+    chunk size of the kernels: the candidates (the fleet split in 1 to 16
+    chunks per thread) are each timed for trials ticks, then the fastest is kept
+    """
+
+    def __init__(self, n, threads, trials=2):
+        sizes = {math.ceil(n / (threads * parts)) for parts in (1, 2, 4, 8, 16)}
+        self.candidates = sorted((size for size in sizes if size >= MIN_CHUNK), reverse=True) or [max(n, 1)]
+        self.trials = trials
+        self.times = {size: [] for size in self.candidates}
+        self.size = None if len(self.candidates) > 1 else self.candidates[0]
+
+    def chunk_size(self):
+        if self.size is not None:
+            return self.size
+        for size in self.candidates:
+            if len(self.times[size]) < self.trials:
+                return size
+
+    def record(self, size, seconds):
+        """time of a tick with chunks of size"""
+        if self.size is not None:
+            return
+        self.times[size].append(seconds)
+        if all(len(times) >= self.trials for times in self.times.values()):
+            self.size = min(self.candidates, key=lambda size: min(self.times[size]))
+            logging.info('kernel chunk size {} EVs'.format(self.size))
+
+
+class FleetKernels:
+    """state of the EVs of a model as arrays and the array step of the fleet"""
+
+    def __init__(self, model, state, threads=1, chunk_size='auto'):
+        self.model = model
+        self.set_state(state)
+        self.allowed_VTG_percentage = float(model.p.VTG_percentage)
+        self.threads = resolve_threads(threads)
+        self.executor = ThreadPoolExecutor(self.threads) if self.threads > 1 else None
+        self.tuner = None
+        if chunk_size == 'auto':
+            self.tuner = ChunkTuner(self.n, self.threads)
+        else:
+            self.size = max(1, int(chunk_size))
+
+    @classmethod
+    def from_model(cls, model, threads=1, chunk_size='auto'):
+        """kernels with the state of the EV agents of a model"""
+        evs = list(model.EVs)
+        state = {}
+        for name in FLOAT_FIELDS:
+            state[name] = np.array([np.nan if getattr(ev, name) is None else getattr(ev, name) for ev in evs],
+                                   dtype=float)
+        for name in INT_FIELDS:
+            state[name] = np.array([NO_TIME if getattr(ev, name) is None else getattr(ev, name) for ev in evs],
+                                   dtype=np.int64)
+        for name in BOOL_FIELDS:
+            state[name] = np.array([bool(getattr(ev, name)) for ev in evs], dtype=bool)
+        state['id'] = np.array([ev.id for ev in evs], dtype=np.int64)
+        state['location'] = np.array([LOCATION_CODES[ev.current_location] for ev in evs], dtype=np.int8)
+        state['charge_pref'] = np.array([PREF_CODES[ev.charge_pref] for ev in evs], dtype=np.int8)
+        state['stick_to_pref'] = np.array([bool(ev.stick_to_pref) for ev in evs], dtype=bool)
+        state['stick_decided'] = np.array([ev.stick_to_pref is not None for ev in evs], dtype=bool)
+        # cheapest timesteps, padded rows with their lengths
+        state['n_cheapest'] = np.array([len(ev.cheapest_timesteps) for ev in evs], dtype=np.int64)
+        state['cheapest'] = np.zeros((len(evs), max(model.ticks_per_day, int(state['n_cheapest'].max(initial=0)))),
+                                     dtype=np.int64)
+        for i, ev in enumerate(evs):
+            state['cheapest'][i, :len(ev.cheapest_timesteps)] = ev.cheapest_timesteps
+        # municipality of the home and work location, -1 if the model has no agent for it
+        index = {mun.id: i for i, mun in enumerate(model.municipalities)}
+        state['home_index'] = np.array([index.get(ev.home_id, -1) for ev in evs], dtype=np.int64)
+        state['work_index'] = np.array([index.get(ev.work_location_id, -1) for ev in evs], dtype=np.int64)
+        # order of the EVs in the current_EVs list of their municipality, their position in it now,
+        # arrivals of a tick are appended in agent order after all earlier ones
+        position = {ev.id: i for mun in model.municipalities for i, ev in enumerate(mun.current_EVs)}
+        state['stamp'] = np.array([position.get(ev.id, 0) for ev in evs], dtype=np.int64)
+        return cls(model, state, threads, chunk_size)
+
+    def set_state(self, state):
+        """sets the EV arrays, a dict with an array for every name of STATE_FIELDS"""
+        for name, values in state.items():
+            setattr(self, name, values)
+        self.n = len(self.key)
+        # potential battery increase in one tick and the energy of one 15 minute period of charging
+        self.increase = self.charging_speed * self.model.tick_hours
+        self.quarter = self.charging_speed * 0.25
+
+    def state(self):
+        """the EV arrays as a dict, see set_state"""
+        return {name: getattr(self, name) for name in STATE_FIELDS}
+
+    def chunk_size(self):
+        return self.tuner.chunk_size() if self.tuner is not None else self.size
+
+    def chunks(self, size):
+        return [slice(start, min(start + size, self.n)) for start in range(0, self.n, size)]
+
+    def map(self, function, items):
+        """function applied to every item, on the thread pool"""
+        if self.executor is None:
+            return [function(item) for item in items]
+        return list(self.executor.map(function, items))
+
+    def values(self, name):
+        """array of an EV attribute"""
+        return getattr(self, name)
+
+    def step(self):
+        """one tick of all EVs and the model and municipality totals (EtmEVsModel.step)"""
+        start = timer()
+        size = self.chunk_size()
+        chunks = self.chunks(size)
+        arrivals = self.map(self.move, chunks)
+        # the prices are those of the tick for all arrivals, equal windows give equal schedules
+        prices = np.array(self.model.ma_price_history)
+        schedules = {}
+        for index, starting_time, ending_time, charge_needed in arrivals:
+            for i, ending, needed in zip(index.tolist(), ending_time.tolist(), charge_needed.tolist()):
+                self.choose_cheapest_timesteps(i, starting_time, ending, needed, prices, schedules)
+        self.map(self.charge_and_demand, chunks)
+        if self.tuner is not None:
+            self.tuner.record(size, timer() - start)
+        self.totals()
+        self.municipality_step()
+
+    def totals(self):
+        """
+        model totals of the tick, reductions over the whole fleet in agent order;
+        in a regional run over the EVs parked in the region (EtmEVsModel.region_totals)
+        """
+        model = self.model
+        if model.region is not None:
+            model.region_totals(self.battery_percentage, self.current_power_demand, self.VTG_capacity, self.charging)
+            return
+        model.average_battery_percentage = np.mean(self.battery_percentage)
+        model.total_current_power_demand = np.sum(self.current_power_demand)
+        model.total_VTG_capacity = np.sum(self.VTG_capacity)
+        model.mean_charging = np.mean(self.charging)
+
+    def place(self):
+        """index of the municipality every EV is parked in, -1 on the road"""
+        return np.where(self.location == HOME, self.home_index, np.where(self.location == WORK, self.work_index, -1))
+
+    def region_mask(self):
+        """EVs parked in a municipality of the region (EtmEVsModel.region_mask)"""
+        region = [i for i, mun in enumerate(self.model.municipalities) if mun.id in self.model.region.codes]
+        return np.isin(self.place(), region)
+
+    def _charge(self, sl, mask):
+        """EV.charge of the EVs of the chunk where mask"""
+        current = self.current_battery_volume[sl]
+        volume = self.battery_volume[sl]
+        increase = self.increase[sl]
+        charged = self.energy_charged[sl]
+        can = mask & (current < volume)
+        self.charging[sl][mask] = can[mask]
+        partial = can & (current + increase < volume)
+        full = can & ~partial
+        current[partial] += increase[partial]
+        charged[partial] += increase[partial]
+        charged[full] += volume[full] - current[full]
+        current[full] = volume[full]
+
+    def draw_weekend_stay(self, rows, t):
+        """whether the EVs at rows that leave home on a weekend day stay home"""
+        return self.model.streams.uniform(self.key[rows], t, Purpose.WEEKEND) >= self.model.p.weekend_week_ratio
+
+    def draw_stick_to_pref(self, rows, t):
+        """stick_to_pref of the EVs at rows that arrive"""
+        return self.model.streams.uniform(self.key[rows], t, Purpose.STICK_TO_PREF) <= self.model.p.pref_strictness
+
+    def draw_offset(self, rows, t, purpose, offset):
+        """new departure or dwell offsets in ticks of the EVs at rows, as EV.step draws them"""
+        u = self.model.streams.uniform(self.key[rows], t, purpose, -offset, offset)
+        return np.round(np.trunc(u) / self.model.tick_scale).astype(np.int64)
+
+    def move(self, sl):
+        """
+        departures, arrivals and waits of a chunk (the movement part of
+        EV.step), returns the smart EVs that arrived as (index, starting
+        time, ending time, charge needed) for their cheapest timesteps
+        """
+        model = self.model
+        t = model.t
+        clock = model.clock  # tick of the draws
+        location = self.location[sl]
+        current = self.current_battery_volume[sl]
+        required = self.energy_required[sl]
+        departure_time = self.departure_time[sl]
+        offset_dep = self.offset_dep[sl]
+        return_time = self.return_time[sl]
+        self.energy_charged[sl] = 0
+        onroad = location == ONROAD
+        leave_home = (location == HOME) & (t % (departure_time + offset_dep) == 0)
+        arrive_work = onroad & (self.arrival_time_work[sl] == t)
+        leave_work = (location == WORK) & (t % return_time == 0)
+        arrive_home = onroad & ~arrive_work & (self.arrival_time_home[sl] == t)
+        depart = leave_home.copy()
+        if model.weekend:
+            leaving = np.flatnonzero(leave_home)
+            stay = leaving[self.draw_weekend_stay(sl.start + leaving, clock)]
+            depart[stay] = False
+            departure_time[stay] += model.ticks_per_day
+        # departures, or wait and charge if the charge is too low
+        enough = current >= required
+        to_work = depart & enough
+        to_home = leave_work & enough
+        wait_home = depart & ~enough
+        wait_work = leave_work & ~enough
+        for key in self.key[sl][wait_home]:
+            logging.warning('charge too low for EV {} to go in morning, should not happen'.format(key))
+        departing = to_work | to_home
+        location[departing] = ONROAD
+        self.moving[sl][departing] = True
+        self.charging[sl][departing] = False
+        self.plugged_in[sl][departing] = False
+        self.arrival_time_work[sl][to_work] = t + self.travel_time[sl][to_work]
+        departure_time[to_work] += model.ticks_per_day
+        self.arrival_time_home[sl][to_home] = t + self.travel_time[sl][to_home]
+        departure_time[wait_home] += 1
+        return_time[wait_work] += 1
+        self._charge(sl, wait_home | wait_work)
+        # arrivals
+        arriving = arrive_work | arrive_home
+        if model.telemetry is not None:
+            model.telemetry.count(departures=np.count_nonzero(departing), arrivals=np.count_nonzero(arriving),
+                                  forced_charges=np.count_nonzero(wait_home | wait_work))
+        location[arrive_work] = WORK
+        location[arrive_home] = HOME
+        self.moving[sl][arriving] = False
+        index = np.flatnonzero(arriving)
+        self.stick_to_pref[sl][index] = self.draw_stick_to_pref(sl.start + index, clock)
+        self.stick_decided[sl][index] = True
+        self.plugged_in[sl][arriving] = True
+        self.stamp[sl][arriving] = t * self.n + sl.start + index
+        return_time[arrive_work] = t + self.dwell_time[sl][arrive_work] + self.offset_dwell[sl][arrive_work]
+        self.battery_level_at_charging_start[sl][arriving] = current[arriving]
+        must_finish = self.time_charging_must_finish[sl]
+        must_finish[arrive_work] = return_time[arrive_work]
+        must_finish[arrive_home] = departure_time[arrive_home] + offset_dep[arrive_home]
+        needed = self.needed_battery_level_at_charging_end[sl]
+        needed[arrive_work] = np.where(required[arrive_work] - current[arrive_work] > 0, required[arrive_work],
+                                       current[arrive_work])
+        needed[arrive_home] = self.battery_volume[sl][arrive_home]
+        charge_needed = np.where(arrive_work, np.maximum(0, required - current), self.battery_volume[sl] - current)
+        smart = np.flatnonzero(arriving & self.smart[sl])
+        # offsets for the next day
+        home = np.flatnonzero(arrive_home)
+        offset_dep[home] = self.draw_offset(sl.start + home, clock, Purpose.OFFSET_DEP, model.p.offset_dep)
+        self.offset_dwell[sl][home] = self.draw_offset(sl.start + home, clock, Purpose.OFFSET_DWELL, model.p.offset_dwell)
+        return sl.start + smart, t, must_finish[smart].astype(np.int64), charge_needed[smart]
+
+    def choose_cheapest_timesteps(self, i, starting_time, ending_time, charge_needed, prices, schedules):
+        """
+        EV.choose_cheapest_timesteps of EV i, with prices the ma_price_history of the tick as an array and
+        schedules the cheapest timesteps (from the start of the window) chosen in the tick so far, by the
+        start of the window in the day, its length and the timesteps needed
+        """
+        model = self.model
+        if model.telemetry is not None:
+            model.telemetry.count(schedules=1)
+        ticks_per_day = model.ticks_per_day
+        timesteps_needed = math.ceil(charge_needed / (float(self.charging_speed[i]) * model.tick_hours))
+        if timesteps_needed > abs(ending_time - starting_time):
+            logging.warning('not enough timesteps for car {} to charge'.format(self.key[i]))
+            timesteps = np.arange(starting_time, ending_time)
+        else:
+            key = (starting_time % ticks_per_day, ending_time - starting_time, timesteps_needed)
+            cheapest = schedules.get(key)
+            if cheapest is None:
+                start, end = starting_time % ticks_per_day, ending_time % ticks_per_day
+                total_time_window = prices[start:end] if start < end else np.concatenate((prices[start:], prices[:end]))
+                cheapest = schedules[key] = np.argpartition(total_time_window, timesteps_needed - 1)[:timesteps_needed]
+            timesteps = cheapest + starting_time
+        if len(timesteps) > self.cheapest.shape[1]:
+            self.cheapest = np.pad(self.cheapest, ((0, 0), (0, len(timesteps) - self.cheapest.shape[1])))
+        self.cheapest[i, :len(timesteps)] = timesteps
+        self.n_cheapest[i] = len(timesteps)
+
+    def cheap_now(self, index):
+        """whether one of the cheapest timesteps of the EVs at index is a multiple of t (as EV.step checks)"""
+        width = max(int(self.n_cheapest[index].max(initial=0)), 1)
+        timesteps = self.cheapest[index, :width]
+        valid = np.arange(width) < self.n_cheapest[index, None]
+        return ((timesteps % self.model.t == 0) & valid).any(axis=1)
+
+    def charge_and_demand(self, sl):
+        """plug-in decision, charge and discharge, battery percentage, power demand and VTG capacity of a chunk"""
+        model = self.model
+        t = model.t
+        location = self.location[sl]
+        current = self.current_battery_volume[sl]
+        volume = self.battery_volume[sl]
+        plugged_in = self.plugged_in[sl]
+        smart = self.smart[sl]
+        onroad = location == ONROAD
+        # plug in, EVs without a preference follow stick_to_pref once it is drawn
+        parked = ~onroad
+        enough = current >= self.energy_required[sl]
+        no_pref = parked & enough & (self.charge_pref[sl] == ChargePref.NONE)
+        decided = no_pref & self.stick_decided[sl]
+        plugged_in[parked & ~no_pref] = True
+        plugged_in[decided] = ~self.stick_to_pref[sl][decided]
+        # discharge on the road, charge when plugged in (smart EVs only at their cheapest timesteps)
+        self.charging[sl][onroad] = False
+        current[onroad] -= self.energy_rate[sl][onroad] * self.distance_per_tick[sl][onroad]
+        cheap = np.zeros(len(location), dtype=bool)
+        smart_plugged = np.flatnonzero(plugged_in & smart)
+        cheap[smart_plugged] = self.cheap_now(sl.start + smart_plugged)
+        force_charge = self.force_charge[sl]
+        charge = parked & plugged_in & (~smart | cheap | force_charge)
+        self._charge(sl, charge)
+        force_charge[charge | (parked & ~plugged_in)] = False
+        self.charging[sl][parked & ~charge] = False
+        self.battery_percentage[sl] = (current / volume) * 100
+        # power demand per 15 minutes and VTG capacity (EV.determine_power_demand)
+        increase = self.increase[sl]
+        quarter = self.quarter[sl]
+        charging = self.charging[sl] & plugged_in
+        periods = np.minimum(model.tick_scale, np.maximum(1, np.ceil(self.energy_charged[sl] / quarter)))
+        self.current_power_demand[sl] = np.where(charging, quarter * periods / model.tick_scale, 0)
+        must_finish = self.time_charging_must_finish[sl]
+        needed = self.needed_battery_level_at_charging_end[sl]
+        start = self.battery_level_at_charging_start[sl]
+        postpone = plugged_in & ((current - increase) > (needed - (increase * (must_finish - t))))
+        vtg = np.where(postpone & np.where(smart, cheap, current < volume), quarter, 0)
+        intersection_x = 0.5 * (must_finish + t) + (((0.5 / model.tick_hours) / self.charging_speed[sl]) *
+                                                    (current - needed))
+        intersection_y = model.tick_hours * self.charging_speed[sl] * (-intersection_x + t) + current
+        bound = np.minimum(current - start, current - intersection_y)
+        self.VTG_base[sl] = vtg
+        self.VTG_bound[sl] = np.where(plugged_in, bound, 0)
+        self.VTG_capacity[sl] = np.where(plugged_in, vtg + np.maximum(
+            np.minimum(bound, self.allowed_VTG_percentage * volume), 0), 0)
+        unplugged = ~plugged_in
+        start[unplugged] = np.nan
+        must_finish[unplugged] = np.nan
+        needed[unplugged] = np.nan
+
+    def municipality_step(self):
+        """Municipality.step of all municipalities, over the EVs present in the order of their current_EVs"""
+        place = self.place()
+        order = np.lexsort((self.stamp, place))
+        order = order[place[order] >= 0]
+        municipalities = list(self.model.municipalities)
+        bounds = np.searchsorted(place[order], np.arange(len(municipalities) + 1))
+        groups = self.chunks_of(len(municipalities))
+        demand = self.current_power_demand[order].tolist()
+        vtg = self.VTG_capacity[order]
+        percentage = self.battery_percentage[order]
+
+        def reduce(group):
+            results = []
+            for m in range(group.start, group.stop):
+                start, stop = bounds[m], bounds[m + 1]
+                number = stop - start
+                if number:
+                    # the demand is summed over the list as Municipality.update_power_demand does,
+                    # the means are the pairwise sums of np.mean
+                    results.append((sum(demand[start:stop]), number, vtg[start:stop].sum() / number,
+                                    percentage[start:stop].sum() / number))
+                else:
+                    results.append((0, 0, None, None))
+            return results
+
+        results = [result for group in self.map(reduce, groups) for result in group]
+        for mun, (power_demand, number, vtg_capacity, battery_percentage) in zip(municipalities, results):
+            mun.current_power_demand = power_demand
+            mun.number_EVs = int(number)
+            if number:
+                mun.current_vtg_capacity = vtg_capacity
+                mun.average_battery_percentage = battery_percentage
+
+    def chunks_of(self, n):
+        """n items in one group per thread"""
+        size = max(1, math.ceil(n / self.threads))
+        return [range(start, min(start + size, n)) for start in range(0, n, size)]
+
+    def sync(self):
+        """writes the state of the arrays to the EV agents and their municipalities"""
+        evs = list(self.model.EVs)
+        for name in FLOAT_FIELDS:
+            values = self.values(name).tolist()
+            none = np.isnan(self.values(name)).tolist()
+            for ev, value, missing in zip(evs, values, none):
+                setattr(ev, name, None if missing else value)
+        for ev, value in zip(evs, self.time_charging_must_finish.tolist()):
+            if ev.time_charging_must_finish is not None:
+                ev.time_charging_must_finish = int(value)
+        for name in INT_FIELDS:
+            for ev, value in zip(evs, self.values(name).tolist()):
+                setattr(ev, name, None if value == NO_TIME else value)
+        for name in BOOL_FIELDS:
+            for ev, value in zip(evs, self.values(name).tolist()):
+                setattr(ev, name, value)
+        for i, ev in enumerate(evs):
+            ev.current_location = LOCATION_NAMES[self.location[i]]
+            ev.stick_to_pref = bool(self.stick_to_pref[i]) if self.stick_decided[i] else None
+            ev.cheapest_timesteps = self.cheapest[i, :self.n_cheapest[i]].tolist()
+        municipalities = list(self.model.municipalities)
+        for mun in municipalities:
+            mun.current_EVs = []
+        place = self.place()
+        for i in np.lexsort((self.stamp, place)).tolist():
+            if place[i] >= 0:
+                municipalities[place[i]].current_EVs.append(evs[i])
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,31 @@
+import importlib
+
+"""
+Modules imported on first use
+
+The model itself only needs NumPy (and agentpy) to run; pandas is used for
+reading input data and writing results. Modules on the import path of the
+model use lazy_module('pandas') instead of import pandas, so importing the
+model or starting a worker does not load it until it is needed.
+"""
+
+
+class LazyModule:
+    """stands in for a module until one of its attributes is used"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        return '<lazy module {!r}{}>'.format(self._name, '' if self._module is None else ' (loaded)')
+
+
+def lazy_module(name):
+    """module that is imported when it is first used"""
+    return LazyModule(name)
@@ -0,0 +1,258 @@
+import io
+import numpy as np
+import pandas as pd
+
+"""
+Live monitoring view of a running model or of a growing result file
+
+New ticks are appended to fixed-size ring buffers and pushed into existing
+matplotlib artists, so the cost of a frame depends on the buffer capacity
+and not on how long the model has been running. Long histories are
+decimated (min/max per bucket) before drawing.
+"""
+
+DEFAULT_VARIABLES = ('total_VTG_capacity', 'total_current_power_demand')
+TITLES = {
+    'total_VTG_capacity': 'VTG Capacity',
+    'total_current_power_demand': 'Total Current Power Demand',
+    'average_battery_percentage': 'Average Battery Percentage',
+    'mean_charging': 'Mean Charging',
+}
+
+
+class RingBuffer:
+    """fixed capacity buffer of rows, the oldest rows are overwritten"""
+
+    def __init__(self, capacity, width=None, dtype=np.float64):
+        shape = (capacity,) if width is None else (capacity, width)
+        self.data = np.full(shape, np.nan, dtype=dtype)
+        self.capacity = capacity
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, row):
+        self.data[self.count % self.capacity] = row
+        self.count += 1
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=self.data.dtype)[-self.capacity:]
+        position = (self.count + np.arange(len(rows))) % self.capacity
+        self.data[position] = rows
+        self.count += len(rows)
+
+    def values(self):
+        """rows in the order they were appended"""
+        if self.count <= self.capacity:
+            return self.data[:self.count]
+        start = self.count % self.capacity
+        return np.concatenate([self.data[start:], self.data[:start]])
+
+
+def decimate(x, y, max_points):
+    """
+    Keeps the minimum and the maximum of every bucket, so peaks stay visible
+    with at most max_points points.
+    """
+    n = len(y)
+    if n <= max_points:
+        return x, y
+    size = int(np.ceil(n / (max_points // 2)))
+    buckets = int(np.ceil(n / size))
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    start = np.arange(buckets) * size
+    low = start + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    high = start + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    index = np.minimum(np.sort(np.column_stack([low, high]), axis=1).ravel(), n - 1)
+    return x[index], y[index]
+
+
+def bucket_means(matrix, max_columns):
+    """averages consecutive rows of a (time, municipality) matrix down to at most max_columns rows"""
+    n = len(matrix)
+    if n <= max_columns:
+        return matrix
+    size = int(np.ceil(n / max_columns))
+    buckets = int(np.ceil(n / size))
+    padded = np.full((buckets * size, matrix.shape[1]), np.nan)
+    padded[:n] = matrix
+    with np.errstate(invalid='ignore'):
+        return np.nanmean(padded.reshape(buckets, size, -1), axis=1)
+
+
+class CsvTail:
+    """reads the rows appended to a csv file since the previous call"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.header = None
+
+    def read(self):
+        with open(self.path, 'rb') as file:
+            file.seek(self.offset)
+            text = file.read()
+        # only complete lines, a writer may be halfway a row
+        end = text.rfind(b'\n') + 1
+        if end == 0:
+            return None
+        self.offset += end
+        text = text[:end].decode()
+        if self.header is None:
+            header, _, text = text.partition('\n')
+            self.header = header.split(',')
+        if not text:
+            return None
+        return pd.read_csv(io.StringIO(text), header=None, names=self.header)
+
+
+class LiveView:
+    """
+    Line plots of model level variables and an optional heat strip of one
+    municipality variable (one row per municipality), drawn on axs in that
+    order. Feed it with update_from_model (a running model) or tail (a
+    growing csv file) and call draw to refresh the artists.
+    """
+
+    def __init__(self, axs, variables=DEFAULT_VARIABLES, capacity=4 * 672, max_points=1000,
+                 heat_variable=None):
+        self.axs = list(np.ravel(axs))
+        self.variables = list(variables)
+        self.capacity = capacity
+        self.max_points = max_points
+        self.heat_variable = heat_variable
+        self.ticks = RingBuffer(capacity)
+        self.buffer = RingBuffer(capacity, len(self.variables))
+        self.heat = None
+        self.heat_labels = None
+        self._tails = {}
+        self.build()
+
+    def build(self):
+        """creates the artists, also used to restore them after the axes were cleared"""
+        self.lines = []
+        for ax, variable in zip(self.axs, self.variables):
+            line, = ax.plot([], [])
+            ax.set_title(TITLES.get(variable, variable))
+            ax.set_xlabel('Time (15min)')
+            ax.set_ylabel('capacity (KW)')
+            self.lines.append(line)
+        self.image = None
+        if self.heat_variable is not None:
+            ax = self.axs[len(self.variables)]
+            ax.set_title(TITLES.get(self.heat_variable, self.heat_variable))
+            ax.set_xlabel('Time (15min)')
+            ax.set_ylabel('municipality')
+            self.image = ax.imshow(np.full((1, 1), np.nan), aspect='auto', origin='lower',
+                                   interpolation='nearest')
+
+    def stale(self):
+        """True if the axes were cleared since the artists were made"""
+        return any(line.axes is None or line not in line.axes.lines for line in self.lines)
+
+    def append(self, t, values, heat=None):
+        self.ticks.append(t)
+        self.buffer.append([np.nan if v is None else v for v in values])
+        if heat is not None:
+            if self.heat is None:
+                self.heat = RingBuffer(self.capacity, len(heat))
+            self.heat.append([np.nan if v is None else v for v in heat])
+
+    def update_from_model(self, model):
+        """appends the current tick of a running model"""
+        heat = None
+        if self.heat_variable is not None:
+            heat = [getattr(mun, self.heat_variable) for mun in model.municipalities]
+            if self.heat_labels is None:
+                self.heat_labels = list(model.municipalities.id)
+        self.append(model.t, [getattr(model, variable) for variable in self.variables], heat)
+
+    def tail(self, path, heat_path=None):
+        """
+        Appends the ticks added to result files since the previous call. path
+        holds model level variables (columns t and the variables), heat_path
+        municipality variables in long format (columns obj_id, t and the heat
+        variable), both as written by agentpy.
+        """
+        rows = self._tail(path)
+        if rows is not None:
+            self.ticks.extend(rows['t'].values)
+            self.buffer.extend(rows[self.variables].astype(float).values)
+        if heat_path is not None:
+            rows = self._tail(heat_path)
+            if rows is not None:
+                heat = rows.pivot_table(index='t', columns='obj_id', values=self.heat_variable, dropna=False)
+                if self.heat is None:
+                    self.heat = RingBuffer(self.capacity, heat.shape[1])
+                    self.heat_labels = list(heat.columns)
+                self.heat.extend(heat[self.heat_labels].values)
+
+    def _tail(self, path):
+        if path not in self._tails:
+            self._tails[path] = CsvTail(path)
+        return self._tails[path].read()
+
+    def draw(self):
+        """pushes the buffered (decimated) history into the artists, returns them"""
+        ticks = self.ticks.values()
+        values = self.buffer.values()
+        for i, (ax, line) in enumerate(zip(self.axs, self.lines)):
+            line.set_data(*decimate(ticks, values[:, i], self.max_points))
+            ax.relim()
+            ax.autoscale_view()
+        artists = list(self.lines)
+        if self.image is not None and self.heat is not None and len(self.heat):
+            matrix = self.heat.values()
+            heat_ticks = ticks[-len(matrix):] if len(ticks) >= len(matrix) else np.arange(len(matrix))
+            self.image.set_data(bucket_means(matrix, self.max_points).T)
+            self.image.set_extent((heat_ticks[0], heat_ticks[-1] + 1, 0, matrix.shape[1]))
+            if np.isfinite(matrix).any():
+                self.image.set_clim(np.nanmin(matrix), np.nanmax(matrix))
+            artists.append(self.image)
+        return artists
+
+
+def animate(model, fig, axs, steps=None, seed=None, view=None, **kwargs):
+    """
+    Animation of a model that only appends the new tick every frame. Unlike
+    agentpy.animate the axes are not cleared and the output is not rebuilt
+    every step. kwargs go to LiveView (if no view is given) and otherwise
+    to matplotlib's FuncAnimation.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    view_kwargs = {key: kwargs.pop(key) for key in ['variables', 'capacity', 'max_points', 'heat_variable']
+                   if key in kwargs}
+    view = view or LiveView(axs, **view_kwargs)
+    model.sim_setup(steps, seed)
+
+    def frames():
+        while model.running:
+            model.sim_step()
+            yield model.t
+
+    def update(t):
+        view.update_from_model(model)
+        return view.draw()
+
+    save_count = 10000 if model._steps is np.nan else model._steps + 1
+    animation = FuncAnimation(fig, update, frames=frames, save_count=save_count, **kwargs)
+    plt.close()
+    return animation
+
+
+def follow(path, fig, view, heat_path=None, interval=1000, **kwargs):
+    """animation that polls growing result files every interval ms"""
+    import itertools
+    from matplotlib.animation import FuncAnimation
+
+    def update(frame):
+        view.tail(path, heat_path)
+        return view.draw()
+
+    return FuncAnimation(fig, update, frames=itertools.count(), interval=interval,
+                         cache_frame_data=False, **kwargs)
@@ -0,0 +1,585 @@
+import agentpy as ap
+from .components import EV, Municipality, draw_ev_attributes, draw_ev_choices
+from .OD_matrix import (generate_OD)
+from .rng import CounterStreams, Purpose, ev_key, municipality_number, replicate_seed
+from .fleet_cache import FleetCache
+from .data_providers import data_provider, read_prices
+from .event_log import EventLog
+from .ema_outcomes import SeriesRecorder, series_names, spill
+from .fanout import Fanout
+from .price_sweep import subfleet_mask
+from .replay import EVTrace, replay_mask
+from .fleet_kernels import FleetKernels
+from .telemetry import Telemetry
+from .warmup import WarmupDetector
+from .warm_start import SteadyStateLibrary, steady_state, warm_start
+from .region import BOUNDARY_CODE, BOUNDARY_NAME, Region
+import logging
+import os
+import numpy as np
+from timeit import default_timer as timer
+
+"""
+Main model block
+"""
+
+def check_not_none(value):
+    """check if value is not None and not np.nan"""
+
+    if value is not None and not np.isnan(value):
+        return True
+    else:
+        return False
+
+def series_reporters(battery_percentage, power_demand, VTG_capacity, mean_charging):
+    """reporters of the fleet series, their minimum, mean and maximum (the minimum and mean of the battery)"""
+    reporters = {}
+    if battery_percentage:
+        reporters['min_average_battery_percentage'] = min(battery_percentage)
+        reporters['mean_average_battery_percentage'] = np.mean(battery_percentage)
+    else:
+        logging.info(
+            'specified model parameters results in no records for average battery percentage')
+
+    if power_demand:
+        # for some reason, storing a value of 0 gives an error in ema sobol analysis, so convert to 0.0000000001
+        min_value = min(power_demand)
+        if min_value == 0:
+            min_value = 0.0000000001
+        reporters['min_power_demand'] = min_value
+        reporters['mean_power_demand'] = np.mean(power_demand)
+        reporters['max_power_demand'] = max(power_demand)
+    else:
+        logging.info(
+            'specified model parameters results in no records for total current power demand')
+
+    if VTG_capacity:
+        # for some reason, storing a value of 0 gives an error in ema sobol analysis, so convert to 0.0000000001
+        min_value = min(VTG_capacity)
+        if min_value == 0:
+            min_value = 0.0000000001
+        reporters['min_VTG_capacity'] = min_value
+        reporters['mean_VTG_capacity'] = np.mean(VTG_capacity)
+        reporters['max_VTG_capacity'] = max(VTG_capacity)
+    else:
+        logging.info(
+            'specified model parameters results in no records for total VTG capacity')
+
+    if mean_charging:
+        # for some reason, storing a value of 0 gives an error in ema sobol analysis, so convert to 0.0000000001
+        min_value = min(mean_charging)
+        if min_value == 0:
+            min_value = 0.0000000001
+        reporters['min_mean_charging'] = min_value
+        reporters['mean_mean_charging'] = np.mean(mean_charging)
+        reporters['max_mean_charging'] = max(mean_charging)
+    else:
+        logging.info(
+            'specified model parameters results in no records for mean charging')
+    return reporters
+
+class EtmEVsModel(ap.Model):
+    """Main model that simulates electric vehicles."""
+
+    def setup(self):
+
+        # start timer for log
+        start = timer()
+        self.setup_run()
+
+        self.municipalities_data = self.data.municipalities().set_index('GM_CODE')
+        # regional sub-model (parameter region): its municipalities and the EVs living or working there, see region.py
+        self.region = None
+        if self.p.get('region'):
+            self.region = Region(self.p.region, self.municipalities_data.reset_index())
+
+        # OD matrix and EV draws can be reused from the fleet cache (a directory), see fleet_cache.py
+        fleet_cache = None
+        cached = None
+        if self.p.get('fleet_cache'):
+            fleet_cache = FleetCache(self.p.fleet_cache, self.p, self.streams.seed, self.data,
+                                     None if self.region is None else self.region.codes)
+            cached = fleet_cache.load()
+        # generate the manicipalities according to data prep file
+        if cached is None:
+            self.OD = generate_OD(self.p.g, self.p.m, self.data)
+        else:
+            self.OD, fleet = cached
+        origins = list(self.OD)
+
+        # calculate percentage evs
+        percentage_ev = self.p.n_evs / \
+            sum(self.municipalities_data['AANT_INW'])
+        # EVs per municipality of the whole country
+        number_EVs = [round(percentage_ev * self.municipalities_data.loc[key, 'AANT_INW']) for key in origins]
+        # numeric code of every municipality, part of the keys of its EVs
+        numbers = [municipality_number(key, index) for index, key in enumerate(origins)]
+        # correct rounding in number evs
+        number_evs = sum(number_EVs)
+        if number_evs > self.p.n_evs:
+            n = number_evs - self.p.n_evs
+            for i in range(n):
+                number_EVs[self.rounding_index(i, len(origins))] -= 1
+        elif number_evs < self.p.n_evs:
+            n = self.p.n_evs - number_evs
+            for i in range(n):
+                number_EVs[self.rounding_index(i, len(origins))] += 1
+        # generate EV's
+        # keys of the EVs, the sequence number within the home municipality
+        keys = np.array([ev_key(numbers[index], i) for index in range(len(origins)) for i in range(number_EVs[index])],
+                        dtype=np.int64)
+        home_index = np.repeat(np.arange(len(origins)), number_EVs)
+        if cached is None:
+            fleet = self.draw_fleet(keys, home_index, origins)
+            if self.region is not None:
+                fleet = self.region.select(fleet, origins)
+            if fleet_cache is not None:
+                fleet_cache.save(self.OD, fleet)
+
+        # generate all manucipality agents, (id, OD, EVs, number) of each
+        if self.region is None:
+            built = [(key, self.OD[key], number_EVs[index], numbers[index]) for index, key in enumerate(origins)]
+        else:
+            keys = np.asarray(fleet['key'], dtype=np.int64)
+            counts = np.bincount(fleet['home_index'], minlength=len(self.region.codes) + 1)
+            built = [(key, self.OD.get(key), counts[index], numbers[origins.index(key)] if key in self.OD else 0)
+                     for index, key in enumerate(self.region.codes)]
+            built.append((BOUNDARY_CODE, None, counts[-1], municipality_number(BOUNDARY_CODE, 0)))
+        self.municipalities = ap.AgentList(self, 0, Municipality)
+        # give the right properties to every municipality according to data prep file
+        for key, OD, n, number in built:
+            new_mun = Municipality(self)
+            new_mun.id = key
+            if key == BOUNDARY_CODE:
+                new_mun.name = BOUNDARY_NAME
+                new_mun.inhabitants = self.region.boundary_inhabitants
+            else:
+                new_mun.name = self.municipalities_data.loc[key, 'GM_NAAM']
+                new_mun.inhabitants = self.municipalities_data.loc[key, 'AANT_INW']
+            new_mun.OD = OD
+            new_mun.number_EVs = n
+            new_mun.number = number
+            self.municipalities.append(new_mun)
+        self.number_evs = sum(self.municipalities.number_EVs)
+        # parameters that differ between scenarios, drawn for every run
+        choices = draw_ev_choices(self.streams, self.p, keys)
+        # only the smart or the non smart EVs (parameter subfleet), see price_sweep.py
+        keep = subfleet_mask(self.p.get('subfleet'), choices['smart'])
+        # only some EVs (parameter replay, EV keys), see replay.py
+        if self.p.get('replay') is not None:
+            keep &= replay_mask(self.p.replay, keys)
+        travel_time, distance_per_tick, energy_required, battery_volume = self.trips(keys, fleet)
+
+        # generate EV agentlist
+        self.EVs = ap.AgentList(self, 0, EV)
+        names = self.municipalities_data['GM_NAAM'].to_dict()
+        names[BOUNDARY_CODE] = BOUNDARY_NAME
+        columns = {name: np.asarray(fleet[name]).tolist() for name in
+                   ['charging_speed', 'departure_time', 'dwell_time', 'offset_dep', 'offset_dwell', 'battery_volume',
+                    'energy_rate', 'work_location_id', 'commute_distance']}
+        columns.update({name: values.tolist() for name, values in choices.items()})
+        travel_time, energy_required, battery_volume = travel_time.tolist(), energy_required.tolist(), \
+            battery_volume.tolist()
+        distance_per_tick = distance_per_tick.tolist()
+        index = 0  # keeps track of the EV index
+        # give the right properties to every EV according to the data prep file
+        for mun in self.municipalities:
+            mun_start = timer()
+            for ev in range(mun.number_EVs):
+                if not keep[index]:
+                    index += 1
+                    continue
+                # generate ev and add to agentlist
+                new_ev = EV(self, key=int(keys[index]),
+                            attributes={name: values[index] for name, values in columns.items()})
+                # set home location
+                new_ev.home_location = mun.name
+                new_ev.home_id = mun.id
+                new_ev.work_location_id = columns['work_location_id'][index]
+                new_ev.work_location_name = names[new_ev.work_location_id]
+                new_ev.commute_distance = columns['commute_distance'][index]
+                new_ev.travel_time = travel_time[index]
+                new_ev.distance_per_tick = distance_per_tick[index]
+                new_ev.energy_required = energy_required[index]
+                new_ev.battery_volume = battery_volume[index]
+                # set current volume to final max volume
+                new_ev.current_battery_volume = new_ev.battery_volume * 0.9
+                # set VTG percentage
+                new_ev.allowed_VTG_percentage = self.model.p.VTG_percentage
+                mun.current_EVs.append(new_ev)
+                self.EVs.append(new_ev)
+                index += 1
+            mun_end = timer()
+            logging.debug("mun {} complete, create {} evs, total {} evs created, create time {}, time now {}, evs per sec {}".
+                          format(mun.name, mun.number_EVs, index + 1, round(mun_end - mun_start),
+                                 round(mun_end - start), round(mun.number_EVs / max(mun_end - mun_start, 1e-9))))
+
+        if self.p.get('subfleet') or self.p.get('replay') is not None:
+            for mun in self.municipalities:
+                mun.number_EVs = len(mun.current_EVs)
+            self.number_evs = len(self.EVs)
+        # initial state of the EVs from the steady state of a reference run (parameter warm_start), see warm_start.py
+        if self.p.get('warm_start'):
+            self.warm_started = warm_start(self)
+        if self.p.get('kernels'):
+            if self.p.get('event_log'):
+                raise ValueError('the event log needs the agent step, it cannot be combined with kernels')
+            self.kernels = FleetKernels.from_model(self, self.p.get('threads', 1), self.p.get('chunk_size', 'auto'))
+        if self.p.get('event_log'):
+            # one directory per run of an experiment
+            run = 'run' if self._run_id is None else 'run_{}_{}'.format(*self._run_id)
+            self.events = EventLog(os.path.join(self.p.event_log, run), self)
+        if self.p.get('series_outcomes'):
+            self.series = SeriesRecorder(self, series_names(self.p.series_outcomes))
+        if self.p.get('fanout'):
+            self.fanout = Fanout(self, self.p.fanout)
+        if self.p.get('trace') is not None or self.p.get('replay') is not None:
+            self.trace = EVTrace(self, self.p.get('trace', self.p.get('replay')))
+        if self.p.get('warmup') is not None:
+            self.warmup = WarmupDetector(self, self.p.warmup, self.p.get('horizon'))
+
+        # end timer for log model init
+        end = timer()
+
+        # additional logging
+        logging.info("Model init completed in {} seconds".format(end - start))
+        # push some stats to log file
+        logging.info('MODEL CONFIGURATION')
+        logging.info('EVs in model: {}'.format(len(self.EVs)))
+        logging.info('Municipalities in model: {}'.format(
+            len(self.municipalities)))
+        logging.info('average battery volume of EVs (kWh): {}'.format(
+            np.mean(list(self.EVs.battery_volume))))
+        logging.info(
+            'average energy rate of EVs (kWh/km): {}'.format(np.mean(list(self.EVs.energy_rate))))
+        if self.p.get('telemetry'):
+            run = 'run' if self._run_id is None else 'run_{}_{}'.format(*self._run_id)
+            self.telemetry = Telemetry(os.path.join(self.p.telemetry, run + '.csv'), self.p.get('telemetry_flush', 96))
+
+    def setup_run(self):
+        """log level, random streams, time resolution, prices and outcome lists, the part of setup without the fleet"""
+        # the model logs to the logging module, where it goes is configured by the caller (etm-evs --log, model_run.py)
+        # level of the log during this run (parameter log_level, e.g. DEBUG for a replay), restored by end
+        self.previous_log_level = None
+        if self.p.get('log_level'):
+            self.previous_log_level = logging.getLogger().level
+            logging.getLogger().setLevel(self.p.log_level)
+        # counter based random streams for all EV draws, keyed by seed, EV, tick and purpose
+        if self.p.get('crn'):
+            # common random numbers: the seed only depends on the base seed and the replicate, not on the scenario
+            self.streams = CounterStreams(replicate_seed(self.p.get('seed', 0), self.replicate()))
+        elif 'seed' in self.p:
+            self.streams = CounterStreams(self.p.seed)
+        else:
+            self.streams = CounterStreams(self.random.getrandbits(64))
+        # event log of trips, plug-in sessions and charging intervals, see event_log.py
+        self.events = None
+        # per tick outcomes reported as arrays, see ema_outcomes.py
+        self.series = None
+        # outcomes for other values of outcome-only parameters, see fanout.py
+        self.fanout = None
+        # warm-up, fixed or detected (warmup='auto'), and the ticks to run after it, see warmup.py
+        self.warmup = None
+        # array step of the EVs on a thread pool (kernels=True), see fleet_kernels.py
+        self.kernels = None
+        # phase times and event counts per tick (parameter telemetry), see telemetry.py
+        self.telemetry = None
+        # state of some EVs after every tick (parameters trace and replay), see replay.py
+        self.trace = None
+        # length of a tick, all time parameters (departure, dwell, offsets, driving speed) are given per 15 minutes
+        self.tick_minutes = self.p.get('tick_minutes', 15)
+        if 1440 % self.tick_minutes != 0 or self.tick_minutes % 15 != 0:
+            raise ValueError('tick_minutes should be a multiple of 15 that divides a day, not {}'.format(
+                self.tick_minutes))
+        self.tick_hours = self.tick_minutes / 60
+        self.tick_scale = self.tick_minutes / 15  # 15 minute periods in a tick
+        self.ticks_per_day = 1440 // self.tick_minutes
+        self.ticks_per_week = 7 * self.ticks_per_day
+        # the prices, the calendar and the draws of the EVs follow the clock t + start_tick (whole days), so a run
+        # can start later in the price series, see time_parallel.py
+        self.start_tick = self.p.get('start_tick', 0)
+        if self.start_tick % self.ticks_per_day != 0:
+            raise ValueError('start_tick should be a whole number of days, not {} ticks'.format(self.start_tick))
+        if self.start_tick and (self.p.get('warm_start') or self.p.get('save_steady_state')):
+            raise ValueError('stored steady states start and end on a Monday at tick 0, not with start_tick')
+        # model properties
+        self.price_history = [[0] for i in range(self.ticks_per_day)]
+        self.ma_price_history = []
+        # input data, the csv files of ../data unless the parameter data gives another provider or path
+        self.data = data_provider(self.p.get('data'))
+        # price per tick, the mean of the 15 minute prices within the tick; the parameter prices replaces those of
+        # the data, see price_sweep.py
+        self.tick_prices = np.asarray(read_prices(self.p.prices) if self.p.get('prices') is not None
+                                      else self.data.prices())
+        if self.tick_minutes > 15:
+            periods = self.tick_minutes // 15
+            self.tick_prices = self.tick_prices[:len(self.tick_prices) // periods * periods] \
+                .reshape(-1, periods).mean(axis=1)
+        self.average_battery_percentage = 100
+        self.total_current_power_demand = None
+        self.total_VTG_capacity = None
+        self.mean_charging = None
+        self.list_average_battery_percentage = []
+        self.list_total_current_power_demand = []
+        self.list_total_VTG_capacity = []
+        self.list_mean_charging = []
+        day_of_week = self.start_tick % self.ticks_per_week
+        self.weekend = day_of_week >= 5 * self.ticks_per_day
+        self.t_weekend = self.start_tick - day_of_week + 5 * self.ticks_per_day  # saturday
+        if self.weekend:
+            self.t_weekend += self.ticks_per_week
+
+    def ev_values(self, name):
+        """array of an attribute of all EVs, in agent order"""
+        if self.kernels is not None:
+            return self.kernels.values(name)
+        return np.array(list(getattr(self.EVs, name)), dtype=float)
+
+    def replicate(self):
+        """replicate number of the run, the parameter replicate or the iteration of an experiment"""
+        if self.p.get('replicate') is not None:
+            return int(self.p.replicate)
+        if self._run_id is not None and self._run_id[1] is not None:
+            return self._run_id[1]
+        return 0
+
+    def rounding_index(self, i, n):
+        """index of the i-th randomly picked of n municipalities, used to correct rounding of EV numbers"""
+        u = self.streams.random(i, 0, Purpose.ROUNDING)
+        return int(u * n)
+
+    def draw_fleet(self, keys, home_index, origins):
+        """destinations and setup draws of all EVs, home_index refers to origins (the keys of the OD matrix)"""
+        work_location_id = np.empty(len(keys), dtype=object)
+        commute_distance = np.empty(len(keys))
+        # EVs are ordered by home municipality
+        first = np.searchsorted(home_index, np.arange(len(origins) + 1))
+        for index, key in enumerate(origins):
+            evs = slice(first[index], first[index + 1])
+            if first[index + 1] > first[index]:
+                # pick destinations, higher p_flow gives higher chance to be picked
+                OD = self.OD[key]
+                destination_index = self.sample_destinations(OD, keys[evs])
+                work_location_id[evs] = OD['destination_id'].values[destination_index]
+                commute_distance[evs] = OD['distance'].values[destination_index]
+        fleet = draw_ev_attributes(self.streams, self.p, keys)
+        fleet.update(key=keys, home_index=home_index, work_location_id=work_location_id,
+                     commute_distance=commute_distance)
+        return fleet
+
+    def trips(self, keys, fleet):
+        """travel time, distance per tick, energy required and battery volume of the EVs of a fleet"""
+        commute_distance = np.asarray(fleet['commute_distance'])
+        energy_rate = np.asarray(fleet['energy_rate'])
+        # travel times in ticks, give at least 1 time step
+        quarter_hours = np.maximum(1, np.round(commute_distance / self.p.average_driving_speed))
+        travel_time = np.maximum(1, np.round(quarter_hours / self.tick_scale)).astype(np.int64)
+        # the energy of a trip does not depend on the tick length, it is spread over the ticks on the road
+        distance_per_tick = self.p.average_driving_speed * quarter_hours / travel_time
+        # give a enery required for trip memory
+        energy_required = energy_rate * commute_distance
+        battery_volume = np.array(fleet['battery_volume'])
+        # check if maximum battery volume in model is enough to reach destination, if not, give the value needed to reach destination
+        extended = self.p.h_vol < energy_required
+        battery_volume[extended] = energy_required[extended]
+        for key in keys[extended]:
+            logging.warning('vehicle {} created with extended volume outside max volume range'.format(key))
+        # check if battery volume is enough to reach destination, if not draw triangular going down from energy required
+        for i in np.flatnonzero(battery_volume < energy_required):
+            battery_volume[i] = self.streams.triangular(keys[i], 0, Purpose.BATTERY_REDRAW,
+                energy_required[i], energy_required[i] + 1, self.p.h_vol)
+        return travel_time, distance_per_tick, energy_required, battery_volume
+
+    def sample_destinations(self, OD, keys):
+        """index of the destination row in OD for every EV key, weighted by p_flow"""
+        cumulative = np.cumsum(np.nan_to_num(OD['p_flow'].values))
+        u = self.streams.random(np.asarray(keys), 0, Purpose.DESTINATION)
+        index = np.searchsorted(cumulative, u * cumulative[-1], side='right')
+        return np.minimum(index, len(cumulative) - 1)
+
+    def step(self):
+        if self.telemetry is not None:
+            self.telemetry.start()
+        self.update_calendar()
+        self.lap('calendar')
+
+        # for EVs
+        self.fill_history()
+        self.lap('fill_history')
+        self.calc_ma_price_history()
+        self.lap('ma_price_history')
+        if self.kernels is not None:
+            # EVs, totals and municipalities as arrays
+            self.kernels.step()
+            self.lap('ev_step')
+            return
+        self.EVs.step()
+        self.lap('ev_step')
+        if self.region is None:
+            self.average_battery_percentage = np.mean(
+                list(self.EVs.battery_percentage))
+            self.total_current_power_demand = np.sum(
+                list(self.EVs.current_power_demand))
+            self.total_VTG_capacity = np.sum(list(self.EVs.VTG_capacity))
+            self.mean_charging = np.mean(list(self.EVs.charging))
+        else:
+            # only the EVs on the grid of the region, see region.py
+            self.region_totals(list(self.EVs.battery_percentage), list(self.EVs.current_power_demand),
+                               list(self.EVs.VTG_capacity), list(self.EVs.charging))
+        self.lap('reductions')
+        # debug stats
+        logging.debug('time {} EVs on road:{}'.format(self.model.t, len(
+            self.EVs.select(self.EVs.current_location == 'onroad'))))
+        logging.debug('time {} EVs at home:{}'.format(self.model.t, len(
+            self.EVs.select(self.EVs.current_location == 'home'))))
+        logging.debug('time {} EVs at work:{}'.format(self.model.t, len(
+            self.EVs.select(self.EVs.current_location == 'work'))))
+        self.lap('debug_stats')
+
+        # for municipalities
+        self.municipalities.step()
+        self.lap('municipalities')
+
+    def region_mask(self):
+        """
+        EVs (in agent order) parked in a municipality of the region, not on the
+        road or in the boundary municipality; None in a national run
+        """
+        if self.region is None:
+            return None
+        if self.kernels is not None:
+            return self.kernels.region_mask()
+        codes = set(self.region.codes)
+        return np.array([(ev.current_location == 'home' and ev.home_id in codes) or
+                         (ev.current_location == 'work' and ev.work_location_id in codes) for ev in self.EVs],
+                        dtype=bool)
+
+    def region_totals(self, battery_percentage, power_demand, VTG_capacity, charging):
+        """model totals of a regional run from the values of all EVs, over the EVs parked in the region"""
+        present = self.region_mask()
+        self.total_current_power_demand = np.sum(np.asarray(power_demand, dtype=float)[present])
+        self.total_VTG_capacity = np.sum(np.asarray(VTG_capacity, dtype=float)[present])
+        if present.any():
+            self.average_battery_percentage = np.mean(np.asarray(battery_percentage, dtype=float)[present])
+            self.mean_charging = np.mean(np.asarray(charging, dtype=bool)[present])
+        else:
+            self.average_battery_percentage = self.mean_charging = None
+
+    def lap(self, phase):
+        """time of a phase of the tick, for the telemetry"""
+        if self.telemetry is not None:
+            self.telemetry.lap(phase)
+
+    @property
+    def clock(self):
+        """tick of the prices, the calendar and the draws of the EVs"""
+        return self.t + self.start_tick
+
+    def update_calendar(self):
+        """update weekend property"""
+        if self.clock % self.t_weekend == 0:
+            self.weekend = True
+            self.t_weekend += self.ticks_per_week
+        if self.clock % self.ticks_per_week == 0:
+            self.weekend = False
+        if self.weekend:
+            logging.info("{} Weekend day".format(self.t))
+        else:
+            logging.info("{} it's no weekend.".format(self.t))
+
+    def update(self):
+        """ Record dynamic variables """
+        # model level, record and add to list for end stats (if not None and not np.nan)
+        self.record('average_battery_percentage')
+        if check_not_none(self.average_battery_percentage):
+            self.list_average_battery_percentage.append(
+                self.average_battery_percentage)
+        self.record('total_current_power_demand')
+        if check_not_none(self.total_current_power_demand):
+            self.list_total_current_power_demand.append(
+                self.total_current_power_demand)
+        self.record('total_VTG_capacity')
+        if check_not_none(self.total_VTG_capacity):
+            self.list_total_VTG_capacity.append(self.total_VTG_capacity)
+        self.record('mean_charging')
+        if check_not_none(self.mean_charging):
+            self.list_mean_charging.append(self.mean_charging)
+
+        # municipality level
+        self.municipalities.record('average_battery_percentage')
+        self.municipalities.record('current_power_demand')
+        self.municipalities.record('current_vtg_capacity')
+        self.municipalities.record('current_power_demand')
+        self.municipalities.record('number_EVs')
+        if self.series is not None:
+            self.series.update()
+        if self.fanout is not None:
+            self.fanout.update()
+        if self.warmup is not None:
+            self.warmup.update()
+        if self.trace is not None:
+            self.trace.update()
+        if self.telemetry is not None:
+            self.telemetry.lap('update')
+            self.telemetry.end_tick(self.t, len(self.EVs) if self.kernels is None else self.kernels.n)
+
+    def fill_history(self):
+        '''
+        Fills the memory of agents with the previous prices
+
+        SHOULD BE DONE ON SUPERCLASS LEVEL TO SAVE DATA AND COMPUTATIONS
+
+        '''
+        index = self.clock % len(self.tick_prices)
+        self.price_history[(
+            self.t % self.ticks_per_day)-1].append(round(self.tick_prices[index], 2))
+
+    def calc_ma_price_history(self):
+        '''
+        From self.price_history creates avarage prices for a 24h cycle
+
+        Could be expanded to a 4*24h cycle if wanted
+
+        '''
+        self.ma_price_history.clear()
+        for i in self.price_history:
+            segment = i[max(-7, -len(i)):]
+            self.ma_price_history.append(round(np.mean(segment), 2))
+
+    def end(self):
+        """ report at end of the model"""
+        if self.telemetry is not None:
+            self.telemetry.close()
+        if self.events is not None:
+            self.events.close()
+        if self.kernels is not None:
+            self.kernels.sync()
+            self.kernels.close()
+        if self.p.get('save_steady_state'):
+            SteadyStateLibrary(self.p.save_steady_state, self.p, self.data).save(steady_state(self))
+        if self.p.get('warm_start'):
+            self.report('warm_started', self.warm_started)
+        # outcomes over the ticks after the warm-up, all ticks without the parameter warmup
+        battery_percentage = self.list_average_battery_percentage
+        power_demand = self.list_total_current_power_demand
+        VTG_capacity = self.list_total_VTG_capacity
+        mean_charging = self.list_mean_charging
+        if self.warmup is not None:
+            self.warmup.finish()
+            battery_percentage = self.warmup.after_warmup(battery_percentage, first_t=0)
+            power_demand = self.warmup.after_warmup(power_demand)
+            VTG_capacity = self.warmup.after_warmup(VTG_capacity)
+            mean_charging = self.warmup.after_warmup(mean_charging)
+            self.report('warmup_length', self.warmup.length)
+            self.report('warmup_converged', self.warmup.converged)
+            if self.warmup.horizon is not None:
+                self.report('warmup_horizon', self.warmup.horizon)
+        for name, value in series_reporters(battery_percentage, power_demand, VTG_capacity, mean_charging).items():
+            self.report(name, value)
+
+        if self.series is not None:
+            # with series_spill only the path of a float32 spill file is returned to the evaluator
+            for name, values in self.series.outcomes().items():
+                self.report(name, spill(self.p.series_spill, values) if self.p.get('series_spill') else values)
+        if self.previous_log_level is not None:
+            logging.getLogger().setLevel(self.previous_log_level)
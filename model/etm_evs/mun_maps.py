@@ -0,0 +1,147 @@
+import numpy as np
+
+"""
+Municipality result maps from a cached, simplified copy of the municipality geometries
+
+The geometries are read and simplified once (this needs geopandas) and stored
+as flat coordinate arrays sorted by GM_CODE. Rendering only needs numpy and
+matplotlib: results are placed in map order by array index, not by a merge.
+"""
+
+
+def build_geometry_cache(shapefile, path, tolerance=100, id_field='GM_CODE'):
+    """reads, simplifies (tolerance in map units) and caches the municipality geometries"""
+    import geopandas as gpd  # only needed to build the cache
+    gdf = gpd.read_file(shapefile)
+    geometries = gdf.geometry.simplify(tolerance, preserve_topology=True)
+    cache = GeometryCache.from_geometries(gdf[id_field], [g.__geo_interface__ for g in geometries])
+    cache.save(path)
+    return cache
+
+
+class GeometryCache:
+    """simplified municipality outlines as flat arrays, indexed by sorted municipality code"""
+
+    def __init__(self, codes, coords, ring_offsets, geometry_offsets):
+        self.codes = np.asarray(codes)
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.geometry_offsets = geometry_offsets
+        self._paths = None
+
+    @classmethod
+    def from_geometries(cls, codes, geometries):
+        """cache from municipality codes and GeoJSON-like (multi)polygon dicts"""
+        order = np.argsort(np.asarray(codes))
+        rings, ring_count = [], []
+        for i in order:
+            geometry = geometries[i]
+            polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            parts = [np.asarray(ring, dtype=np.float32)[:, :2] for polygon in polygons for ring in polygon]
+            rings.extend(parts)
+            ring_count.append(len(parts))
+        ring_offsets = np.r_[0, np.cumsum([len(ring) for ring in rings])]
+        geometry_offsets = np.r_[0, np.cumsum(ring_count)]
+        return cls(np.asarray(codes)[order], np.concatenate(rings), ring_offsets, geometry_offsets)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['codes'], data['coords'], data['ring_offsets'], data['geometry_offsets'])
+
+    def save(self, path):
+        np.savez(path, codes=self.codes, coords=self.coords, ring_offsets=self.ring_offsets,
+                 geometry_offsets=self.geometry_offsets)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def bounds(self):
+        return self.coords.min(axis=0), self.coords.max(axis=0)
+
+    def index(self, codes):
+        """position in the cache of every code, -1 for unknown codes"""
+        codes = np.asarray(codes)
+        position = np.searchsorted(self.codes, codes)
+        position = np.minimum(position, len(self.codes) - 1)
+        return np.where(self.codes[position] == codes, position, -1)
+
+    def align(self, codes, values):
+        """values in cache order, NaN for municipalities without a value"""
+        aligned = np.full(len(self), np.nan)
+        position = self.index(codes)
+        found = position >= 0
+        aligned[position[found]] = np.asarray(values, dtype=float)[found]
+        return aligned
+
+    def aggregate_matrix(self, df, value, by='sample_id', code_column='obj_id'):
+        """
+        Matrix (one row per value of `by`, one column per municipality) of a
+        per municipality aggregate, e.g. the result of a results_query group-by.
+        """
+        df = df.reset_index()
+        rows, row_index = np.unique(df[by].values, return_inverse=True)
+        matrix = np.full((len(rows), len(self)), np.nan)
+        position = self.index(df[code_column].values)
+        found = position >= 0
+        matrix[row_index[found], position[found]] = df[value].values[found]
+        return rows, matrix
+
+    def paths(self):
+        """one compound matplotlib path per municipality (holes included), built once"""
+        if self._paths is None:
+            from matplotlib.path import Path
+            self._paths = []
+            for g in range(len(self)):
+                first, last = self.geometry_offsets[g], self.geometry_offsets[g + 1]
+                start, end = self.ring_offsets[first], self.ring_offsets[last]
+                vertices = self.coords[start:end]
+                codes = np.full(len(vertices), Path.LINETO, dtype=Path.code_type)
+                codes[self.ring_offsets[first:last] - start] = Path.MOVETO
+                codes[self.ring_offsets[first + 1:last + 1] - start - 1] = Path.CLOSEPOLY
+                self._paths.append(Path(vertices, codes))
+        return self._paths
+
+
+def render_map(cache, values, ax, cmap='viridis', vmin=None, vmax=None, title=None):
+    """draws values (in cache order) on an axis, returns the collection"""
+    from matplotlib.collections import PathCollection
+    collection = PathCollection(cache.paths(), cmap=cmap, edgecolor='none')
+    collection.set_array(np.ma.masked_invalid(values))
+    collection.set_clim(vmin, vmax)
+    ax.add_collection(collection)
+    low, high = cache.bounds
+    ax.set_xlim(low[0], high[0])
+    ax.set_ylim(low[1], high[1])
+    ax.set_aspect('equal')
+    ax.set_axis_off()
+    if title is not None:
+        ax.set_title(title, fontsize=8)
+    return collection
+
+
+def render_small_multiples(cache, matrix, titles, path, ncols=6, per_page=36, cmap='viridis',
+                           label=None, dpi=100):
+    """
+    One map per row of matrix (rows in cache order), saved in pages of per_page
+    maps. All maps share one color scale. Returns the paths of the saved pages.
+    """
+    import matplotlib.pyplot as plt
+
+    vmin, vmax = np.nanmin(matrix), np.nanmax(matrix)
+    pages = []
+    for page, first in enumerate(range(0, len(matrix), per_page)):
+        rows = range(first, min(first + per_page, len(matrix)))
+        nrows = int(np.ceil(len(rows) / ncols))
+        fig, axs = plt.subplots(nrows, ncols, figsize=(2 * ncols, 2.4 * nrows), squeeze=False)
+        for ax in axs.flat:
+            ax.set_axis_off()
+        for ax, row in zip(axs.flat, rows):
+            collection = render_map(cache, matrix[row], ax, cmap, vmin, vmax, titles[row])
+        fig.colorbar(collection, ax=axs, shrink=0.6, label=label)
+        page_path = path if len(matrix) <= per_page else path.replace('.png', '_{}.png'.format(page))
+        fig.savefig(page_path, dpi=dpi)
+        plt.close(fig)
+        pages.append(page_path)
+    return pages
@@ -0,0 +1,170 @@
+import argparse
+import json
+from timeit import default_timer as timer
+import numpy as np
+from . import PARAMS
+from .lazy_imports import lazy_module
+from .warmup import WarmupDetector, detect_warmup
+
+pd = lazy_module('pandas')
+
+"""
+Sweep over electricity price scenarios
+
+Only smart EVs read the price history (choose_cheapest_timesteps); the
+trajectories, power demand and VTG capacity of the other EVs are the same
+for any prices. With the parameter subfleet ('smart' or 'non_smart') the
+model builds only those EVs, the draws of every EV stay the same because they
+are keyed by EV. price_sweep runs the non smart sub-fleet once and the smart
+sub-fleet for every price series (the parameter prices, a csv file with an
+Electricity_price column, an .npy file or values per 15 minutes) and
+combines them per tick: power demand and VTG capacity are summed, the battery
+percentage and mean charging are means weighted by the EVs of each sub-fleet.
+K price series then cost about 1 + K * p_smart runs instead of K.
+
+The reporters are those of EtmEVsModel.end. A warm-up (warmup, horizon) is
+applied to the combined series after the runs, warmup='auto' is detected once
+on the combined series of all steps instead of every day.
+
+Usage, from the model directory:
+python -m etm_evs.price_sweep prices_a.csv prices_b.csv --n_evs 2000 --days 7 --compare
+"""
+
+SUBFLEETS = ('smart', 'non_smart')
+# parameters whose outcomes are not per tick sums or means over the EVs; the means of a regional run are over
+# the EVs present in the region, which the weights of combine (all EVs of a sub-fleet) do not match
+UNSUPPORTED = ['fanout', 'series_outcomes', 'event_log', 'save_steady_state', 'subfleet', 'region']
+SERIES = ['list_average_battery_percentage', 'list_total_current_power_demand', 'list_total_VTG_capacity',
+          'list_mean_charging']
+# series that are sums over the EVs, the others are means
+SUMS = ['list_total_current_power_demand', 'list_total_VTG_capacity']
+
+
+def subfleet_mask(subfleet, smart):
+    """EVs of the parameter subfleet: None for all, 'smart' or 'non_smart'"""
+    smart = np.asarray(smart, dtype=bool)
+    if subfleet is None:
+        return np.ones(len(smart), dtype=bool)
+    if subfleet not in SUBFLEETS:
+        raise ValueError('subfleet should be one of {}, not {}'.format(SUBFLEETS, subfleet))
+    return smart if subfleet == 'smart' else ~smart
+
+
+def run_subfleet(params, subfleet, prices=None):
+    """(EVs, series) of a run of a sub-fleet, the series as the lists of EtmEVsModel"""
+    from .model import EtmEVsModel  # model imports this module
+    run = dict(params, subfleet=subfleet)
+    if prices is not None:
+        run['prices'] = prices
+    model = EtmEVsModel(run)
+    model.run(display=False)
+    return model.number_evs, {name: list(getattr(model, name)) for name in SERIES}
+
+
+def combine(parts):
+    """series of a fleet from the (EVs, series) of its sub-fleets, sub-fleets without EVs are left out"""
+    parts = [(n, series) for n, series in parts if n]
+    weights = np.array([n for n, _ in parts], dtype=float)
+    combined = {}
+    for name in SERIES:
+        values = np.array([series[name] for _, series in parts], dtype=float)
+        if name in SUMS:
+            combined[name] = values.sum(axis=0).tolist()
+        else:
+            combined[name] = (weights @ values / weights.sum()).tolist()
+    return combined
+
+
+def sweep_reporters(series, params):
+    """reporters of the combined series as EtmEVsModel.end, after the warm-up of params"""
+    from .model import series_reporters
+    battery_percentage, power_demand, VTG_capacity, mean_charging = [series[name] for name in SERIES]
+    reporters = {}
+    if params.get('warmup') is not None:
+        warmup = WarmupDetector(None, params['warmup'], params.get('horizon'))
+        if warmup.auto:
+            ticks_per_day = 1440 // params.get('tick_minutes', 15)
+            warmup.length, warmup.converged = detect_warmup(
+                [battery_percentage[1:], power_demand, VTG_capacity], ticks_per_day, warmup.margin)
+        battery_percentage = warmup.after_warmup(battery_percentage, first_t=0)
+        power_demand = warmup.after_warmup(power_demand)
+        VTG_capacity = warmup.after_warmup(VTG_capacity)
+        mean_charging = warmup.after_warmup(mean_charging)
+        reporters.update(warmup_length=warmup.length, warmup_converged=warmup.converged)
+        if warmup.horizon is not None:
+            reporters['warmup_horizon'] = warmup.horizon
+    reporters.update(series_reporters(battery_percentage, power_demand, VTG_capacity, mean_charging))
+    return reporters
+
+
+def price_sweep(params, prices):
+    """
+    DataFrame with the reporters of params for every price series of prices
+    (paths or values), the seconds of its smart run and of the non smart run
+    """
+    unsupported = [name for name in UNSUPPORTED if params.get(name)]
+    if unsupported:
+        raise ValueError('the price sweep does not support {}'.format(unsupported))
+    base = {name: value for name, value in params.items() if name not in ('warmup', 'horizon')}
+    p_smart = float(params['p_smart'])
+    start = timer()
+    non_smart = run_subfleet(base, 'non_smart') if p_smart < 1 else (0, {})
+    non_smart_seconds = timer() - start
+    rows = []
+    for index, series in enumerate(prices):
+        start = timer()
+        smart = run_subfleet(base, 'smart', series) if p_smart > 0 else (0, {})
+        row = {'prices': series if isinstance(series, str) else index, 'smart_seconds': timer() - start,
+               'non_smart_seconds': non_smart_seconds}
+        row.update(sweep_reporters(combine([non_smart, smart]), params))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def compare(params, prices):
+    """
+    the price sweep and a run of the whole fleet for every price series:
+    (sweep, the largest relative difference of every reporter, seconds of the full runs)
+    """
+    from .model import EtmEVsModel
+    sweep = price_sweep(params, prices)
+    differences = {}
+    start = timer()
+    for row, series in zip(sweep.to_dict('records'), prices):
+        model = EtmEVsModel(dict(params, prices=series))
+        model.run(display=False)
+        for name, value in model.reporters.items():
+            if name in row and isinstance(value, (int, float)):
+                difference = abs(row[name] - value) / max(abs(value), 1e-9)
+                differences[name] = max(differences.get(name, 0), difference)
+    return sweep, differences, timer() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the model for several price series, the non smart EVs once')
+    parser.add_argument('prices', nargs='+', help='csv files with an Electricity_price column or .npy files')
+    parser.add_argument('--params', default=PARAMS)
+    parser.add_argument('--n_evs', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--output', help='csv file for the reporters')
+    parser.add_argument('--compare', action='store_true', help='also run the whole fleet for every price series')
+    args = parser.parse_args()
+    with open(args.params) as file:
+        params = json.load(file)
+    params.update(n_evs=args.n_evs, steps=args.days * 1440 // params.get('tick_minutes', 15))
+    if args.compare:
+        sweep, differences, seconds = compare(params, args.prices)
+        print('sweep {:.1f} s, full runs {:.1f} s'.format(
+            sweep['non_smart_seconds'][0] + sweep['smart_seconds'].sum(), seconds))
+        for name, difference in differences.items():
+            print('{}: largest relative difference {:.2e}'.format(name, difference))
+    else:
+        sweep = price_sweep(params, args.prices)
+    with pd.option_context('display.width', 200):
+        print(sweep.to_string(index=False))
+    if args.output:
+        sweep.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+from timeit import default_timer as timer
+import numpy as np
+from . import PARAMS
+from .lazy_imports import lazy_module
+
+pd = lazy_module('pandas')
+
+"""
+Regional sub-model
+
+With the parameter region (a list of municipality codes or names, a comma
+separated string of them, or a csv file with a GM_CODE column, e.g. the
+municipalities of a province) the model only builds the municipalities of
+the region and one boundary municipality (BOUNDARY_CODE) that stands for
+the rest of the country:
+
+- n_evs stays the size of the national fleet, every municipality gets its
+  share of AANT_INW as in a national run
+- the fleet is drawn for the whole country (only destinations and setup
+  draws, no agents) and the model keeps the EVs that live or work in the
+  region; EVs living outside the region that work in it live in the
+  boundary municipality, EVs of the region that work outside it work there
+- commute distances are those of the real destinations
+
+Because all draws are keyed by EV, the kept EVs are exactly those of the
+national run and every municipality of the region has the same EVs present
+at every tick, so their results are those of the national run. The model
+totals and reporters (e.g. max_power_demand) of a regional run are those of
+the grid of the region: they sum over the EVs parked in its municipalities,
+not the EVs on the road or in the boundary municipality.
+consistency_report runs both and compares them.
+
+Usage, from the model directory:
+python -m etm_evs.region GM0014,GM0037,GM0047 --n_evs 20000 --days 2
+"""
+
+BOUNDARY_CODE = 'GM0000'
+BOUNDARY_NAME = 'Buiten regio'
+# EV attributes that are the same in a regional and the national run
+FLEET_ATTRIBUTES = ['commute_distance', 'battery_volume', 'energy_rate', 'charging_speed', 'departure_time',
+                    'dwell_time', 'offset_dep', 'offset_dwell', 'smart', 'charge_pref']
+
+
+def region_codes(region, municipalities):
+    """
+    sorted municipality codes of a region given as codes or names (a list, a
+    comma separated string or a csv file with a GM_CODE column)
+    """
+    if isinstance(region, str):
+        if os.path.exists(region):
+            region = pd.read_csv(region)['GM_CODE'].tolist()
+        else:
+            region = [name.strip() for name in region.split(',') if name.strip()]
+    by_name = dict(zip(municipalities['GM_NAAM'], municipalities['GM_CODE']))
+    known = set(municipalities['GM_CODE'])
+    codes = set()
+    for name in region:
+        code = name if name in known else by_name.get(name)
+        if code is None:
+            raise ValueError('unknown municipality {} in region'.format(name))
+        codes.add(code)
+    return sorted(codes)
+
+
+class Region:
+    """selects the EVs and municipalities of a regional sub-model"""
+
+    def __init__(self, region, municipalities):
+        self.codes = region_codes(region, municipalities)
+        outside = ~municipalities['GM_CODE'].isin(self.codes)
+        self.boundary_inhabitants = int(municipalities.loc[outside, 'AANT_INW'].sum())
+
+    def select(self, fleet, origins):
+        """
+        the part of a national fleet (see EtmEVsModel.draw_fleet) that lives or
+        works in the region: its residents in municipality order, then the EVs
+        that commute into it; home_index refers to the municipalities of the
+        region followed by the boundary municipality
+        """
+        home_code = np.asarray(origins, dtype=object)[np.asarray(fleet['home_index'])]
+        lives = np.isin(home_code, self.codes)
+        works = np.isin(np.asarray(fleet['work_location_id'], dtype=object), self.codes)
+        selected = np.concatenate([np.flatnonzero(lives), np.flatnonzero(~lives & works)])
+        region = {code: index for index, code in enumerate(self.codes)}
+        result = {name: np.asarray(values)[selected] for name, values in fleet.items()}
+        result['home_index'] = np.array([region.get(code, len(self.codes)) for code in home_code[selected]],
+                                        dtype=np.int64)
+        result['work_location_id'] = np.where(works[selected], result['work_location_id'], BOUNDARY_CODE) \
+            .astype(object)
+        return result
+
+
+def municipality_results(model, codes, steps):
+    """
+    power demand and total VTG capacity per tick (rows) of the municipalities
+    with the given codes (columns), and the model totals of these per tick
+    """
+    municipalities = {mun.id: mun for mun in model.municipalities}
+    demand, vtg, totals = [], [], []
+    for _ in range(steps):
+        model.sim_step()
+        demand.append([municipalities[code].current_power_demand for code in codes])
+        vtg.append([(municipalities[code].current_vtg_capacity or 0) * municipalities[code].number_EVs
+                    for code in codes])
+        totals.append([model.total_current_power_demand, model.total_VTG_capacity])
+    return np.array(demand, dtype=float), np.array(vtg, dtype=float), np.array(totals, dtype=float)
+
+
+def consistency_report(params, region):
+    """
+    compares a regional run with the national run of the same parameters:
+    agents, setup and step time, the fleet of the region and the power demand
+    of its municipalities at every tick; returns a dict
+    """
+    from .model import EtmEVsModel  # model imports this module
+    models = {'region': EtmEVsModel(dict(params, region=region)), 'national': EtmEVsModel(params)}
+    report = {}
+    for name, model in models.items():
+        start = timer()
+        model.sim_setup()
+        report[name + '_setup_seconds'] = timer() - start
+        report[name + '_evs'] = len(model.EVs)
+        report[name + '_municipalities'] = len(model.municipalities)
+    codes = models['region'].region.codes
+    regional = list(models['region'].EVs)
+    report['inbound_evs'] = sum(ev.home_id == BOUNDARY_CODE for ev in regional)
+    report['outbound_evs'] = sum(ev.work_location_id == BOUNDARY_CODE for ev in regional)
+    # the national EVs that live or work in the region, by key
+    national = {ev.key: ev for ev in models['national'].EVs if ev.home_id in codes or ev.work_location_id in codes}
+    report['missing_evs'] = len(set(national) - {ev.key for ev in regional})
+    report['different_evs'] = sum(ev.key not in national or any(
+        getattr(ev, name) != getattr(national[ev.key], name) for name in FLEET_ATTRIBUTES) for ev in regional)
+    results = {}
+    for name, model in models.items():
+        start = timer()
+        results[name] = municipality_results(model, codes, params['steps'])
+        report[name + '_step_seconds'] = timer() - start
+    demand, vtg, totals = results['region']
+    national_demand, national_vtg, _ = results['national']
+    report['region_mean_power_demand'] = demand.sum(axis=1).mean()
+    report['max_power_demand_difference'] = np.abs(demand - national_demand).max()
+    # the totals of the regional model are those of the municipalities of the region in the national run
+    report['total_power_demand_difference'] = np.abs(totals[:, 0] - national_demand.sum(axis=1)).max()
+    report['total_VTG_capacity_difference'] = np.abs(totals[:, 1] - national_vtg.sum(axis=1)).max()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare a regional run with the national run')
+    parser.add_argument('region', help='municipality codes or names, comma separated, or a csv with GM_CODE')
+    parser.add_argument('--params', default=PARAMS)
+    parser.add_argument('--n_evs', type=int, default=20000, help='EVs in the whole country')
+    parser.add_argument('--days', type=int, default=2)
+    args = parser.parse_args()
+    with open(args.params) as file:
+        params = json.load(file)
+    params.update(n_evs=args.n_evs, steps=args.days * 1440 // params.get('tick_minutes', 15))
+    for name, value in consistency_report(params, args.region).items():
+        print('{}: {}'.format(name, value))
+
+
+if __name__ == '__main__':
+    main()
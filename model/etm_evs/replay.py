@@ -0,0 +1,98 @@
+import logging
+import numpy as np
+from .lazy_imports import lazy_module
+from .fleet import LOCATION_NAMES, NO_TIME
+
+pd = lazy_module('pandas')
+
+"""
+Replay of single EVs of a run
+
+The EVs of a run only share the prices: all their draws are keyed by the
+seed, the EV key, the tick and the purpose (rng.CounterStreams), and the
+fleet is drawn as arrays for all EVs before the agents are made. With the
+parameter replay (EV keys, a list or a comma separated string) the model
+still draws the whole fleet but only makes the agents of those EVs, which
+then follow exactly the trajectory they have in the full run. The warnings
+of the model name the EV key.
+
+The parameter trace (EV keys) records the state of those EVs after every
+tick, in a run of the whole fleet or of a replay (which traces its EVs by
+default); model.trace.table() gives it as a DataFrame. With log_level='DEBUG'
+the model log (etm-evs replay --log model.log --debug) gets the debug messages
+of the replayed EVs only.
+
+Usage, from anywhere with the package installed (python -m etm_evs replay from the model directory):
+etm-evs replay 1000003 1000017 --set n_evs=174000 --output trace.csv
+"""
+
+# state of an EV in the trace, locations are names, missing values (None) are NaN
+TRACE_FIELDS = ['current_battery_volume', 'battery_percentage', 'plugged_in', 'charging', 'current_power_demand',
+                'VTG_capacity', 'energy_charged', 'departure_time', 'offset_dep', 'return_time', 'offset_dwell',
+                'time_charging_must_finish']
+
+
+def parse_keys(keys):
+    """EV keys from a number, a list or a comma separated string"""
+    if isinstance(keys, str):
+        keys = [key for key in keys.split(',') if key.strip()]
+    return np.atleast_1d(np.asarray(keys, dtype=np.int64))
+
+
+def replay_mask(replay, keys):
+    """EVs of the fleet (keys) to make for the parameter replay"""
+    replay = parse_keys(replay)
+    missing = np.setdiff1d(replay, keys)
+    if len(missing):
+        raise ValueError('EV keys {} are not in the fleet'.format(missing.tolist()))
+    return np.isin(keys, replay)
+
+
+class EVTrace:
+    """state of some EVs of a model after every tick"""
+
+    def __init__(self, model, keys):
+        self.model = model
+        self.keys = parse_keys(keys)
+        fleet = np.array(list(model.EVs.key), dtype=np.int64)
+        missing = np.setdiff1d(self.keys, fleet)
+        if len(missing):
+            raise ValueError('EV keys {} are not in the fleet'.format(missing.tolist()))
+        # agent order of the traced EVs
+        self.index = [int(np.flatnonzero(fleet == key)[0]) for key in self.keys]
+        self.rows = []
+
+    def update(self):
+        t = self.model.t
+        kernels = self.model.kernels
+        if kernels is None:
+            for i in self.index:
+                ev = self.model.EVs[i]
+                self.rows.append([t, ev.key, ev.current_location] +
+                                 [np.nan if getattr(ev, name) is None else float(getattr(ev, name))
+                                  for name in TRACE_FIELDS])
+        else:
+            for i in self.index:
+                values = [float(kernels.values(name)[i]) for name in TRACE_FIELDS]
+                self.rows.append([t, int(kernels.key[i]), LOCATION_NAMES[kernels.location[i]]] +
+                                 [np.nan if value == NO_TIME else value for value in values])
+
+    def table(self):
+        """DataFrame with a row per tick and traced EV"""
+        return pd.DataFrame(self.rows, columns=['t', 'key', 'location'] + TRACE_FIELDS)
+
+
+def replay(params, keys, log_level=None):
+    """trace of the EVs with keys, from a run of only those EVs of the fleet of params"""
+    from .model import EtmEVsModel  # model imports this module
+    replayed = dict(params, replay=parse_keys(keys).tolist())
+    if log_level is not None:
+        replayed['log_level'] = log_level
+    # the model restores the log level in end, which a run that fails does not reach
+    level = logging.getLogger().level
+    try:
+        model = EtmEVsModel(replayed)
+        model.run(display=False)
+    finally:
+        logging.getLogger().setLevel(level)
+    return model.trace.table()
@@ -0,0 +1,83 @@
+import argparse
+import json
+import numpy as np
+import pandas as pd
+from timeit import default_timer as timer
+from . import PARAMS
+from .model import EtmEVsModel
+
+"""
+Compares model results at coarser tick lengths with the 15 minute model
+
+Runs the parameters of params.json (with fewer EVs) for the same period at
+every tick length and reports, per resolution, the run time, the power demand
+in kW, the VTG capacity and the battery percentage, and the error of the
+hourly power demand profile and of the daily charged energy against the 15
+minute run.
+
+Usage, from the model directory:
+python -m etm_evs.resolution_comparison --n_evs 2000 --days 14
+"""
+
+
+def run(params, tick_minutes, days):
+    """runs the model, returns the run time and its hourly results"""
+    model = EtmEVsModel(dict(params, tick_minutes=tick_minutes, steps=days * 1440 // tick_minutes))
+    start = timer()
+    model.run(display=False)
+    seconds = timer() - start
+    ticks_per_hour = 60 // tick_minutes
+    hours = len(model.list_total_current_power_demand) // ticks_per_hour
+
+    def hourly(values):
+        return np.asarray(values[:hours * ticks_per_hour], dtype=float).reshape(hours, ticks_per_hour).mean(axis=1)
+
+    # power demand is the energy charged per 15 minutes, divided by a quarter of an hour it becomes kW
+    results = pd.DataFrame({
+        'power_demand_kW': hourly(model.list_total_current_power_demand) / 0.25,
+        'VTG_capacity_kWh': hourly(model.list_total_VTG_capacity),
+        'battery_percentage': hourly(model.list_average_battery_percentage[1:]),
+    })
+    return seconds, results
+
+
+def compare(params, resolutions=(15, 30, 60), days=14):
+    """table with one row per tick length"""
+    runs = {tick_minutes: run(params, tick_minutes, days) for tick_minutes in resolutions}
+    reference = runs[15][1]
+    rows = []
+    for tick_minutes, (seconds, results) in runs.items():
+        error = results['power_demand_kW'] - reference['power_demand_kW']
+        days_run = len(results) // 24
+        daily = results['power_demand_kW'][:days_run * 24].values.reshape(days_run, 24).sum(axis=1)
+        daily_reference = reference['power_demand_kW'][:days_run * 24].values.reshape(days_run, 24).sum(axis=1)
+        rows.append({
+            'tick (min)': tick_minutes,
+            'run time (s)': round(seconds, 1),
+            'mean demand (kW)': results['power_demand_kW'].mean(),
+            'peak hourly demand (kW)': results['power_demand_kW'].max(),
+            'hourly demand RMSE (% of mean)': 100 * np.sqrt(np.mean(error ** 2)) / reference['power_demand_kW'].mean(),
+            'daily energy error (%)': 100 * np.mean(np.abs(daily - daily_reference) / daily_reference),
+            'mean VTG capacity (kWh)': results['VTG_capacity_kWh'].mean(),
+            'mean battery (%)': results['battery_percentage'].mean(),
+        })
+    return pd.DataFrame(rows).set_index('tick (min)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare tick lengths against the 15 minute model')
+    parser.add_argument('--n_evs', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--params', default=PARAMS)
+    parser.add_argument('--data', help='data directory or .npz of a data provider, that of params without it')
+    args = parser.parse_args()
+    with open(args.params) as file:
+        params = dict(json.load(file), n_evs=args.n_evs)
+    if args.data:
+        params['data'] = args.data
+    table = compare(params, days=args.days)
+    print(table.round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
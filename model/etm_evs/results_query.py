@@ -0,0 +1,296 @@
+import os
+import operator
+import numpy as np
+import pandas as pd
+
+"""
+Lazy query layer over saved experiment and seed run outputs
+"""
+
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda column, values: column.isin(values),
+}
+AGGREGATIONS = ('mean', 'sum', 'count', 'min', 'max')
+
+
+class Partition:
+    """one saved experiment directory (as written by agentpy's DataDict.save)"""
+
+    def __init__(self, path, sample_offset=0, name=None):
+        self.path = path
+        self.sample_offset = sample_offset
+        self.name = name or os.path.basename(os.path.normpath(path))
+        self._parameters = None
+
+    def table_path(self, table):
+        return os.path.join(self.path, 'variables_{}.csv'.format(table))
+
+    def columns(self, table):
+        """column names of a variables table, without reading its rows"""
+        return list(pd.read_csv(self.table_path(table), nrows=0).columns)
+
+    @property
+    def parameters(self):
+        """sampled parameters per sample_id, or None for runs without a sample"""
+        if self._parameters is None:
+            path = os.path.join(self.path, 'parameters_sample.csv')
+            if os.path.exists(path):
+                self._parameters = pd.read_csv(path)
+        return self._parameters
+
+    def reporters(self):
+        return pd.read_csv(os.path.join(self.path, 'reporters.csv'))
+
+    def warmups(self):
+        """
+        warmup_length and warmup_horizon per run (sample_id and iteration, where
+        present) from the reporters, None if no run reported a warm-up
+        """
+        if not os.path.exists(os.path.join(self.path, 'reporters.csv')):
+            return None
+        reporters = self.reporters()
+        if 'warmup_length' not in reporters:
+            return None
+        keys = [key for key in ('sample_id', 'iteration') if key in reporters]
+        return reporters[keys].assign(
+            warmup_length=reporters['warmup_length'],
+            warmup_horizon=reporters['warmup_horizon'] if 'warmup_horizon' in reporters else np.nan)
+
+
+class ResultsDataset:
+    """
+    Several experiment directories registered as one dataset.
+
+    Every directory is a partition; sample ids are shifted by the partition's
+    offset so that samples of different experiments stay apart.
+    """
+
+    def __init__(self):
+        self.partitions = []
+
+    def register(self, path, sample_offset=0, name=None):
+        """add an experiment directory to the dataset"""
+        if not os.path.isdir(path):
+            raise FileNotFoundError('no experiment directory at {}'.format(path))
+        self.partitions.append(Partition(path, sample_offset, name))
+        return self
+
+    def scan(self, table='EtmEVsModel'):
+        """start a lazy query on a variables table, e.g. EtmEVsModel or Municipality"""
+        return Query(self, table)
+
+    def reporters(self):
+        """reporters of all partitions, with shifted sample ids"""
+        frames = []
+        for partition in self.partitions:
+            df = partition.reporters()
+            if 'sample_id' in df:
+                df['sample_id'] += partition.sample_offset
+            df['partition'] = partition.name
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True)
+
+
+class Query:
+    """
+    Lazy description of a query, nothing is read until collect or to_csv.
+
+    Filters on variable columns are applied chunk by chunk while reading,
+    filters on sampled parameters are turned into sample id selections
+    before any row is joined, and aggregations are combined from per chunk
+    partial results so a table is never held in memory as a whole.
+    """
+
+    def __init__(self, dataset, table, columns=None, filters=(), warmup=None,
+                 shift_time=True, join=False, keys=None, aggregation=None, chunksize=500000):
+        self.dataset = dataset
+        self.table = table
+        self._columns = columns
+        self._filters = tuple(filters)
+        self._warmup = warmup
+        self._shift_time = shift_time
+        self._join = join
+        self._keys = keys
+        self._aggregation = aggregation
+        self.chunksize = chunksize
+
+    def _replace(self, **changes):
+        state = dict(dataset=self.dataset, table=self.table, columns=self._columns,
+                     filters=self._filters, warmup=self._warmup, shift_time=self._shift_time,
+                     join=self._join, keys=self._keys, aggregation=self._aggregation,
+                     chunksize=self.chunksize)
+        state.update(changes)
+        return Query(**state)
+
+    # query building ---------------------------------------------------------
+
+    def select(self, *columns):
+        """only read these variable columns (index columns are always kept)"""
+        return self._replace(columns=list(columns))
+
+    def filter(self, column, op, value):
+        """keep rows where `column op value` holds, op is one of ==, !=, <, <=, >, >=, in"""
+        if op not in OPERATORS:
+            raise ValueError('unknown operator {}'.format(op))
+        return self._replace(filters=self._filters + ((column, op, value),))
+
+    def trim_warmup(self, ticks, shift_time=True, default=None):
+        """
+        drop the first ticks of every run and optionally let t start at 0 again;
+        with ticks='auto' every run is trimmed by its reported warmup_length (and
+        cut after its warmup_horizon), runs without it by default ticks
+        """
+        if ticks == 'auto':
+            ticks = ('auto', default)
+        return self._replace(warmup=ticks, shift_time=shift_time)
+
+    def join_parameters(self):
+        """add the sampled parameters of every row's sample"""
+        return self._replace(join=True)
+
+    def groupby(self, keys):
+        return self._replace(keys=[keys] if isinstance(keys, str) else list(keys))
+
+    def agg(self, aggregation):
+        """aggregate per group, either one of mean/sum/count/min/max or a {column: how} dict"""
+        if self._keys is None:
+            raise ValueError('call groupby before aggregating')
+        hows = aggregation.values() if isinstance(aggregation, dict) else [aggregation]
+        for how in hows:
+            if how not in AGGREGATIONS:
+                raise ValueError('unsupported aggregation {}'.format(how))
+        return self._replace(aggregation=aggregation)
+
+    def mean(self):
+        return self.agg('mean')
+
+    def sum(self):
+        return self.agg('sum')
+
+    # execution --------------------------------------------------------------
+
+    def _usecols(self, partition):
+        available = partition.columns(self.table)
+        if self._columns is None:
+            return available
+        wanted = set(self._columns) | {'sample_id', 'iteration', 'obj_id', 't'}
+        wanted |= {column for column, op, value in self._filters}
+        wanted |= set(self._keys or [])
+        return [column for column in available if column in wanted]
+
+    def _sample_selection(self, partition, table_columns):
+        """sample ids (before offset) that pass the filters on parameter and sample columns"""
+        parameters = partition.parameters
+        selection = None
+        for column, op, value in self._filters:
+            if column == 'sample_id':
+                ids = parameters['sample_id'] if parameters is not None else None
+                if ids is None:
+                    continue
+                passed = ids[OPERATORS[op](ids + partition.sample_offset, value)]
+            elif parameters is not None and column in parameters and column not in table_columns:
+                passed = parameters.loc[OPERATORS[op](parameters[column], value), 'sample_id']
+            else:
+                continue
+            passed = set(passed)
+            selection = passed if selection is None else selection & passed
+        return selection
+
+    def _chunks(self):
+        """yield filtered, trimmed and joined chunks of all partitions"""
+        for partition in self.dataset.partitions:
+            selection = self._sample_selection(partition, partition.columns(self.table))
+            if selection is not None and not selection:
+                continue  # partition pruned
+            warmups = partition.warmups() if isinstance(self._warmup, tuple) else None
+            reader = pd.read_csv(partition.table_path(self.table), usecols=self._usecols(partition),
+                                 chunksize=self.chunksize)
+            for chunk in reader:
+                if selection is not None:
+                    chunk = chunk[chunk['sample_id'].isin(selection)]
+                if self._warmup is not None:
+                    chunk = self._trim(chunk, warmups)
+                if 'sample_id' in chunk:
+                    chunk = chunk.assign(sample_id=chunk['sample_id'] + partition.sample_offset)
+                for column, op, value in self._filters:
+                    if column in chunk:
+                        chunk = chunk[OPERATORS[op](chunk[column], value)]
+                if self._join and partition.parameters is not None and 'sample_id' in chunk:
+                    parameters = partition.parameters.assign(
+                        sample_id=partition.parameters['sample_id'] + partition.sample_offset)
+                    chunk = chunk.merge(parameters, on='sample_id', how='left')
+                if len(chunk):
+                    yield chunk
+
+    def _trim(self, chunk, warmups):
+        """drop the warm-up ticks of a chunk, warmups are the reported warm-ups of its partition"""
+        if not isinstance(self._warmup, tuple):
+            chunk = chunk[chunk['t'] >= self._warmup]
+            return chunk.assign(t=chunk['t'] - self._warmup) if self._shift_time else chunk
+        default = self._warmup[1] or 0
+        if warmups is None:
+            length = np.full(len(chunk), default)
+            end = np.full(len(chunk), np.inf)
+        else:
+            keys = [key for key in ('sample_id', 'iteration') if key in warmups and key in chunk]
+            runs = chunk[keys].merge(warmups, on=keys, how='left') if keys else \
+                warmups.iloc[np.zeros(len(chunk), dtype=int)]
+            length = runs['warmup_length'].fillna(default).to_numpy()
+            end = (runs['warmup_length'] + runs['warmup_horizon']).fillna(np.inf).to_numpy()
+        t = chunk['t'].to_numpy()
+        keep = (t >= length) & (t < end)
+        chunk = chunk[keep]
+        return chunk.assign(t=t[keep] - length[keep].astype(t.dtype)) if self._shift_time else chunk
+
+    def _partials(self, chunk, columns):
+        grouped = chunk.groupby(self._keys)[columns]
+        return {'sum': grouped.sum(), 'count': grouped.count(), 'min': grouped.min(), 'max': grouped.max()}
+
+    def _aggregate(self):
+        totals = None
+        columns = None
+        for chunk in self._chunks():
+            if columns is None:
+                if isinstance(self._aggregation, dict):
+                    columns = list(self._aggregation)
+                else:
+                    columns = [c for c in chunk.select_dtypes('number').columns if c not in self._keys]
+            partial = self._partials(chunk, columns)
+            if totals is None:
+                totals = partial
+                continue
+            totals['sum'] = totals['sum'].add(partial['sum'], fill_value=0)
+            totals['count'] = totals['count'].add(partial['count'], fill_value=0)
+            totals['min'] = pd.concat([totals['min'], partial['min']]).groupby(level=self._keys).min()
+            totals['max'] = pd.concat([totals['max'], partial['max']]).groupby(level=self._keys).max()
+        if totals is None:
+            return pd.DataFrame()
+        totals['mean'] = totals['sum'] / totals['count']
+        if isinstance(self._aggregation, dict):
+            return pd.DataFrame({column: totals[how][column] for column, how in self._aggregation.items()})
+        return totals[self._aggregation]
+
+    def collect(self):
+        """run the query and return the result as a DataFrame"""
+        if self._aggregation is not None:
+            return self._aggregate()
+        chunks = list(self._chunks())
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    def to_csv(self, path, **kwargs):
+        """run the query and stream the result to a csv file, chunk by chunk"""
+        if self._aggregation is not None:
+            self._aggregate().to_csv(path, **kwargs)
+            return
+        kwargs.setdefault('index', False)
+        header = True
+        with open(path, 'w', newline='') as file:
+            for chunk in self._chunks():
+                chunk.to_csv(file, header=header, **kwargs)
+                header = False
@@ -0,0 +1,163 @@
+from enum import IntEnum
+import numpy as np
+
+"""
+Counter-based random streams (Philox4x32-10)
+
+Every draw is a pure function of (seed, EV key, tick, purpose), so the value an
+EV gets does not depend on how many other EVs there are, on the order in which
+they are stepped or on how the fleet is split over workers. The scalar and
+the vectorized implementation return bit-identical values. Stratified draws
+(fleet_sampling='lhs') are the exception: the stratum of an EV depends on the
+keys of the whole fleet.
+
+With common random numbers (the parameter crn) the seed of a run is derived
+from the base seed and its replicate only (replicate_seed), so replicate r of
+every scenario in a sweep sees the same fleet and the same daily draws.
+"""
+
+MASK32 = 0xFFFFFFFF
+MASK64 = 0xFFFFFFFFFFFFFFFF
+PHILOX_M0 = 0xD2511F53
+PHILOX_M1 = 0xCD9E8D57
+PHILOX_W0 = 0x9E3779B9
+PHILOX_W1 = 0xBB67AE85
+PHILOX_ROUNDS = 10
+# municipality codes and the index of an EV within its home municipality form its key
+SEQUENCE_BITS = 21
+
+
+class Purpose(IntEnum):
+    """what a draw is used for, part of the counter so purposes never share values"""
+    CHARGING_SPEED = 1
+    DEPARTURE = 2
+    DWELL = 3
+    OFFSET_DEP = 4
+    OFFSET_DWELL = 5
+    BATTERY = 6
+    ENERGY_RATE = 7
+    PREF = 8
+    PREF_HOME = 9
+    SMART = 10
+    DESTINATION = 11
+    BATTERY_REDRAW = 12
+    STICK_TO_PREF = 13
+    WEEKEND = 14
+    ROUNDING = 15
+    REPLICATE = 16
+    WARM_START = 17
+
+
+# the order of the strata of a purpose (see CounterStreams.stratified) is drawn with purpose + STRATUM_OFFSET
+STRATUM_OFFSET = 64
+
+
+def philox(c0, c1, c2, c3, k0, k1):
+    """Philox4x32-10 on python integers"""
+    for _ in range(PHILOX_ROUNDS):
+        p0 = PHILOX_M0 * c0
+        p1 = PHILOX_M1 * c2
+        c0, c1, c2, c3 = ((p1 >> 32) ^ c1 ^ k0, p1 & MASK32, (p0 >> 32) ^ c3 ^ k1, p0 & MASK32)
+        k0 = (k0 + PHILOX_W0) & MASK32
+        k1 = (k1 + PHILOX_W1) & MASK32
+    return c0, c1, c2, c3
+
+
+def philox_array(c0, c1, c2, c3, k0, k1):
+    """Philox4x32-10 on uint64 arrays holding 32 bit words"""
+    c0, c1, c2, c3 = (np.asarray(c, dtype=np.uint64) for c in (c0, c1, c2, c3))
+    c0, c1, c2, c3 = np.broadcast_arrays(c0, c1, c2, c3)
+    mask = np.uint64(MASK32)
+    shift = np.uint64(32)
+    for _ in range(PHILOX_ROUNDS):
+        p0 = np.uint64(PHILOX_M0) * c0
+        p1 = np.uint64(PHILOX_M1) * c2
+        c0, c1, c2, c3 = ((p1 >> shift) ^ c1 ^ np.uint64(k0), p1 & mask,
+                          (p0 >> shift) ^ c3 ^ np.uint64(k1), p0 & mask)
+        k0 = (k0 + PHILOX_W0) & MASK32
+        k1 = (k1 + PHILOX_W1) & MASK32
+    return c0, c1, c2, c3
+
+
+def fold_seed(seed):
+    """reduce a seed of any size (agentpy uses 128 bit seeds) to 64 bits"""
+    seed = int(seed)
+    if seed < 0:
+        seed &= (1 << 128) - 1
+    while seed > MASK64:
+        seed = (seed & MASK64) ^ (seed >> 64)
+    return seed
+
+
+def ev_key(municipality_number, sequence):
+    """stable key of the sequence-th EV living in a municipality"""
+    return (int(municipality_number) << SEQUENCE_BITS) | int(sequence)
+
+
+def municipality_number(municipality_id, default):
+    """numeric part of a municipality code (GM0014 -> 14), default if there is none"""
+    digits = ''.join(c for c in str(municipality_id) if c.isdigit())
+    return int(digits) if digits else default
+
+
+def triangular(u, low, high, mode):
+    """inverse of random.triangular(low, high, mode) for a uniform u, works on arrays too"""
+    if high == low:
+        return low + 0 * u
+    c = (mode - low) / (high - low)
+    flip = u > c
+    u = np.where(flip, 1.0 - u, u)
+    c = np.where(flip, 1.0 - c, c)
+    start = np.where(flip, high, low)
+    end = np.where(flip, low, high)
+    return start + (end - start) * np.sqrt(u * c)
+
+
+def replicate_seed(seed, replicate):
+    """
+    64 bit seed of a replicate of a base seed; runs of different scenarios
+    with the same base seed and replicate share all draws (common random numbers)
+    """
+    k = fold_seed(seed)
+    w0, w1, _, _ = philox(int(replicate) & MASK32, (int(replicate) >> 32) & MASK32, int(Purpose.REPLICATE), 0,
+                          k & MASK32, k >> 32)
+    return w0 << 32 | w1
+
+
+class CounterStreams:
+    """random numbers keyed by seed, EV key, tick and purpose"""
+
+    def __init__(self, seed):
+        self.seed = fold_seed(seed)
+        self.k0 = self.seed & MASK32
+        self.k1 = self.seed >> 32
+
+    def random(self, key, tick, purpose):
+        """uniform value in [0, 1), key may be a number or an array of keys"""
+        if np.ndim(key) == 0:
+            w0, w1, _, _ = philox(int(key) & MASK32, int(tick) & MASK32, int(purpose), 0, self.k0, self.k1)
+            return ((w0 << 32 | w1) >> 11) * (1.0 / (1 << 53))
+        w0, w1, _, _ = philox_array(np.asarray(key, dtype=np.uint64) & np.uint64(MASK32),
+                                    int(tick) & MASK32, int(purpose), 0, self.k0, self.k1)
+        return ((w0 << np.uint64(32) | w1) >> np.uint64(11)) * (1.0 / (1 << 53))
+
+    def stratified(self, keys, tick, purpose):
+        """
+        uniform values in [0, 1) for an array of keys with exactly one value in
+        each of the len(keys) equal strata, in a random order; stratified draws
+        of several purposes form a Latin hypercube
+        """
+        keys = np.asarray(keys)
+        order = np.argsort(self.random(keys, tick, int(purpose) + STRATUM_OFFSET), kind='stable')
+        strata = np.empty(len(keys))
+        strata[order] = np.arange(len(keys))
+        return (strata + self.random(keys, tick, purpose)) / max(len(keys), 1)
+
+    def uniform(self, key, tick, purpose, low=0.0, high=1.0):
+        """same as random.uniform(low, high)"""
+        return low + (high - low) * self.random(key, tick, purpose)
+
+    def triangular(self, key, tick, purpose, low, high, mode):
+        """same as random.triangular(low, high, mode)"""
+        value = triangular(self.random(key, tick, purpose), low, high, mode)
+        return float(value) if np.ndim(key) == 0 else value
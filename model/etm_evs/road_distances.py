@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+from scipy.spatial import cKDTree
+
+"""
+Builds the road distance OD input (afstand csv) from a road layer and the municipality centroids
+
+Usage, from the model directory:
+python -m etm_evs.road_distances ../geo_files/snelwegen_provincie.shp ../geo_files/centroids.geojson ../data/afstand7.csv
+"""
+
+
+def read_lines(path):
+    """coordinate arrays of all (multi)linestrings in a GeoJSON file or a shapefile"""
+    if path.lower().endswith(('.geojson', '.json')):
+        with open(path) as file:
+            geometries = [feature['geometry'] for feature in json.load(file)['features']]
+    else:
+        import geopandas as gpd  # only needed for shapefiles
+        geometries = [geometry.__geo_interface__ for geometry in gpd.read_file(path).geometry]
+    lines = []
+    for geometry in geometries:
+        if geometry is None:
+            continue
+        if geometry['type'] == 'LineString':
+            lines.append(np.asarray(geometry['coordinates'], dtype=float)[:, :2])
+        elif geometry['type'] == 'MultiLineString':
+            lines.extend(np.asarray(part, dtype=float)[:, :2] for part in geometry['coordinates'])
+    return lines
+
+
+def read_centroids(path, id_field='GM_CODE'):
+    """municipality codes and centroid coordinates from a point GeoJSON file"""
+    with open(path) as file:
+        features = json.load(file)['features']
+    codes = [feature['properties'][id_field] for feature in features]
+    points = np.array([feature['geometry']['coordinates'][:2] for feature in features], dtype=float)
+    return codes, points
+
+
+def build_graph(lines, tolerance=1.0):
+    """
+    Sparse undirected road graph, edge weights are segment lengths.
+
+    Vertices closer than the tolerance (in map units, meters for RD) are
+    merged, so lines that touch become connected.
+    """
+    coordinates = np.concatenate(lines)
+    snapped = np.round(coordinates / tolerance).astype(np.int64)
+    cells, node_of_vertex = np.unique(snapped, axis=0, return_inverse=True)
+    node_of_vertex = node_of_vertex.ravel()
+    # mean position of the vertices merged into a node
+    n = len(cells)
+    counts = np.bincount(node_of_vertex, minlength=n)
+    node_xy = np.column_stack([np.bincount(node_of_vertex, coordinates[:, i], minlength=n) / counts
+                               for i in range(2)])
+    # consecutive vertices of a line form an edge
+    ends = np.cumsum([len(line) for line in lines])
+    start = np.ones(len(coordinates), dtype=bool)
+    start[np.r_[0, ends[:-1]]] = False
+    a = node_of_vertex[np.flatnonzero(start) - 1]
+    b = node_of_vertex[start]
+    length = np.hypot(*(coordinates[start] - coordinates[np.flatnonzero(start) - 1]).T)
+    keep = a != b
+    a, b, length = a[keep], b[keep], length[keep]
+    # keep the shortest of parallel edges, a sparse matrix would add them up
+    i, j = np.minimum(a, b), np.maximum(a, b)
+    order = np.lexsort((length, j, i))
+    i, j, length = i[order], j[order], length[order]
+    first = np.r_[True, (i[1:] != i[:-1]) | (j[1:] != j[:-1])]
+    graph = coo_matrix((length[first], (i[first], j[first])), shape=(n, n)).tocsr()
+    return graph, node_xy
+
+
+def snap_points(graph, node_xy, points):
+    """nearest node of the largest connected road network for every point, and the snap distance"""
+    _, labels = connected_components(graph, directed=False)
+    main = np.flatnonzero(labels == np.bincount(labels).argmax())
+    distance, nearest = cKDTree(node_xy[main]).query(points)
+    return main[nearest], distance
+
+
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _distances_from(sources, targets):
+    return dijkstra(_worker_graph, directed=False, indices=sources)[:, targets]
+
+
+def shortest_distances(graph, nodes, n_jobs=None, chunk_size=16):
+    """road distance between all pairs of nodes, the origins are split over worker processes"""
+    nodes = np.asarray(nodes)
+    unique, inverse = np.unique(nodes, return_inverse=True)
+    chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+    if n_jobs == 1:
+        _init_worker(graph)
+        rows = [_distances_from(chunk, unique) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(graph,)) as executor:
+            rows = list(executor.map(_distances_from, chunks, [unique] * len(chunks)))
+    distances = np.vstack(rows)
+    return distances[np.ix_(inverse, inverse)]
+
+
+def od_distances(lines, points, tolerance=1.0, n_jobs=None):
+    """OD matrix of road distances between points, including the distance to and from the road"""
+    graph, node_xy = build_graph(lines, tolerance)
+    nodes, access = snap_points(graph, node_xy, points)
+    distances = shortest_distances(graph, nodes, n_jobs) + access[:, None] + access[None, :]
+    np.fill_diagonal(distances, 0)
+    return distances
+
+
+def write_od(path, codes, distances, data=None):
+    """
+    Writes the OD distances in meters.
+
+    A .csv path gives the afstand format read by generate_OD, a .npz path
+    gives the input file of data_providers.CachedDataProvider, with the
+    municipalities and prices of data (the parameter data of the model, by
+    default the data directory).
+    """
+    codes = np.asarray(codes)
+    if path.endswith('.npz'):
+        from .data_providers import ArrayDataProvider, CachedDataProvider, data_provider
+        source = data_provider(data)
+        municipalities = source.municipalities().set_index('GM_CODE')
+        missing = np.setdiff1d(codes, municipalities.index)
+        if len(missing):
+            raise ValueError('municipalities {} are not in the data'.format(missing.tolist()))
+        CachedDataProvider.build(ArrayDataProvider(codes, municipalities.loc[codes, 'GM_NAAM'],
+                                                   municipalities.loc[codes, 'AANT_INW'], distances,
+                                                   source.prices()), path)
+        return
+    origin, destination = np.meshgrid(np.arange(len(codes)), np.arange(len(codes)), indexing='ij')
+    with open(path, 'w') as file:
+        file.write('origin_id;destination_id;total_cost\n')
+        for o, d, cost in zip(codes[origin.ravel()], codes[destination.ravel()], distances.ravel()):
+            file.write('{};{};{}\n'.format(o, d, '' if np.isinf(cost) else repr(float(cost))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the road distance OD input of the model')
+    parser.add_argument('roads', help='road layer, GeoJSON or shapefile in RD coordinates')
+    parser.add_argument('centroids', help='municipality centroids GeoJSON')
+    parser.add_argument('output', help='.csv (afstand format) or .npz (input data of the model)')
+    parser.add_argument('--data', default=None,
+                        help='data directory or .npz with the municipalities and prices of an .npz output, '
+                             'default ../data')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='vertex snapping distance in meters')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes, default all cores')
+    args = parser.parse_args()
+    codes, points = read_centroids(args.centroids)
+    distances = od_distances(read_lines(args.roads), points, args.tolerance, args.jobs)
+    write_od(args.output, codes, distances, args.data)
+    print('wrote {} OD pairs to {}'.format(len(codes) ** 2, os.path.abspath(args.output)))
+
+
+if __name__ == '__main__':
+    main()
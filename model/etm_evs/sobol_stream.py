@@ -0,0 +1,172 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+from scipy.stats import norm, qmc
+
+"""
+Streaming Sobol sensitivity analysis with early termination
+
+Base samples are added in batches of a scrambled Sobol sequence (Saltelli
+design without second order terms, k + 2 runs per base sample, in the row
+order of SALib's saltelli.sample(calc_second_order=False)). After every batch
+first-order (Saltelli 2010) and total (Jansen) indices are re-estimated with
+bootstrap confidence intervals, the state is written to disk and sampling
+stops once every confidence interval is narrow enough. A study that is
+interrupted continues from the saved state, the sequence is fast-forwarded
+so a resumed study gives the same samples as an uninterrupted one.
+"""
+
+# progress is logged under the ema_workbench logger, shown by ema_logging.log_to_stderr(ema_logging.INFO)
+_logger = logging.getLogger('EMA.sobol_stream')
+
+
+class StreamingSobol:
+    """
+    Sobol indices of the outcomes of a model, updated as batches of evaluations complete.
+
+    names, bounds: uncertain parameters and their (lower, upper) bounds
+    integer: names of integer parameters (sampled uniformly over lower..upper)
+    path: npz file with the state, loaded when it exists
+    """
+
+    def __init__(self, names, bounds, outcomes, integer=(), seed=None, path=None, n_bootstrap=200,
+                 conf_level=0.95):
+        self.names = list(names)
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.outcomes = list(outcomes)
+        self.integer = np.isin(self.names, list(integer))
+        self.seed = int(np.random.SeedSequence().entropy % 2 ** 63) if seed is None else int(seed)
+        self.path = path
+        self.n_bootstrap = n_bootstrap
+        self.conf_level = conf_level
+        self.k = len(self.names)
+        self.Y = np.empty((0, self.k + 2, len(self.outcomes)))
+        if path is not None and os.path.exists(path):
+            self.load()
+        self.sampler = qmc.Sobol(2 * self.k, scramble=True, seed=self.seed)
+        if self.n_base:
+            self.sampler.fast_forward(self.n_base)
+
+    @classmethod
+    def from_ema_model(cls, model, outcomes=None, **kwargs):
+        """uncertainties and outcomes of an ema_workbench Model"""
+        from ema_workbench import IntegerParameter
+        uncertainties = list(model.uncertainties)
+        return cls([u.name for u in uncertainties],
+                   [(u.lower_bound, u.upper_bound) for u in uncertainties],
+                   outcomes or [o.name for o in model.outcomes],
+                   integer=[u.name for u in uncertainties if isinstance(u, IntegerParameter)],
+                   **kwargs)
+
+    @property
+    def n_base(self):
+        return len(self.Y)
+
+    def load(self):
+        with np.load(self.path) as state:
+            if (state['names'].tolist() != self.names or state['outcomes'].tolist() != self.outcomes
+                    or not np.allclose(state['bounds'], self.bounds)):
+                raise ValueError('{} holds the state of a different problem'.format(self.path))
+            self.seed = int(state['seed'])
+            self.Y = state['Y']
+
+    def save(self):
+        if self.path is None:
+            return
+        partial = self.path + '.partial.npz'
+        np.savez(partial, names=self.names, outcomes=self.outcomes, bounds=self.bounds,
+                 seed=self.seed, Y=self.Y)
+        os.replace(partial, self.path)
+
+    def design(self, n):
+        """
+        The next n base samples as a DataFrame of n * (k + 2) parameter
+        combinations, per base sample A, A with column i of B (for every i), B.
+        """
+        base = self.sampler.random(n)
+        A, B = base[:, :self.k], base[:, self.k:]
+        runs = np.repeat(A[:, None, :], self.k + 2, axis=1)
+        runs[:, -1] = B
+        i = np.arange(self.k)
+        runs[:, 1 + i, i] = B
+        unit = runs.reshape(-1, self.k)
+        low, high = self.bounds[:, 0], self.bounds[:, 1]
+        values = low + unit * (high - low)
+        values = np.where(self.integer, np.minimum(np.floor(low + unit * (high - low + 1)), high), values)
+        design = pd.DataFrame(values, columns=self.names)
+        for name in np.array(self.names)[self.integer]:
+            design[name] = design[name].astype(int)
+        return design
+
+    def add(self, results):
+        """stores the outcomes (dict of arrays in design order) of the last design"""
+        Y = np.column_stack([np.asarray(results[o], dtype=float) for o in self.outcomes])
+        self.Y = np.concatenate([self.Y, Y.reshape(-1, self.k + 2, len(self.outcomes))])
+        self.save()
+
+    def _estimates(self, Y, index=None):
+        """first order and total indices, for every row of bootstrap indices if given"""
+        if index is not None:
+            Y = Y[index]
+        else:
+            Y = Y[None]
+        # standardized like SALib, the estimators are not shift invariant
+        Y = (Y - Y.mean(axis=(1, 2), keepdims=True)) / Y.std(axis=(1, 2), keepdims=True)
+        f_A, f_AB, f_B = Y[:, :, :1], Y[:, :, 1:-1], Y[:, :, -1:]
+        variance = np.concatenate([f_A, f_B], axis=1).var(axis=1)
+        first = np.mean(f_B * (f_AB - f_A), axis=1) / variance
+        total = 0.5 * np.mean((f_A - f_AB) ** 2, axis=1) / variance
+        return first, total
+
+    def indices(self, outcome):
+        """DataFrame of S1, S1_conf, ST and ST_conf per parameter (the SALib names)"""
+        Y = self.Y[:, :, self.outcomes.index(outcome)]
+        Y = Y[np.isfinite(Y).all(axis=1)]
+        first, total = self._estimates(Y)
+        rng = np.random.default_rng(self.seed)
+        index = rng.integers(len(Y), size=(self.n_bootstrap, len(Y)))
+        first_boot, total_boot = self._estimates(Y, index)
+        z = norm.ppf(0.5 + self.conf_level / 2)
+        return pd.DataFrame({'S1': first[0], 'S1_conf': z * first_boot.std(axis=0, ddof=1),
+                             'ST': total[0], 'ST_conf': z * total_boot.std(axis=0, ddof=1)},
+                            index=self.names)
+
+    def converged(self, threshold, outcomes=None):
+        """True if all S1 and ST confidence half widths of the outcomes are below threshold"""
+        for outcome in outcomes or self.outcomes:
+            si = self.indices(outcome)
+            if max(si['S1_conf'].max(), si['ST_conf'].max()) >= threshold:
+                return False
+        return True
+
+    def run(self, evaluate, threshold=0.05, batch_size=32, min_base=64, max_base=650, outcomes=None):
+        """
+        Adds batches of base samples until the confidence intervals of the
+        outcomes are below threshold or max_base base samples are done.
+        evaluate takes a design DataFrame and returns a dict of outcome arrays.
+        Returns the indices per outcome, the progress of every batch is logged
+        at level INFO.
+        """
+        while self.n_base < max_base:
+            if self.n_base >= min_base and self.converged(threshold, outcomes):
+                break
+            self.add(evaluate(self.design(min(batch_size, max_base - self.n_base))))
+            if _logger.isEnabledFor(logging.INFO):
+                widths = [self.indices(o)[['S1_conf', 'ST_conf']].values.max() for o in outcomes or self.outcomes]
+                _logger.info('{} base samples ({} runs), widest confidence interval +-{:.3f}'.format(
+                    self.n_base, self.n_base * (self.k + 2), max(widths)))
+        return {outcome: self.indices(outcome) for outcome in self.outcomes}
+
+
+def ema_evaluate(evaluator, outcomes=None):
+    """evaluate function running a design as scenarios with an ema_workbench evaluator"""
+    from ema_workbench import Scenario
+
+    def evaluate(design):
+        scenarios = [Scenario(str(i), **row) for i, row in enumerate(design.to_dict('records'))]
+        experiments, results = evaluator.perform_experiments(scenarios=scenarios)
+        order = np.argsort(experiments['scenario'].astype(int).values)
+        return {o: np.asarray(values)[order] for o, values in results.items() if outcomes is None or o in outcomes}
+
+    return evaluate
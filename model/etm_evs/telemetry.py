@@ -0,0 +1,153 @@
+import argparse
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+import numpy as np
+from .lazy_imports import lazy_module
+
+pd = lazy_module('pandas')
+
+"""
+Telemetry of a running model
+
+With the parameter telemetry (a directory) the model times the phases of
+every tick (EtmEVsModel.step and update) and counts the events of the EVs in
+it. Each tick adds one row to a preallocated buffer: the seconds per phase,
+the events, the EVs stepped per second and the resident memory. Every
+telemetry_flush ticks (default 96) the full buffer is handed to a writer
+thread that appends it to <telemetry>/<run>.csv, so the run does not wait
+for the file. Without the parameter the model only checks that
+model.telemetry is None.
+
+Usage, from the model directory:
+python -m etm_evs.telemetry telemetry/run.csv
+"""
+
+# phases of a tick, in the order of EtmEVsModel.step and update; with kernels the reductions and municipalities
+# are part of ev_step
+PHASES = ['calendar', 'fill_history', 'ma_price_history', 'ev_step', 'reductions', 'debug_stats', 'municipalities',
+          'update']
+# events per tick: departures and arrivals of trips, smart charging schedules (choose_cheapest_timesteps) and
+# charges forced by a battery too low to leave
+COUNTERS = ['departures', 'arrivals', 'schedules', 'forced_charges']
+COLUMNS = ['t'] + PHASES + COUNTERS + ['evs', 'agent_steps_per_second', 'rss_mb']
+
+
+def rss():
+    """resident memory of this process in bytes, the peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+        except ImportError:
+            return np.nan
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Telemetry:
+    """per tick phase times and event counts of a model, buffered and written by a thread"""
+
+    def __init__(self, path, flush_ticks=96):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(','.join(COLUMNS) + '\n')
+        self.buffer = np.empty((flush_ticks, len(COLUMNS)))
+        self.rows = 0
+        self.column = {name: i for i, name in enumerate(COLUMNS)}
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        # the kernels count their events on the threads of the chunks
+        self.lock = threading.Lock()
+        self.new_tick()
+        self.last = perf_counter()
+
+    def new_tick(self):
+        self.row = np.zeros(len(COLUMNS))
+
+    def start(self):
+        """start of the step of a tick"""
+        self.last = perf_counter()
+
+    def lap(self, phase):
+        """adds the time since the last lap to phase"""
+        now = perf_counter()
+        self.row[self.column[phase]] += now - self.last
+        self.last = now
+
+    def count(self, **counts):
+        """adds events of the tick, e.g. count(departures=1)"""
+        with self.lock:
+            for name, n in counts.items():
+                self.row[self.column[name]] += n
+
+    def end_tick(self, t, evs):
+        """completes the row of tick t in which evs EVs were stepped"""
+        row = self.row
+        seconds = row[1:1 + len(PHASES)].sum()
+        row[0] = t
+        row[self.column['evs']] = evs
+        row[self.column['agent_steps_per_second']] = evs / seconds if seconds > 0 else np.nan
+        row[self.column['rss_mb']] = rss() / 2 ** 20
+        self.buffer[self.rows] = row
+        self.rows += 1
+        self.new_tick()
+        if self.rows == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """hands the buffered rows to the writer thread"""
+        if not self.rows:
+            return
+        rows = self.buffer[:self.rows].copy()
+        self.rows = 0
+        if self.pending is not None:
+            self.pending.result()
+        self.pending = self.writer.submit(self.write, rows)
+
+    def write(self, rows):
+        with open(self.path, 'a') as file:
+            np.savetxt(file, rows, delimiter=',', fmt='%.9g')
+
+    def close(self):
+        """writes the remaining rows and waits for the writer"""
+        self.flush()
+        if self.pending is not None:
+            self.pending.result()
+        self.writer.shutdown()
+
+
+def read_telemetry(path):
+    """DataFrame of the telemetry of a run, one row per tick"""
+    return pd.read_csv(path).astype({name: np.int64 for name in ['t'] + COUNTERS + ['evs']})
+
+
+def phase_summary(telemetry):
+    """seconds, share of the run time and milliseconds per tick of every phase"""
+    seconds = telemetry[PHASES].sum()
+    return pd.DataFrame({'seconds': seconds, 'share': seconds / seconds.sum(),
+                         'ms_per_tick': 1000 * seconds / len(telemetry)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise the telemetry of a run')
+    parser.add_argument('path', help='csv file of a run in the telemetry directory')
+    args = parser.parse_args()
+    telemetry = read_telemetry(args.path)
+    steps = telemetry[telemetry['t'] > 0]
+    print(phase_summary(steps).to_string(float_format='{:.4f}'.format))
+    print('events: ' + ', '.join('{} {}'.format(name, steps[name].sum()) for name in COUNTERS))
+    print('{} ticks, {:.0f} agent steps per second, resident memory {:.0f} MB at the end, {:.0f} MB at most'.format(
+        len(steps), steps['evs'].sum() / steps[PHASES].values.sum(), telemetry['rss_mb'].iloc[-1],
+        telemetry['rss_mb'].max()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+import numpy as np
+from . import PARAMS
+from .lazy_imports import lazy_module
+from .price_sweep import SERIES, sweep_reporters
+
+pd = lazy_module('pandas')
+
+"""
+Time-parallel runs of long horizons
+
+A run over the whole price series is serial over time. time_parallel splits
+the steps of a run into windows (whole days, e.g. a week) and runs every
+window as a separate model in a worker process. A window starts overlap
+ticks before its first tick (parameter start_tick, see
+EtmEVsModel.setup_run) and drops those ticks as a warm-up, the first window
+starts at tick 0 without overlap. The series of the windows are joined into
+the series of one run, and the reporters of the parameters (including their
+warmup and horizon) are computed from them as EtmEVsModel.end does.
+
+All windows build the same fleet, and the EVs draw their weekend stays,
+preferences and offsets by the tick of the clock (t + start_tick), so after
+its overlap a window follows the same draws as the serial run. The EV state
+at the start of a window (home, full battery, no price history) is not that
+of the serial run, the overlap should cover the seven day moving average of
+the prices and the time the state takes to settle. overlap_sensitivity
+compares the joined series for several overlaps with the serial run.
+
+Usage, from the model directory:
+python -m etm_evs.time_parallel --n_evs 2000 --days 28 --window 7 --overlaps 1 2 4 7 --jobs -1
+"""
+
+# parameters whose outcomes are not the series of the model, or that the windows set themselves
+UNSUPPORTED = ['fanout', 'series_outcomes', 'event_log', 'save_steady_state', 'warm_start', 'telemetry',
+               'start_tick']
+
+
+def windows(steps, window, overlap):
+    """(start tick, steps, warm-up ticks) of the runs of the windows of a run of steps ticks"""
+    result = []
+    for begin in range(0, steps, window):
+        warmup = min(overlap, begin)
+        result.append((begin - warmup, warmup + min(window, steps - begin), warmup))
+    return result
+
+
+def run_window(params, start_tick, steps, warmup):
+    """series of a window after its warm-up, as the lists of EtmEVsModel"""
+    from .model import EtmEVsModel
+    model = EtmEVsModel(dict(params, start_tick=start_tick, steps=steps))
+    model.run(display=False)
+    series = {name: list(getattr(model, name))[warmup:] for name in SERIES}
+    # the battery percentage has a value for tick 0, the other series start at tick 1; only the first window keeps
+    # tick 0 of the run
+    if start_tick + warmup > 0:
+        series['list_average_battery_percentage'] = series['list_average_battery_percentage'][1:]
+    return series
+
+
+def join(parts):
+    """series of a run from the series of its windows"""
+    return {name: [value for part in parts for value in part[name]] for name in SERIES}
+
+
+def time_parallel(params, window, overlap, n_jobs=1, mp_context=None):
+    """
+    (reporters, series) of params from runs of windows of window ticks with
+    an overlap of overlap ticks, run on n_jobs worker processes (-1 for all
+    cores; mp_context, e.g. cli.worker_context(), is their multiprocessing context)
+    """
+    unsupported = [name for name in UNSUPPORTED if params.get(name)]
+    if unsupported:
+        raise ValueError('time parallel runs do not support {}'.format(unsupported))
+    ticks_per_day = 1440 // params.get('tick_minutes', 15)
+    if window % ticks_per_day != 0 or overlap % ticks_per_day != 0 or window <= 0:
+        raise ValueError('window and overlap should be whole days, not {} and {} ticks'.format(window, overlap))
+    base = {name: value for name, value in params.items() if name not in ('warmup', 'horizon')}
+    runs = windows(params['steps'], window, overlap)
+    if n_jobs == 1:
+        parts = [run_window(base, *run) for run in runs]
+    else:
+        with ProcessPoolExecutor(None if n_jobs == -1 else n_jobs, mp_context=mp_context) as executor:
+            parts = list(executor.map(run_window, [base] * len(runs), *zip(*runs)))
+    series = join(parts)
+    return sweep_reporters(series, params), series
+
+
+def overlap_sensitivity(params, window, overlaps, n_jobs=1, mp_context=None):
+    """
+    DataFrame with, for every overlap, the seconds of the time parallel run,
+    the share of ticks whose power demand equals the serial run, the largest
+    difference of every series relative to its range in the serial run and
+    the largest relative difference of the reporters; the first row is the
+    serial run (params without horizon)
+    """
+    from .model import EtmEVsModel
+    if params.get('horizon') is not None:
+        raise ValueError('the serial run should not stop at a horizon')
+    start = timer()
+    model = EtmEVsModel(params)
+    model.run(display=False)
+    rows = [{'overlap': None, 'seconds': timer() - start}]
+    serial = {name: np.asarray(getattr(model, name), dtype=float) for name in SERIES}
+    for overlap in overlaps:
+        start = timer()
+        reporters, series = time_parallel(params, window, overlap, n_jobs, mp_context)
+        row = {'overlap': overlap, 'seconds': timer() - start}
+        power = np.asarray(series['list_total_current_power_demand'])
+        row['equal_power_ticks'] = np.mean(power == serial['list_total_current_power_demand'])
+        for name in SERIES:
+            reference = serial[name]
+            row[name[5:] + '_difference'] = np.max(np.abs(np.asarray(series[name]) - reference)) / \
+                max(np.ptp(reference), 1e-9)
+        row['reporter_difference'] = max(abs(value - model.reporters[name]) / max(abs(model.reporters[name]), 1e-9)
+                                         for name, value in reporters.items() if name in model.reporters)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    from .cli import worker_context
+    parser = argparse.ArgumentParser(description='Run windows of a long horizon in parallel and compare overlaps')
+    parser.add_argument('--params', default=PARAMS)
+    parser.add_argument('--n_evs', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=28)
+    parser.add_argument('--window', type=int, default=7, help='days per window')
+    parser.add_argument('--overlaps', type=int, nargs='+', default=[1, 2, 4, 7], help='days of warm-up overlap')
+    parser.add_argument('--jobs', type=int, default=-1, help='worker processes, -1 for all cores')
+    args = parser.parse_args()
+    with open(args.params) as file:
+        params = json.load(file)
+    ticks_per_day = 1440 // params.get('tick_minutes', 15)
+    params.update(n_evs=args.n_evs, steps=args.days * ticks_per_day)
+    context = worker_context() if args.jobs != 1 else None
+    sensitivity = overlap_sensitivity(params, args.window * ticks_per_day,
+                                      [days * ticks_per_day for days in args.overlaps], args.jobs, context)
+    with pd.option_context('display.width', 200):
+        print(sensitivity.to_string(index=False, float_format='{:.4g}'.format))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import json
+import numpy as np
+from . import PARAMS
+from .lazy_imports import lazy_module
+from .fanout import run_profiles
+
+pd = lazy_module('pandas')
+
+"""
+Variance reduction of stratified fleets and common random numbers
+
+Runs replicates of a set of scenarios with four designs:
+
+- independent: every run its own seed (as seed_run.py without a seed)
+- crn: common random numbers (crn=True), replicate r of every scenario shares its seed
+- lhs: independent seeds, Latin hypercube fleet (fleet_sampling='lhs')
+- lhs+crn: both
+
+and reports per outcome the variance over replicates of a scenario and of
+the difference between every scenario and the first, and how much smaller it
+is than with independent runs. That factor is the number of independent
+replicates one replicate of the design is worth.
+
+Usage, from the model directory:
+python -m etm_evs.variance_reduction --n_evs 500 --days 3 --replicates 8 --scenarios '{"p_smart": [0, 0.5]}'
+"""
+
+DESIGNS = {
+    'independent': {},
+    'crn': {'crn': True},
+    'lhs': {'fleet_sampling': 'lhs'},
+    'lhs+crn': {'fleet_sampling': 'lhs', 'crn': True},
+}
+OUTCOMES = ['mean_power_demand', 'max_power_demand', 'mean_VTG_capacity', 'mean_average_battery_percentage']
+
+
+def design_profiles(params, scenarios, replicates, designs=tuple(DESIGNS)):
+    """parameter dicts of every design, scenario and replicate, with these three as labels"""
+    profiles = []
+    base_seed = params.get('seed', 0)
+    for design in designs:
+        for scenario_index, scenario in enumerate(scenarios):
+            for replicate in range(replicates):
+                profile = dict(params, **scenario, **DESIGNS[design], replicate=replicate)
+                if profile.get('crn'):
+                    profile['seed'] = base_seed
+                else:
+                    # a different seed for every run
+                    profile['seed'] = base_seed + 1 + replicate * len(scenarios) + scenario_index
+                profiles.append(dict(profile, design=design, scenario=scenario_index))
+    return profiles
+
+
+def variance_reduction(results, outcomes=OUTCOMES):
+    """
+    DataFrame per design and outcome with the variance over replicates of a
+    scenario (mean over scenarios) and of the difference with the first scenario
+    (mean over the other scenarios), and their reduction relative to independent runs
+    """
+    rows = []
+    for design, runs in results.groupby('design', sort=False):
+        for outcome in outcomes:
+            values = runs.pivot_table(index='replicate', columns='scenario', values=outcome)
+            differences = values.iloc[:, 1:].sub(values.iloc[:, 0], axis=0)
+            rows.append({'design': design, 'outcome': outcome, 'mean': values.values.mean(),
+                         'variance': values.var(ddof=1).mean(),
+                         'difference_variance': differences.var(ddof=1).mean() if differences.shape[1] else np.nan})
+    table = pd.DataFrame(rows)
+    reference = table[table['design'] == 'independent'].set_index('outcome')
+    table['reduction'] = reference.loc[table['outcome'], 'variance'].values / table['variance']
+    table['difference_reduction'] = reference.loc[table['outcome'], 'difference_variance'].values / \
+        table['difference_variance']
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Variance reduction of LHS fleets and common random numbers')
+    parser.add_argument('--params', default=PARAMS)
+    parser.add_argument('--n_evs', type=int, default=500)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--replicates', type=int, default=8)
+    parser.add_argument('--scenarios', default='{"p_smart": [0, 0.5]}',
+                        help='json with one parameter and its values, one scenario per value')
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes, -1 for all cores')
+    parser.add_argument('--output', help='csv for the outcomes of every run')
+    args = parser.parse_args()
+    with open(args.params) as file:
+        params = json.load(file)
+    params.update(n_evs=args.n_evs, steps=args.days * 1440 // params.get('tick_minutes', 15))
+    (name, values), = json.loads(args.scenarios).items()
+    profiles = design_profiles(params, [{name: value} for value in values], args.replicates)
+    results = run_profiles(profiles, args.jobs)
+    if args.output:
+        results.to_csv(args.output, index=False)
+    with pd.option_context('display.width', 200):
+        print(variance_reduction(results).round(3).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
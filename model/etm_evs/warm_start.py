@@ -0,0 +1,288 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+from timeit import default_timer as timer
+import numpy as np
+from . import PARAMS
+from .data_providers import DATA_DIRECTORY, data_provider
+from .fleet import LOCATION_CODES, LOCATION_NAMES, NO_TIME, PREF_CODES, Location
+from .fleet_cache import DEFAULTS, INIT_PARAMETERS
+from .rng import Purpose
+
+"""
+Warm start from a stored steady state
+
+A cold run starts with all EVs at home with 90% of their battery and needs a
+warm-up of two to three weeks (see warmup.py). A reference run with the
+parameter save_steady_state (a directory) stores the state of its fleet after
+its last tick, which must end a week, relative to that tick: location, state
+of charge, plug-in state and the pending schedule (departure, return and
+arrival times, offsets, cheapest timesteps) of every EV, and the price history
+of the smart EVs. A run with the parameter warm_start (the same directory)
+draws the initial state of each of its EVs from a donor of the stored state:
+one of the DONORS EVs with the same smart charging and charging preference
+that are nearest in commute distance. The donor's schedule is shifted by the
+difference in departure time of day, its battery levels are scaled to the
+battery volume of the EV and the charging deadline follows from the shifted
+schedule. Outcomes can then be used from tick 0.
+
+The directory is a library of steady states: one file per reference run,
+named after a hash of the parameters that shape the fleet (FLEET_PARAMETERS,
+the input data) and of the scenario parameters (SCENARIO_PARAMETERS). A warm
+start takes the stored scenario nearest to its own (largest absolute
+difference) within warm_start_tolerance (default 0.25) and starts cold, with a
+warning, if there is none.
+
+Usage, from the model directory:
+python -m etm_evs.warm_start --n_evs 2000 --weeks 3 --days 7
+"""
+
+# parameters of the fleet draws and the trips, a steady state is only used for the same values
+FLEET_PARAMETERS = [name for name in INIT_PARAMETERS if name != 'n_evs'] + ['average_driving_speed']
+# parameters that shape the steady state, the nearest stored values within the tolerance are used
+SCENARIO_PARAMETERS = ['p_smart', 'p_pref', 'pref_home', 'pref_strictness', 'weekend_week_ratio']
+# donors nearest in commute distance an EV draws from
+DONORS = 8
+# days of the price history kept (see EtmEVsModel.calc_ma_price_history)
+PRICE_DAYS = 7
+
+
+def fleet_key(p, data=None):
+    """hash of the fleet parameters, the fleet sampling and the input data"""
+    inputs = {name: repr(float(p.get(name, DEFAULTS.get(name)))) for name in FLEET_PARAMETERS}
+    inputs.update(data=data_provider(data).version(), sampling=p.get('fleet_sampling', 'random'))
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def scenario_vector(p):
+    return np.array([float(p[name]) for name in SCENARIO_PARAMETERS])
+
+
+class SteadyStateLibrary:
+    """steady states of reference runs in a directory, for one fleet and the scenarios near one"""
+
+    def __init__(self, root, p, data=None):
+        self.root = root
+        self.key = fleet_key(p, data)
+        self.scenario = scenario_vector(p)
+
+    def save(self, state):
+        """stores a steady state (see steady_state) for the scenario, returns its path"""
+        scenario = hashlib.sha1(self.scenario.tobytes()).hexdigest()[:12]
+        path = os.path.join(self.root, '{}-{}.npz'.format(self.key, scenario))
+        os.makedirs(self.root, exist_ok=True)
+        partial = '{}.partial-{}.npz'.format(path[:-4], os.getpid())
+        np.savez(partial, scenario=self.scenario, **state)
+        os.replace(partial, path)
+        return path
+
+    def load(self, tolerance=0.25):
+        """(steady state, path) of the stored scenario nearest to the scenario, None if none is within tolerance"""
+        best, distance = None, np.inf
+        for path in sorted(glob.glob(os.path.join(self.root, self.key + '-*.npz'))):
+            with np.load(path) as stored:
+                difference = np.abs(stored['scenario'] - self.scenario).max()
+            if difference < distance:
+                best, distance = path, difference
+        if best is None or distance > tolerance:
+            return None
+        with np.load(best) as stored:
+            return {name: stored[name] for name in stored.files}, best
+
+
+def steady_state(model):
+    """arrays of the state of the EVs of a model after its current tick, times relative to that tick"""
+    t = model.t
+    if t % model.ticks_per_week != 0:
+        raise ValueError('a steady state is stored at the end of a week, not at tick {}'.format(t))
+    evs = list(model.EVs)
+    location = np.array([LOCATION_CODES[ev.current_location] for ev in evs], dtype=np.int8)
+    volume = np.array([ev.battery_volume for ev in evs])
+
+    def relative(name, pending=False):
+        values = np.array([NO_TIME if getattr(ev, name) is None else getattr(ev, name) for ev in evs],
+                          dtype=np.int64)
+        keep = values > t if pending else values != NO_TIME
+        return np.where(keep, values - t, NO_TIME)
+
+    def fraction(name):
+        return np.array([np.nan if getattr(ev, name) is None else getattr(ev, name) for ev in evs]) / volume
+
+    cheapest = [[i - t for i in ev.cheapest_timesteps if i > t] for ev in evs]
+    n_cheapest = np.array([len(timesteps) for timesteps in cheapest], dtype=np.int64)
+    padded = np.zeros((len(evs), max(1, int(n_cheapest.max(initial=0)))), dtype=np.int64)
+    for i, timesteps in enumerate(cheapest):
+        padded[i, :len(timesteps)] = timesteps
+    prices = np.full((model.ticks_per_day, PRICE_DAYS), np.nan)
+    for i, history in enumerate(model.price_history):
+        recent = history[-PRICE_DAYS:]
+        prices[i, :len(recent)] = recent
+    return {
+        'smart': np.array([bool(ev.smart) for ev in evs]),
+        'charge_pref': np.array([PREF_CODES[ev.charge_pref] for ev in evs], dtype=np.int8),
+        'commute_distance': np.array([ev.commute_distance for ev in evs]),
+        'departure_of_day': np.array([ev.departure_time % model.ticks_per_day for ev in evs], dtype=np.int64),
+        'dwell_time': np.array([ev.dwell_time for ev in evs], dtype=np.int64),
+        'location': location,
+        'plugged_in': np.array([bool(ev.plugged_in) for ev in evs]),
+        'charging': np.array([bool(ev.charging) for ev in evs]),
+        'force_charge': np.array([bool(ev.force_charge) for ev in evs]),
+        'stick_to_pref': np.array([-1 if ev.stick_to_pref is None else int(ev.stick_to_pref) for ev in evs],
+                                  dtype=np.int8),
+        'offset_dep': np.array([ev.offset_dep for ev in evs], dtype=np.int64),
+        'offset_dwell': np.array([ev.offset_dwell for ev in evs], dtype=np.int64),
+        'departure_time': relative('departure_time'),
+        'return_time': relative('return_time'),
+        'arrival_time_home': np.where(location == Location.ONROAD, relative('arrival_time_home', True), NO_TIME),
+        'arrival_time_work': np.where(location == Location.ONROAD, relative('arrival_time_work', True), NO_TIME),
+        'battery': fraction('current_battery_volume'),
+        'charging_start': fraction('battery_level_at_charging_start'),
+        'cheapest': padded,
+        'n_cheapest': n_cheapest,
+        'price_history': prices,
+    }
+
+
+def draw_donors(streams, state, keys, smart, charge_pref, commute_distance):
+    """index of the donor of every EV: one of the DONORS nearest in commute distance of its group"""
+    keys = np.asarray(keys, dtype=np.int64)
+    u = np.asarray(streams.random(keys, 0, Purpose.WARM_START))
+    donors = np.zeros(len(keys), dtype=np.int64)
+    groups = state['smart'].astype(np.int64) * 8 + state['charge_pref']
+    own = np.asarray(smart, dtype=np.int64) * 8 + np.asarray(charge_pref)
+    everyone = np.arange(len(groups))
+    for group in np.unique(own):
+        evs = np.flatnonzero(own == group)
+        candidates = np.flatnonzero(groups == group)
+        if not len(candidates):
+            candidates = everyone
+        candidates = candidates[np.argsort(state['commute_distance'][candidates], kind='stable')]
+        distance = state['commute_distance'][candidates]
+        nearest = np.searchsorted(distance, np.asarray(commute_distance)[evs])
+        low = np.clip(nearest - DONORS // 2, 0, max(len(candidates) - DONORS, 0))
+        width = min(DONORS, len(candidates))
+        donors[evs] = candidates[low + np.minimum((u[evs] * width).astype(np.int64), width - 1)]
+    return donors
+
+
+def apply_steady_state(model, state):
+    """sets the EVs of a model (after setup) to the state of their donors and restores the price history"""
+    evs = list(model.EVs)
+    ticks_per_day = model.ticks_per_day
+    donors = draw_donors(model.streams, state, [ev.key for ev in evs], [bool(ev.smart) for ev in evs],
+                         [PREF_CODES[ev.charge_pref] for ev in evs], [ev.commute_distance for ev in evs])
+    for ev, i in zip(evs, donors.tolist()):
+        # schedule of the donor, shifted to the departure time of the EV
+        shift = ev.departure_time % ticks_per_day - int(state['departure_of_day'][i])
+        location = LOCATION_NAMES[Location(int(state['location'][i]))]
+        ev.current_location = location
+        ev.moving = location == 'onroad'
+        ev.offset_dep = int(state['offset_dep'][i])
+        ev.offset_dwell = int(state['offset_dwell'][i])
+        ev.departure_time = int(state['departure_time'][i]) + shift
+        while ev.departure_time + ev.offset_dep < 1:
+            ev.departure_time += ticks_per_day
+        ev.return_time = ev.departure_time + ev.dwell_time
+        if location == 'work':
+            ev.return_time = max(1, int(state['return_time'][i]) + shift + ev.dwell_time -
+                                 int(state['dwell_time'][i]))
+        ev.arrival_time_home = None
+        ev.arrival_time_work = None
+        for name in ['arrival_time_home', 'arrival_time_work']:
+            if state[name][i] != NO_TIME:
+                setattr(ev, name, max(1, int(state[name][i]) + shift))
+        # battery levels of the donor for the battery volume of the EV
+        ev.current_battery_volume = float(state['battery'][i]) * ev.battery_volume
+        ev.battery_percentage = ev.current_battery_volume / ev.battery_volume * 100
+        ev.plugged_in = bool(state['plugged_in'][i])
+        ev.charging = bool(state['charging'][i])
+        ev.force_charge = bool(state['force_charge'][i])
+        ev.stick_to_pref = None if state['stick_to_pref'][i] < 0 else bool(state['stick_to_pref'][i])
+        ev.cheapest_timesteps = []
+        if ev.plugged_in and location != 'onroad':
+            # deadline and needed level as set on arrival (EV.arrive_home and EV.arrive_work)
+            ev.battery_level_at_charging_start = float(state['charging_start'][i]) * ev.battery_volume
+            if location == 'home':
+                ev.time_charging_must_finish = ev.departure_time + ev.offset_dep
+                ev.needed_battery_level_at_charging_end = ev.battery_volume
+            else:
+                ev.time_charging_must_finish = ev.return_time
+                ev.needed_battery_level_at_charging_end = max(ev.energy_required, ev.battery_level_at_charging_start)
+            if ev.smart:
+                cheapest = state['cheapest'][i, :state['n_cheapest'][i]] + shift
+                ev.cheapest_timesteps = cheapest[cheapest >= 1].tolist()
+        else:
+            ev.battery_level_at_charging_start = None
+            ev.time_charging_must_finish = None
+            ev.needed_battery_level_at_charging_end = None
+    # EVs present in every municipality: those at home in agent order, then those at work
+    municipalities = {mun.id: mun for mun in model.municipalities}
+    for mun in model.municipalities:
+        mun.current_EVs = [ev for ev in mun.current_EVs if ev.current_location == 'home']
+    for ev in evs:
+        if ev.current_location == 'work' and ev.work_location_id in municipalities:
+            municipalities[ev.work_location_id].current_EVs.append(ev)
+    prices = state['price_history']
+    model.price_history = [[round(price, 2) for price in row[~np.isnan(row)].tolist()] or [0] for row in prices]
+    model.average_battery_percentage = np.mean([ev.battery_percentage for ev in evs])
+
+
+def warm_start(model):
+    """initial state of the EVs of a model from the steady state library of the parameter warm_start"""
+    library = SteadyStateLibrary(model.p.warm_start, model.p, model.data)
+    found = library.load(model.p.get('warm_start_tolerance', 0.25))
+    if found is None:
+        logging.warning('no steady state in {} for this fleet and scenario, cold start'.format(model.p.warm_start))
+        return False
+    state, path = found
+    apply_steady_state(model, state)
+    logging.info('warm start from {}'.format(path))
+    return True
+
+
+def compare(params, root, weeks=3, days=7):
+    """
+    stores the steady state of a reference run of weeks, then compares a cold
+    and a warm run of days with the last days of the reference run; returns a
+    dict with their mean outcomes and run times
+    """
+    from .model import EtmEVsModel  # model imports this module
+    ticks = days * 1440 // params.get('tick_minutes', 15)
+    ticks_per_week = 7 * 1440 // params.get('tick_minutes', 15)
+    report = {}
+    runs = {'reference': dict(params, steps=weeks * ticks_per_week, save_steady_state=root),
+            'cold': dict(params, steps=ticks), 'warm': dict(params, steps=ticks, warm_start=root)}
+    for name, run in runs.items():
+        start = timer()
+        model = EtmEVsModel(run)
+        model.run(display=False)
+        report[name + '_seconds'] = timer() - start
+        for series in ['list_average_battery_percentage', 'list_total_current_power_demand',
+                       'list_total_VTG_capacity']:
+            values = getattr(model, series)
+            if name == 'reference':
+                values = values[-ticks:]
+            report['{}_{}'.format(name, series[5:])] = float(np.mean(values))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Store a steady state and compare cold and warm starts')
+    parser.add_argument('--params', default=PARAMS)
+    parser.add_argument('--n_evs', type=int, default=2000)
+    parser.add_argument('--weeks', type=int, default=3, help='length of the reference run')
+    parser.add_argument('--days', type=int, default=7, help='length of the cold and warm runs')
+    parser.add_argument('--library', default=os.path.join(DATA_DIRECTORY, 'steady_state'))
+    args = parser.parse_args()
+    with open(args.params) as file:
+        params = json.load(file)
+    params.update(n_evs=args.n_evs)
+    for name, value in compare(params, args.library, args.weeks, args.days).items():
+        print('{}: {}'.format(name, value))
+
+
+if __name__ == '__main__':
+    main()
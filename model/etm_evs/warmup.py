@@ -0,0 +1,116 @@
+import numpy as np
+
+"""
+Warm-up detection for the fleet level series
+
+MSER (marginal standard error rule) on batch means: for every truncation
+point d the statistic is the variance of the batch means after d divided by
+the number of remaining batches, the warm-up is the d with the smallest
+value. The model batches per day, so the daily charging cycle is averaged
+out. Only truncation points in the first half of the batches are candidates;
+a warm-up is accepted once the batches after it are at least one week
+(margin) longer than the warm-up itself, so the steady part covers the
+weekly cycle and a minimum on the edge of the first half (the series is
+still moving) is not taken for the end of the warm-up.
+
+With the parameter warmup='auto' the model checks the battery percentage,
+power demand and VTG capacity after every day (WarmupDetector), uses the
+largest of their truncation points as warm-up and, with the parameter
+horizon, stops horizon ticks after it; steps is then the maximum run length.
+A fixed warm-up (warmup=672) works the same without the detection. Outcomes
+are reported over the horizon after the warm-up, its length is reported as
+warmup_length, warmup_converged is False for runs that reached steps before
+a warm-up was accepted (their warmup_length is the last estimate).
+
+For the default parameters the battery percentage settles after two to
+three weeks (about 19 days without and 14 days with smart charging), power
+demand and VTG capacity after one to three days.
+"""
+
+# model series checked for the warm-up, and the tick of their first value
+WARMUP_SERIES = {
+    'list_average_battery_percentage': 0,
+    'list_total_current_power_demand': 1,
+    'list_total_VTG_capacity': 1,
+}
+
+
+def batch_means(values, batch):
+    """means of consecutive batches, an incomplete last batch is dropped"""
+    values = np.asarray(values, dtype=float)
+    n = len(values) // batch
+    return values[:n * batch].reshape(n, batch).mean(axis=1)
+
+
+def mser(values, batch=1):
+    """
+    (truncation point in values, MSER statistic per candidate truncation point in batches),
+    the candidates are the first half of the batches
+    """
+    means = batch_means(values, batch)
+    n = len(means)
+    if n < 2:
+        return 0, np.array([])
+    # sums over the batch means after every truncation point d
+    total = np.cumsum(means[::-1])[::-1]
+    squares = np.cumsum((means ** 2)[::-1])[::-1]
+    remaining = n - np.arange(n)
+    statistic = ((squares - total ** 2 / remaining) / remaining ** 2)[:n // 2 + 1]
+    return int(np.argmin(statistic)) * batch, statistic
+
+
+def detect_warmup(series, batch, margin=7):
+    """
+    (warm-up, converged) for several series of the same ticks: the largest
+    MSER truncation point, converged if the batches after it outnumber the
+    batches before it by margin for every series
+    """
+    warmup = 0
+    converged = True
+    for values in series:
+        truncation, _ = mser(values, batch)
+        if len(values) // batch - 2 * (truncation // batch) < margin:
+            converged = False
+        warmup = max(warmup, truncation)
+    return warmup, converged
+
+
+class WarmupDetector:
+    """warm-up of a model run, fixed (ticks) or detected every day with MSER on daily means"""
+
+    def __init__(self, model, warmup, horizon=None, margin=7):
+        self.model = model
+        self.auto = warmup == 'auto'
+        self.length = 0 if self.auto else int(warmup)
+        self.converged = not self.auto
+        self.horizon = None if horizon is None else int(horizon)
+        self.margin = margin
+
+    def series(self):
+        """the warm-up series from tick 1 on"""
+        return [getattr(self.model, name)[1 - first:] for name, first in WARMUP_SERIES.items()]
+
+    def update(self):
+        """called every tick after recording, detects the warm-up and stops the run after the horizon"""
+        t = self.model.t
+        ticks_per_day = self.model.ticks_per_day
+        if self.auto and not self.converged and t > 0 and t % ticks_per_day == 0 and \
+                t // ticks_per_day >= self.margin:
+            self.length, self.converged = detect_warmup(self.series(), ticks_per_day, self.margin)
+        if self.converged and self.horizon is not None and t >= self.length + self.horizon:
+            self.model.stop()
+
+    def finish(self):
+        """final estimate for runs that ended before the warm-up was accepted"""
+        if self.auto and not self.converged:
+            self.length, _ = detect_warmup(self.series(), self.model.ticks_per_day, self.margin)
+
+    def after_warmup(self, values, first_t=1):
+        """
+        the values recorded at length <= t < length + horizon (as results_query's
+        trim_warmup), values[0] was recorded at first_t
+        """
+        start = max(self.length - first_t, 0)
+        if self.horizon is None:
+            return values[start:]
+        return values[start:max(self.length + self.horizon - first_t, 0)]
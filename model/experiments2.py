@@ -1,10 +1,14 @@
+import os
 import agentpy as ap
 import pandas as pd
-from model import EtmEVsModel
+from etm_evs.data_providers import DATA_DIRECTORY
+from etm_evs.model import EtmEVsModel
 
-profiles = pd.read_csv('../data/scenarios2.csv').to_dict(orient='records')
+profiles = pd.read_csv(os.path.join(DATA_DIRECTORY, 'scenarios2.csv')).to_dict(orient='records')
+# all scenarios share one fleet (same seed and init parameters), built once and cached on disk
+profiles = [dict(profile, fleet_cache=os.path.join(DATA_DIRECTORY, 'fleet_cache')) for profile in profiles]
 
 exp = ap.Experiment(EtmEVsModel, profiles, record=True)
 results = exp.run(n_jobs=-1, verbose=10)
 
-results.save(path='../data/experiment2_results')
\ No newline at end of file
+results.save(path=os.path.join(DATA_DIRECTORY, 'experiment2_results'))
\ No newline at end of file
@@ -1,12 +1,18 @@
 import json
+import logging
 import agentpy as ap
-from model import EtmEVsModel
+from etm_evs import PARAMS
+from etm_evs.model import EtmEVsModel
 from timeit import default_timer as timer
 
 
+# model log in the working directory
+logging.basicConfig(filename='model.log', filemode='w',
+                    format='%(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
 start = timer()
 # load model parameters
-with open('params.json') as file:
+with open(PARAMS) as file:
     params = json.load(file)
 
 # run simulation
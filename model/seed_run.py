@@ -1,10 +1,13 @@
 import agentpy as ap
 import pandas as pd
 import json
-from model import EtmEVsModel
+import os
+from etm_evs import PARAMS
+from etm_evs.data_providers import DATA_DIRECTORY
+from etm_evs.model import EtmEVsModel
 
 # load defualt model parameters
-with open('params.json') as file:
+with open(PARAMS) as file:
     params = json.load(file)
 
 # remove seed and sample
@@ -13,4 +16,4 @@ del params['seed']
 exp = ap.Experiment(EtmEVsModel, params, iterations=20, record=True)
 results = exp.run(n_jobs=-1, verbose=10)
 
-results.save(path='../data/seed_run')
\ No newline at end of file
+results.save(path=os.path.join(DATA_DIRECTORY, 'seed_run'))
\ No newline at end of file
@@ -0,0 +1,59 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+from etm_evs.adaptive_design import AdaptiveDesign
+from etm_evs.fanout import run_profiles
+
+
+@pytest.fixture
+def grid():
+    levels = np.round(np.linspace(0, 1, 11), 1)
+    rows = itertools.product(levels, levels, [0.0, 0.25, 0.75, 1.0])
+    return pd.DataFrame(list(rows), columns=['VTG_percentage', 'p_smart', 'pref_home']).assign(seed=1)
+
+def outcome(profile):
+    # a step in p_smart, smooth in pref_home and VTG_percentage
+    return 10 * (profile['p_smart'] > 0.55) + profile['pref_home'] + profile['VTG_percentage']
+
+def fake_run(runs):
+    def run(profiles):
+        runs.append(len({(profile['p_smart'], profile['pref_home']) for profile in profiles}))
+        return pd.DataFrame([dict(profile, max_power_demand=outcome(profile)) for profile in profiles])
+    return run
+
+def test_design_refines_the_step(grid):
+    runs = []
+    design = AdaptiveDesign(grid, 'max_power_demand', run=fake_run(runs)).run(budget=20)
+    assert sum(runs) == len(design.done) == 20
+    # every run point covers all VTG_percentage levels
+    assert len(design.design()) == 20 * 11
+    assert list(design.results_frame().columns[:4]) == list(grid.columns)
+    p_smart = design.scenarios.loc[design.design().index, 'p_smart'].unique()
+    assert 0.5 in p_smart and 0.6 in p_smart
+    emulated = design.emulate()
+    assert np.all((emulated > 5) == (grid.apply(outcome, axis=1) > 5))
+    assert np.all(emulated[design.design().index] == design.results_frame()['max_power_demand'])
+
+def test_threshold_is_refined_first(grid):
+    design = AdaptiveDesign(grid, 'max_power_demand', threshold=5, run=fake_run([])).run(budget=14, batch=2)
+    initial = design.history[0]['runs']
+    assert design.history[0]['largest_error'] == pytest.approx(1.0)
+    assert np.all(np.abs(design.coordinates[design.done[initial:], 0] - 0.55) < 0.3)
+
+def test_design_stops_when_resolved(grid):
+    flat = AdaptiveDesign(grid, 'max_power_demand', run=lambda profiles: pd.DataFrame(
+        [dict(profile, max_power_demand=1.0) for profile in profiles])).run(budget=40)
+    assert len(flat.done) == flat.history[0]['runs'] < 40
+    assert flat.history[0]['largest_error'] == 0
+    with pytest.raises(ValueError):
+        AdaptiveDesign(grid[(grid['p_smart'] == 0) & (grid['pref_home'] == 0)], 'max_power_demand')
+
+def test_design_runs_the_model(make_params):
+    params = make_params(n_evs=60, steps=24, tick_minutes=60)
+    scenarios = pd.DataFrame([dict(params, VTG_percentage=v, p_smart=p) for v in [0, 1] for p in [0, 0.5, 1]])
+    design = AdaptiveDesign(scenarios, 'max_VTG_capacity').run(budget=2, initial=0)
+    results = design.results_frame()
+    assert len(results) == 4
+    full = run_profiles(scenarios.to_dict(orient='records'))
+    assert results['max_VTG_capacity'].tolist() == full.loc[results.index, 'max_VTG_capacity'].tolist()
@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+from etm_evs.cli import PARAMS, SOURCE_DIRECTORY, read_params
+from etm_evs.data_providers import CachedDataProvider, SyntheticDataProvider
+from etm_evs.lazy_imports import lazy_module
+
+
+def test_read_params_overrides():
+    params = read_params(PARAMS, ['n_evs=20', 'p_smart=0.5', 'data=../data'])
+    assert params['n_evs'] == 20 and params['p_smart'] == 0.5 and params['data'] == '../data'
+
+def test_lazy_module():
+    json_module = lazy_module('json')
+    assert 'lazy' in repr(json_module)
+    assert json_module.dumps([1]) == '[1]'
+    assert 'loaded' in repr(json_module)
+
+def test_run_from_other_directory(tmp_path):
+    data = str(tmp_path / 'data.npz')
+    CachedDataProvider.build(SyntheticDataProvider(), data)
+    env = dict(os.environ, PYTHONPATH=SOURCE_DIRECTORY)
+    output = subprocess.run([sys.executable, '-m', 'etm_evs', 'run', '--set', 'n_evs=5', 'steps=8', 'data=' + data],
+                            cwd=str(tmp_path), env=env, capture_output=True, text=True, check=True).stdout
+    reporters = json.loads(output)
+    assert reporters['max_power_demand'] >= 0
+    assert os.listdir(str(tmp_path)) == ['data.npz']
+
+def test_run_log_file(tmp_path):
+    data = str(tmp_path / 'data.npz')
+    CachedDataProvider.build(SyntheticDataProvider(), data)
+    env = dict(os.environ, PYTHONPATH=SOURCE_DIRECTORY)
+    subprocess.run([sys.executable, '-m', 'etm_evs', 'run', '--set', 'n_evs=5', 'steps=8', 'data=' + data,
+                    '--log', 'run.log'], cwd=str(tmp_path), env=env, capture_output=True, check=True)
+    with open(str(tmp_path / 'run.log')) as file:
+        assert 'Model init completed' in file.read()
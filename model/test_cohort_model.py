@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from etm_evs.cohort_model import CohortModel, apply_calibration, calibrate, offset_pmf, outcomes_of, validate
+
+
+@pytest.fixture
+def params(make_params):
+    return make_params(6, n_evs=400, steps=150, seed=4, cohort_classes=60)
+
+def test_offset_pmf():
+    assert offset_pmf(2, 1) == [(-1, 0.25), (0, 0.5), (1, 0.25)]
+    assert offset_pmf(0, 1) == [(0, 1.0)]
+    for offset, tick_scale in [(3, 1), (3, 4), (5, 2)]:
+        assert sum(p for _, p in offset_pmf(offset, tick_scale)) == pytest.approx(1)
+    assert outcomes_of(1) == [(True, 1.0)]
+    assert outcomes_of(0.25) == [(True, 0.25), (False, 0.75)]
+
+def test_cohorts_keep_the_fleet_weight(params):
+    model = CohortModel(params)
+    model.sim_setup()
+    # 3 charging preferences and 3 * 5 offsets per smart or not smart class
+    assert model.cohorts.n == 60 * 2 * 3 * 15
+    for _ in range(100):
+        model.sim_step()
+        assert model.cohorts.weight.sum() == pytest.approx(400)
+    assert model.cohorts.n < 60 * 2 * 3 * 15 * 10
+    assert np.all(model.cohorts.current_battery_volume <= model.cohorts.battery_volume)
+
+def test_cohorts_without_draws_are_single_evs(params, run):
+    fixed = dict(params, offset_dep=0, offset_dwell=0, p_pref=0, pref_strictness=1, weekend_week_ratio=1, p_smart=0)
+    model = run(fixed, CohortModel)
+    assert model.cohorts.n == 60
+    assert np.all(model.cohorts.weight == 400 / 60)
+
+def test_cohorts_close_to_agents(params, run):
+    cohorts = run(params, CohortModel)
+    agents = run(dict(params, kernels=True))
+    assert cohorts.reporters.keys() == agents.reporters.keys()
+    for name in ['list_average_battery_percentage', 'list_total_current_power_demand', 'list_total_VTG_capacity']:
+        assert np.mean(getattr(cohorts, name)) == pytest.approx(np.mean(getattr(agents, name)), rel=0.15)
+    # peaks are less accurate than means, up to 20% for small fleets
+    for name in ['max_power_demand', 'max_VTG_capacity', 'max_mean_charging']:
+        assert cohorts.reporters[name] == pytest.approx(agents.reporters[name], rel=0.2)
+
+def test_cohorts_need_no_agents(params):
+    with pytest.raises(ValueError):
+        CohortModel(dict(params, fanout={'VTG_percentage': [0, 1]})).sim_setup()
+
+def test_calibration():
+    runs = pd.DataFrame({'cohorts_mean_power_demand': [1.0, 2.0, 4.0], 'agents_mean_power_demand': [3.0, 5.0, 9.0]})
+    calibration = calibrate(runs, ['mean_power_demand'])
+    assert calibration['mean_power_demand'] == pytest.approx([1, 2])
+    report = validate(runs, calibration, ['mean_power_demand'])
+    assert report['calibrated_error'][0] == pytest.approx(0)
+    assert report['relative_error'][0] > 0
+    assert apply_calibration({'mean_power_demand': 2.0, 'other': 1.0}, calibration) == \
+        pytest.approx({'mean_power_demand': 5.0, 'other': 1.0})
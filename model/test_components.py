@@ -1,6 +1,7 @@
 import pytest
-from components import EV, Municipality
-from model import EtmEVsModel
+from etm_evs.components import EV, Municipality
+from etm_evs.model import EtmEVsModel
+from etm_evs.data_providers import SyntheticDataProvider
 
 
 # tests for EV model component
@@ -31,6 +32,7 @@ def example_model():
         'h_energy': 0.281,
         'p_smart': 1,
         'seed': 4,
+        'data': SyntheticDataProvider(),
         'p_pref': 0.7,
         'pref_home': 0.9,
         'pref_strictness': 0.9,
@@ -210,6 +212,7 @@ def test_VTG_capacity_under_zero():
         'h_energy': 0.281,
         'p_smart': 1,
         'seed': 4,
+        'data': SyntheticDataProvider(),
         'p_pref': 0.7,
         'pref_home': 0.9,
         'pref_strictness': 0.9,
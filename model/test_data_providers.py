@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pytest
+from etm_evs.data_providers import CachedDataProvider, CSVDataProvider, SyntheticDataProvider, data_provider
+from etm_evs.fleet_cache import cache_key
+from etm_evs.model import EtmEVsModel
+from etm_evs.OD_matrix import generate_OD
+
+
+@pytest.fixture
+def params(make_params):
+    return make_params(6, n_evs=40, steps=200, seed=4, weekend_week_ratio=0)
+
+def test_resolve_parameter(tmp_path):
+    assert isinstance(data_provider(None), CSVDataProvider)
+    assert data_provider(str(tmp_path)).directory == str(tmp_path)
+    synthetic = SyntheticDataProvider()
+    assert data_provider(synthetic) is synthetic
+
+def test_missing_data_directory(tmp_path):
+    with pytest.raises(FileNotFoundError, match='parameter data'):
+        CSVDataProvider(str(tmp_path / 'data')).municipalities()
+
+def test_synthetic_region():
+    data = SyntheticDataProvider(n_municipalities=5, spacing=1000)
+    distances = data.distances()
+    assert len(distances) == 25
+    assert distances.loc[(distances.origin_id == 'GM0001') & (distances.destination_id == 'GM0002'),
+                         'total_cost'].iloc[0] == 1000
+    assert len(data.prices()) == 365 * 96
+    OD = generate_OD(0.000076, 3, data)
+    assert list(OD) == list(data.municipalities()['GM_CODE'])
+    assert np.isclose(OD['GM0001']['p_flow'].sum(), 100)
+
+def test_model_runs_outside_model_directory(params, tmp_path):
+    directory = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        model = EtmEVsModel(params)
+        model.run(display=False)
+    finally:
+        os.chdir(directory)
+    assert len(model.EVs) == 40
+    assert set(model.EVs.home_id) <= set(params['data'].codes)
+
+def test_cached_data_gives_same_run(params, tmp_path):
+    path = str(tmp_path / 'data.npz')
+    CachedDataProvider.build(params['data'], path)
+    fresh = EtmEVsModel(params)
+    fresh.run(display=False)
+    cached = EtmEVsModel(dict(params, data=path))
+    cached.run(display=False)
+    assert list(cached.EVs.work_location_id) == list(fresh.EVs.work_location_id)
+    assert cached.list_total_current_power_demand == fresh.list_total_current_power_demand
+
+def test_fleet_cache_key_depends_on_data(params):
+    key = cache_key(params, 4, params['data'])
+    assert cache_key(params, 4, SyntheticDataProvider(n_municipalities=6)) == key
+    assert cache_key(params, 4, SyntheticDataProvider(n_municipalities=7)) != key
@@ -0,0 +1,74 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from etm_evs.ema_outcomes import ResolvingCallback, SpilledSeries, load_compact, resolve, save_compact, series_names
+from etm_evs.model import EtmEVsModel
+
+
+@pytest.fixture
+def params(make_params):
+    return make_params(n_evs=30, steps=96, seed=4, weekend_week_ratio=0)
+
+class StoringCallback:
+    """stores the outcomes of an experiment like the DefaultCallback of the EMA workbench"""
+
+    def __init__(self):
+        self.results = {}
+
+    def _store_outcomes(self, case_id, outcomes):
+        for name, value in outcomes.items():
+            self.results.setdefault(name, {})[case_id] = np.asarray(value, dtype=np.float32)
+
+class StubSeriesCallback(ResolvingCallback, StoringCallback):
+    """SeriesCallback of ema_problem_definitions.py without the EMA workbench"""
+
+def test_series_names():
+    assert 'power_demand_series' in series_names(True)
+    assert series_names('VTG_capacity_series, municipality_power_demand_series') == \
+        ['VTG_capacity_series', 'municipality_power_demand_series']
+    with pytest.raises(ValueError):
+        series_names('power_demand')
+
+def test_series_reported_as_float32(params):
+    model = EtmEVsModel(dict(params, series_outcomes='power_demand_series,municipality_power_demand_series'))
+    model.run(display=False)
+    demand = model.reporters['power_demand_series']
+    assert demand.dtype == np.float32 and len(demand) == 96
+    assert np.allclose(demand, model.list_total_current_power_demand)
+    municipalities = model.reporters['municipality_power_demand_series']
+    assert municipalities.shape == (96, 4)
+    assert np.allclose(municipalities.sum(axis=1), demand)
+
+def test_spilled_series(params, tmp_path):
+    model = EtmEVsModel(dict(params, series_outcomes=True, series_spill=str(tmp_path)))
+    model.run(display=False)
+    handle = model.reporters['VTG_capacity_series']
+    assert isinstance(handle, SpilledSeries)
+    assert len(pickle.dumps(handle)) < 300
+    values = resolve(np.asarray(pickle.loads(pickle.dumps(handle)), dtype=object))
+    assert np.allclose(values, model.list_total_VTG_capacity)
+    assert not os.path.exists(handle.path)
+
+def test_series_callback_loads_spill_files(params, tmp_path):
+    reference = EtmEVsModel(dict(params, series_outcomes=True))
+    reference.run(display=False)
+    outcomes = EtmEVsModel.as_function()(**dict(params, series_outcomes=True, series_spill=str(tmp_path)))
+    assert isinstance(outcomes['power_demand_series'], SpilledSeries)
+    callback = StubSeriesCallback()
+    # the outcomes of a worker reach the callback through the result pipe
+    callback._store_outcomes(0, pickle.loads(pickle.dumps(outcomes)))
+    for name in series_names(True):
+        assert np.array_equal(callback.results[name][0], reference.reporters[name])
+    assert callback.results['mean_power_demand'][0] == np.float32(reference.reporters['mean_power_demand'])
+    assert os.listdir(tmp_path) == []
+
+def test_compact_results(tmp_path):
+    experiments = pd.DataFrame({'p_smart': [0.1, 0.5], 'policy': ['a', 'b']})
+    outcomes = {'mean_power_demand': np.array([1.0, 2.0]), 'power_demand_series': np.ones((2, 672))}
+    save_compact(str(tmp_path / 'results.npz'), experiments, outcomes)
+    loaded_experiments, loaded_outcomes = load_compact(str(tmp_path / 'results.npz'))
+    assert loaded_experiments.equals(experiments)
+    assert loaded_outcomes['power_demand_series'].dtype == np.float32
+    assert loaded_outcomes['mean_power_demand'].tolist() == [1.0, 2.0]
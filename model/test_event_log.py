@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from etm_evs.event_log import load_profile, municipality_profiles, read_events
+
+
+@pytest.fixture
+def logged_run(make_params, run, tmp_path):
+    model = run(make_params(n_evs=40, steps=200, event_log=str(tmp_path)))
+    return model, str(tmp_path / 'run')
+
+def test_load_profile_is_exact(logged_run):
+    model, path = logged_run
+    profile = load_profile(path, steps=200)
+    assert np.array_equal(profile, model.list_total_current_power_demand)
+    by_municipality = municipality_profiles(path, steps=200)
+    assert np.allclose(by_municipality.sum(axis=1), profile)
+
+def test_events_are_consistent(logged_run):
+    model, path = logged_run
+    fleet = read_events(path, 'fleet')
+    assert fleet['key'].tolist() == list(model.EVs.key)
+    trips = read_events(path, 'trips')
+    assert (trips['arrival'] > trips['departure']).all() and (trips['energy'] > 0).all()
+    sessions = read_events(path, 'sessions').sort_values(['key', 'plug_in'])
+    assert (sessions['plug_out'] > sessions['plug_in']).all()
+    # sessions of one EV do not overlap
+    same = sessions['key'].values[1:] == sessions['key'].values[:-1]
+    assert (sessions['plug_in'].values[1:][same] >= sessions['plug_out'].values[:-1][same]).all()
+    charging = read_events(path, 'charging')
+    assert np.isclose(charging.eval('(end - start) * power').sum(), sum(model.list_total_current_power_demand))
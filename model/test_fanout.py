@@ -0,0 +1,37 @@
+import pytest
+from etm_evs.fanout import OUTCOME_ONLY, detect_outcome_only, fanout_reporters, group_profiles, run_profiles
+from etm_evs.model import EtmEVsModel
+
+
+@pytest.fixture
+def params(make_params):
+    return make_params(n_evs=20, steps=168, tick_minutes=60)
+
+def test_fanout_equals_separate_runs(params):
+    values = [0, 0.15, 0.6]
+    model = EtmEVsModel(dict(params, fanout={'VTG_percentage': values}))
+    model.run(display=False)
+    for value, reporters in zip(values, fanout_reporters(model)):
+        separate = EtmEVsModel(dict(params, VTG_percentage=value))
+        separate.run(display=False)
+        assert reporters['VTG_percentage'] == value
+        assert {name: reporters[name] for name in separate.reporters} == separate.reporters
+
+def test_run_profiles_groups_outcome_only_parameters(params):
+    profiles = [dict(params, VTG_percentage=value, p_smart=p_smart) for p_smart in [0.2, 0.8]
+                for value in [0.5, 0, 1]]
+    assert len(group_profiles(profiles)) == 2
+    results = run_profiles(profiles)
+    assert list(results['VTG_percentage']) == [0.5, 0, 1, 0.5, 0, 1]
+    separate = EtmEVsModel(profiles[4])
+    separate.run(display=False)
+    assert results.loc[4, 'mean_VTG_capacity'] == separate.reporters['mean_VTG_capacity']
+    assert results.loc[4, 'mean_power_demand'] == separate.reporters['mean_power_demand']
+    assert results.loc[1, 'mean_VTG_capacity'] < results.loc[2, 'mean_VTG_capacity']
+
+def test_fanout_only_for_outcome_only_parameters(params):
+    with pytest.raises(ValueError):
+        EtmEVsModel(dict(params, fanout={'p_smart': [0, 1]})).run(display=False)
+
+def test_detected_parameters_are_registered(params):
+    assert detect_outcome_only(params) == list(OUTCOME_ONLY)
@@ -0,0 +1,40 @@
+import pytest
+from etm_evs.fleet import Fleet, Location, ChargePref, SMART, agent_memory
+from etm_evs.model import EtmEVsModel
+
+
+@pytest.fixture
+def example_model(make_params):
+    example_params = make_params(n_evs=20, steps=60, seed=4, weekend_week_ratio=0)
+    example_model = EtmEVsModel(example_params)
+    example_model.run(display=False)
+    return example_model
+
+def test_fleet_codes(example_model):
+    fleet = Fleet.from_model(example_model)
+    for i, ev in enumerate(example_model.EVs):
+        assert Location(fleet.current_location[i]).name.lower() == ev.current_location
+        assert ChargePref(fleet.charge_pref[i]).name.lower() == str(ev.charge_pref).lower()
+        assert fleet.flag(SMART)[i] == ev.smart
+
+def test_fleet_round_trip(example_model):
+    fleet = Fleet.from_model(example_model)
+    before = [dict(ev.__dict__) for ev in example_model.EVs]
+    fleet.to_agents(example_model.EVs)
+    for ev, old in zip(example_model.EVs, before):
+        for key in ['current_battery_volume', 'departure_time', 'arrival_time_home', 'cheapest_timesteps',
+                    'plugged_in', 'stick_to_pref', 'work_location_id', 'battery_level_at_charging_start']:
+            assert getattr(ev, key) == old[key]
+
+def test_fleet_float32_memory(example_model):
+    full = Fleet.from_model(example_model).memory_report()
+    compact = Fleet.from_model(example_model, precision='float32').memory_report()
+    assert compact['battery_volume'] * 2 == full['battery_volume']
+    fleet_bytes = full['total'] - full['municipality_table']
+    assert compact['total'] < full['total']
+    assert fleet_bytes < agent_memory(example_model.EVs)
+
+def test_estimate_memory():
+    report = Fleet.estimate_memory(174000, precision='float32')
+    assert report['flags'] == 174000
+    assert report['total'] == sum(v for k, v in report.items() if k not in ('total', 'per_ev'))
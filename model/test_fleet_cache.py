@@ -0,0 +1,29 @@
+import pytest
+from etm_evs.fleet_cache import FleetCache, cache_key
+from etm_evs.model import EtmEVsModel
+
+
+@pytest.fixture
+def params(make_params):
+    return make_params(n_evs=30, steps=120)
+
+def test_key_only_depends_on_init_parameters(params):
+    data = params['data']
+    key = cache_key(params, 421, data)
+    assert cache_key(dict(params, p_smart=0.1, VTG_percentage=0.9, steps=10), 421, data) == key
+    assert cache_key(dict(params, l_vol=20), 421, data) != key
+    assert cache_key(params, 422, data) != key
+
+def test_cached_fleet_gives_same_run(params, tmp_path):
+    root = str(tmp_path)
+    EtmEVsModel(dict(params, fleet_cache=root)).run(display=False)
+    assert FleetCache(root, params, 421, params['data']).exists()
+    scenario = dict(params, p_smart=0.9, pref_home=0.2, VTG_percentage=0.4)
+    cached = EtmEVsModel(dict(scenario, fleet_cache=root))
+    cached.run(display=False)
+    fresh = EtmEVsModel(scenario)
+    fresh.run(display=False)
+    for attribute in ['key', 'work_location_id', 'commute_distance', 'battery_volume', 'smart', 'charge_pref',
+                      'allowed_VTG_percentage']:
+        assert list(getattr(cached.EVs, attribute)) == list(getattr(fresh.EVs, attribute))
+    assert cached.list_total_current_power_demand == fresh.list_total_current_power_demand
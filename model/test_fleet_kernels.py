@@ -0,0 +1,49 @@
+import pytest
+from etm_evs.fanout import fanout_reporters
+from etm_evs.fleet_kernels import ChunkTuner, MIN_CHUNK, threads_per_worker
+
+
+@pytest.fixture
+def params(make_params):
+    return make_params(n_evs=60, steps=200, tick_minutes=60, p_smart=0.5, weekend_week_ratio=0.5, seed=3)
+
+@pytest.mark.parametrize('threads, chunk_size', [(1, 'auto'), (3, 7)])
+def test_kernels_equal_agent_step(params, run, threads, chunk_size):
+    agents = run(params)
+    kernels = run(dict(params, kernels=True, threads=threads, chunk_size=chunk_size))
+    for name in ['list_average_battery_percentage', 'list_total_current_power_demand', 'list_total_VTG_capacity',
+                 'list_mean_charging']:
+        assert getattr(kernels, name) == getattr(agents, name)
+    assert kernels.reporters == agents.reporters
+    municipalities = agents.output.variables['Municipality']
+    assert kernels.output.variables['Municipality'].fillna(-1).equals(municipalities.fillna(-1))
+    # the agents are updated at the end of the run
+    for name in ['current_battery_volume', 'current_location', 'departure_time', 'offset_dep', 'plugged_in',
+                 'stick_to_pref', 'cheapest_timesteps', 'time_charging_must_finish', 'VTG_bound']:
+        assert list(getattr(kernels.EVs, name)) == list(getattr(agents.EVs, name))
+    for mun, other in zip(kernels.municipalities, agents.municipalities):
+        assert [ev.id for ev in mun.current_EVs] == [ev.id for ev in other.current_EVs]
+
+def test_kernels_with_fanout(params, run):
+    fanout = {'VTG_percentage': [0, 0.5]}
+    agents = fanout_reporters(run(dict(params, fanout=fanout)))
+    assert fanout_reporters(run(dict(params, fanout=fanout, kernels=True))) == agents
+
+def test_kernels_need_the_agent_step_for_the_event_log(params, run, tmp_path):
+    with pytest.raises(ValueError):
+        run(dict(params, kernels=True, event_log=str(tmp_path)))
+    with pytest.raises(ValueError):
+        run(dict(params, kernels=True, threads=0))
+
+def test_chunk_tuner_keeps_the_fastest_candidate():
+    tuner = ChunkTuner(100000, 2, trials=2)
+    assert tuner.candidates == [50000, 25000, 12500, 6250, 3125]
+    while tuner.size is None:
+        size = tuner.chunk_size()
+        tuner.record(size, 1.0 if size != 12500 else 0.5)
+    assert tuner.chunk_size() == 12500
+    assert ChunkTuner(MIN_CHUNK, 4).chunk_size() == MIN_CHUNK
+
+def test_threads_per_worker():
+    assert threads_per_worker(-1) == 1
+    assert threads_per_worker(1) >= 1
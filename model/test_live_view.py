@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from etm_evs.live_view import RingBuffer, decimate, LiveView, animate
+from etm_evs.model import EtmEVsModel
+
+
+def test_ring_buffer_keeps_latest():
+    buffer = RingBuffer(5)
+    for i in range(3):
+        buffer.append(i)
+    assert buffer.values().tolist() == [0, 1, 2]
+    buffer.extend(np.arange(3, 12))
+    assert buffer.values().tolist() == [7, 8, 9, 10, 11]
+    assert len(buffer) == 5
+
+def test_decimate_keeps_extremes():
+    x = np.arange(10000)
+    y = np.sin(x / 100.0)
+    y[5003] = 10
+    dx, dy = decimate(x, y, 200)
+    assert len(dx) <= 200
+    assert dy.max() == 10 and dy.min() == y.min()
+    assert np.all(np.diff(dx) >= 0)
+
+def test_live_model_and_tail(make_params, tmp_path):
+    fig, axs = plt.subplots(3)
+    model = EtmEVsModel(make_params(n_evs=20, steps=30))
+    view = LiveView(axs, capacity=16, heat_variable='current_vtg_capacity')
+    animation = animate(model, fig, axs, view=view)
+    for _ in animation.new_frame_seq():
+        animation._draw_frame(model.t)
+    assert view.ticks.values().tolist() == list(range(15, 31))
+    assert view.heat.values().shape == (16, len(model.municipalities))
+    assert len(view.lines[0].get_xdata()) == 16
+
+    # the same view fed by a result file that grows
+    path = str(tmp_path / 'variables.csv')
+    df = pd.DataFrame({'t': range(20), 'total_VTG_capacity': np.arange(20.0),
+                       'total_current_power_demand': np.arange(20.0) * 2})
+    other = LiveView(plt.subplots(2)[1], capacity=16)
+    with open(path, 'w') as file:
+        file.write(df[:8].to_csv(index=False) + '8,8.')
+    other.tail(path)
+    assert other.ticks.values().tolist() == list(range(8))
+    with open(path, 'a') as file:
+        file.write('0,16.0\n' + df[9:].to_csv(index=False, header=False))
+    other.tail(path)
+    other.draw()
+    assert other.ticks.values().tolist() == list(range(4, 20))
+    assert other.buffer.values()[:, 1].tolist() == list(np.arange(4, 20) * 2.0)
@@ -1,5 +1,7 @@
 import pytest
-from model import EtmEVsModel
+import numpy as np
+from etm_evs.model import EtmEVsModel
+from etm_evs.data_providers import SyntheticDataProvider
 
 
 @pytest.fixture
@@ -29,6 +31,7 @@ def example_params():
         'h_energy': 0.281,
         'p_smart': 1,
         'seed': 4,
+        'data': SyntheticDataProvider(),
         'p_pref': 0.7,
         'pref_home': 0.9,
         'pref_strictness': 0.9,
@@ -80,4 +83,32 @@ def test_weekend_false(example_params):
     example_params['steps'] = 673
     example_model = EtmEVsModel(example_params)
     example_model.run() 
-    assert example_model.weekend == False
\ No newline at end of file
+    assert example_model.weekend == False
+
+def test_weekend_hourly_ticks(example_params):
+    example_params['tick_minutes'] = 60
+    example_params['steps'] = 121
+    example_model = EtmEVsModel(example_params)
+    example_model.run()
+    assert example_model.ticks_per_day == 24
+    assert example_model.weekend == True
+
+def test_tick_length_keeps_energy_and_demand(make_params):
+    days = 4
+    models = {}
+    for tick_minutes in [15, 60]:
+        models[tick_minutes] = EtmEVsModel(make_params(n_evs=200, seed=4, tick_minutes=tick_minutes,
+                                                       steps=days * 1440 // tick_minutes))
+        models[tick_minutes].run(display=False)
+    daily_energy = {}
+    for tick_minutes, model in models.items():
+        demand = np.asarray(model.list_total_current_power_demand).reshape(days, model.ticks_per_day)
+        daily_energy[tick_minutes] = demand.sum(axis=1) * model.tick_scale
+    assert np.allclose(daily_energy[60], daily_energy[15], rtol=0.05)
+    assert models[60].reporters['mean_power_demand'] == \
+        pytest.approx(models[15].reporters['mean_power_demand'], rel=0.05)
+
+def test_invalid_tick_minutes(example_params):
+    example_params['tick_minutes'] = 25
+    with pytest.raises(ValueError):
+        EtmEVsModel(example_params).run()
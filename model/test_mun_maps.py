@@ -0,0 +1,41 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+from etm_evs.mun_maps import GeometryCache, render_small_multiples
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """three square municipalities, one with a hole and one made of two parts"""
+    def square(x, y, size=1):
+        return [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+    geometries = [
+        {'type': 'Polygon', 'coordinates': [square(2, 0)]},
+        {'type': 'Polygon', 'coordinates': [square(0, 0), square(0.25, 0.25, 0.5)]},
+        {'type': 'MultiPolygon', 'coordinates': [[square(4, 0)], [square(6, 0)]]},
+    ]
+    cache = GeometryCache.from_geometries(['GM0034', 'GM0014', 'GM0037'], geometries)
+    path = str(tmp_path / 'geometries.npz')
+    cache.save(path)
+    return GeometryCache.load(path)
+
+def test_cache_is_sorted_by_code(cache):
+    assert cache.codes.tolist() == ['GM0014', 'GM0034', 'GM0037']
+    assert cache.index(['GM0037', 'GM9999', 'GM0014']).tolist() == [2, -1, 0]
+    assert len(cache.paths()) == 3
+
+def test_align_and_matrix(cache):
+    assert np.allclose(cache.align(['GM0037', 'GM0014'], [3.0, 1.0]), [1.0, np.nan, 3.0], equal_nan=True)
+    df = pd.DataFrame({'sample_id': [0, 0, 1, 1, 1], 'obj_id': ['GM0014', 'GM0034', 'GM0014', 'GM0034', 'GM0037'],
+                       'current_vtg_capacity': [1.0, 2.0, 3.0, 4.0, 5.0]})
+    rows, matrix = cache.aggregate_matrix(df, 'current_vtg_capacity')
+    assert rows.tolist() == [0, 1]
+    assert np.allclose(matrix, [[1, 2, np.nan], [3, 4, 5]], equal_nan=True)
+
+def test_render_pages(cache, tmp_path):
+    matrix = np.arange(15, dtype=float).reshape(5, 3)
+    pages = render_small_multiples(cache, matrix, ['scenario {}'.format(i) for i in range(5)],
+                                   str(tmp_path / 'maps.png'), ncols=2, per_page=4)
+    assert len(pages) == 2
+    assert all(os.path.getsize(page) > 0 for page in pages)
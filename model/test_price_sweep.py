@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from etm_evs.data_providers import read_prices
+from etm_evs.price_sweep import price_sweep, run_subfleet, subfleet_mask
+
+
+@pytest.fixture
+def prices():
+    random = np.random.default_rng(0)
+    return [np.linspace(0.3, 0.01, 8760 * 4), random.uniform(0.01, 0.3, 8760 * 4)]
+
+def test_subfleet_mask():
+    smart = [True, False, True]
+    assert subfleet_mask(None, smart).tolist() == [True, True, True]
+    assert subfleet_mask('smart', smart).tolist() == smart
+    assert subfleet_mask('non_smart', smart).tolist() == [False, True, False]
+    with pytest.raises(ValueError):
+        subfleet_mask('electric', smart)
+
+def test_read_prices(tmp_path):
+    values = [0.1, 0.2, 0.3]
+    pd.DataFrame({'Electricity_price': values}).to_csv(tmp_path / 'prices.csv')
+    np.save(tmp_path / 'prices.npy', values)
+    assert read_prices(str(tmp_path / 'prices.csv')).tolist() == values
+    assert read_prices(str(tmp_path / 'prices.npy')).tolist() == values
+    assert read_prices(values).tolist() == values
+
+def test_non_smart_evs_ignore_prices(params, prices):
+    n, first = run_subfleet(params, 'non_smart', prices[0])
+    assert run_subfleet(params, 'non_smart', prices[1]) == (n, first)
+    smart, _ = run_subfleet(params, 'smart', prices[0])
+    assert n + smart == 200
+    assert run_subfleet(params, 'smart', prices[0])[1] != run_subfleet(params, 'smart', prices[1])[1]
+
+def test_sweep_matches_full_runs(params, prices, run):
+    sweep = price_sweep(dict(params, warmup=24), prices)
+    assert len(sweep) == 2
+    for row, series in zip(sweep.to_dict('records'), prices):
+        model = run(dict(params, prices=series, warmup=24))
+        for name, value in model.reporters.items():
+            if name != 'seed':
+                assert row[name] == pytest.approx(value), name
+    with pytest.raises(ValueError):
+        price_sweep(dict(params, event_log='events'), prices)
+    with pytest.raises(ValueError):
+        price_sweep(dict(params, region='GM0001'), prices)
@@ -0,0 +1,62 @@
+import pytest
+from etm_evs.fanout import fanout_reporters
+from etm_evs.fleet_cache import cache_key
+from etm_evs.model import EtmEVsModel
+from etm_evs.region import BOUNDARY_CODE, consistency_report, region_codes
+
+
+@pytest.fixture
+def params(make_params):
+    return make_params(9, n_evs=300, steps=48)
+
+def test_region_codes(params, tmp_path):
+    municipalities = params['data'].municipalities()
+    assert region_codes('GM0005, Municipality 1', municipalities) == ['GM0001', 'GM0005']
+    path = tmp_path / 'province.csv'
+    path.write_text('GM_CODE\nGM0003\nGM0002\n')
+    assert region_codes(str(path), municipalities) == ['GM0002', 'GM0003']
+    with pytest.raises(ValueError):
+        region_codes(['GM0001', 'Atlantis'], municipalities)
+
+def test_region_builds_only_its_municipalities(params):
+    model = EtmEVsModel(dict(params, region=['GM0001', 'GM0005']))
+    model.sim_setup()
+    assert list(model.municipalities.id) == ['GM0001', 'GM0005', BOUNDARY_CODE]
+    assert model.number_evs == len(model.EVs) < params['n_evs']
+    for ev in model.EVs:
+        assert ev.home_id in ('GM0001', 'GM0005') or ev.work_location_id in ('GM0001', 'GM0005')
+        assert ev.home_id != BOUNDARY_CODE or ev.work_location_id != BOUNDARY_CODE
+
+def test_region_is_consistent_with_national_run(params):
+    report = consistency_report(params, ['GM0001', 'GM0005'])
+    assert report['national_evs'] == 300 and report['region_evs'] < 300
+    assert report['inbound_evs'] > 0 and report['outbound_evs'] > 0
+    assert report['missing_evs'] == 0 and report['different_evs'] == 0
+    # the same EVs, only summed in another order
+    assert report['max_power_demand_difference'] < 1e-9
+    # the model totals are those of the municipalities of the region, without the boundary municipality
+    assert report['total_power_demand_difference'] < 1e-9
+    assert report['total_VTG_capacity_difference'] < 1e-9
+
+def test_region_totals_with_kernels_and_fanout(params, run):
+    region = dict(params, region=['GM0001', 'GM0005'], steps=96, fanout={'VTG_percentage': [params['VTG_percentage']]})
+    agents = run(region)
+    kernels = run(dict(region, kernels=True))
+    assert kernels.list_total_current_power_demand == agents.list_total_current_power_demand
+    assert kernels.reporters == agents.reporters
+    assert fanout_reporters(agents) == fanout_reporters(kernels)
+    assert fanout_reporters(agents)[0]['mean_VTG_capacity'] == pytest.approx(agents.reporters['mean_VTG_capacity'])
+    # the EVs in the boundary municipality or on the road are not part of the totals
+    assert agents.total_current_power_demand <= sum(agents.EVs.current_power_demand)
+    assert len(agents.list_total_VTG_capacity) == 96
+
+def test_region_in_fleet_cache_key(params, tmp_path):
+    assert cache_key(params, 421, params['data'], ['GM0001']) != cache_key(params, 421, params['data'])
+    region = dict(params, region=['GM0002', 'GM0003'])
+    fresh = EtmEVsModel(region)
+    fresh.run(display=False)
+    EtmEVsModel(dict(region, fleet_cache=str(tmp_path))).run(display=False)
+    cached = EtmEVsModel(dict(region, fleet_cache=str(tmp_path)))
+    cached.run(display=False)
+    assert list(cached.EVs.key) == list(fresh.EVs.key)
+    assert cached.list_total_current_power_demand == fresh.list_total_current_power_demand
@@ -0,0 +1,50 @@
+import logging
+import pandas as pd
+import pytest
+from etm_evs.model import EtmEVsModel
+from etm_evs.replay import parse_keys, replay
+
+
+def traced_run(run, params, n=3):
+    """trace of n EVs (a smart one among them) in a run of the whole fleet"""
+    model = EtmEVsModel(params)
+    model.setup()
+    smart = [ev.key for ev in model.EVs if ev.smart]
+    keys = [smart[0]] + [ev.key for ev in model.EVs if ev.key != smart[0]][:n - 1]
+    return keys, run(dict(params, trace=keys)).trace.table()
+
+def test_parse_keys():
+    assert parse_keys(1000003).tolist() == [1000003]
+    assert parse_keys([1000003, 1000004]).tolist() == [1000003, 1000004]
+    assert parse_keys('1000003, 1000004').tolist() == [1000003, 1000004]
+
+@pytest.mark.parametrize('kernels', [False, True])
+def test_replay_follows_full_run(params, run, kernels):
+    params = dict(params, kernels=kernels)
+    keys, full = traced_run(run, params)
+    assert len(full) == 3 * 97 and full['location'].nunique() > 1
+    replayed = replay(params, keys)
+    pd.testing.assert_frame_equal(replayed, full)
+
+def test_replay_keeps_only_its_evs(params, run):
+    keys, _ = traced_run(run, params, 2)
+    model = run(dict(params, replay=keys))
+    assert sorted(model.EVs.key) == sorted(keys)
+    assert model.number_evs == 2 and sum(model.municipalities.number_EVs) == 2
+
+def test_unknown_keys(params, run):
+    with pytest.raises(ValueError, match='not in the fleet'):
+        run(dict(params, replay=[1]))
+    with pytest.raises(ValueError, match='not in the fleet'):
+        run(dict(params, trace=[1]))
+
+def test_log_level_is_restored(params, run):
+    root = logging.getLogger()
+    level = root.level
+    run(dict(params, n_evs=20, steps=4, log_level='DEBUG'))
+    assert root.level == level
+    replay(dict(params, steps=4), [run(dict(params, steps=0)).EVs[0].key], log_level='DEBUG')
+    assert root.level == level
+    with pytest.raises(ValueError, match='not in the fleet'):
+        replay(dict(params, steps=4), [1], log_level='DEBUG')
+    assert root.level == level
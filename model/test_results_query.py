@@ -0,0 +1,65 @@
+import pytest
+import numpy as np
+import pandas as pd
+from etm_evs.results_query import ResultsDataset
+
+
+@pytest.fixture
+def experiments(tmp_path):
+    """two small experiment directories in the agentpy output layout"""
+    paths = []
+    for e in range(2):
+        path = tmp_path / 'experiment{}'.format(e + 1)
+        path.mkdir()
+        rows = [(s, i, t, float(s + t), float(t % 7)) for s in range(3) for i in range(2) for t in range(20)]
+        pd.DataFrame(rows, columns=['sample_id', 'iteration', 't', 'total_VTG_capacity', 'mean_charging']) \
+            .to_csv(path / 'variables_EtmEVsModel.csv', index=False)
+        pd.DataFrame({'sample_id': range(3), 'p_smart': [0.0, 0.5, 1.0]}) \
+            .to_csv(path / 'parameters_sample.csv', index=False)
+        paths.append(str(path))
+    return paths
+
+def dataset(paths):
+    data = ResultsDataset()
+    for offset, path in zip([1000, 2000], paths):
+        data.register(path, sample_offset=offset)
+    return data
+
+def test_trim_and_join(experiments):
+    df = dataset(experiments).scan().trim_warmup(5).join_parameters().collect()
+    assert df['t'].min() == 0 and df['t'].max() == 14
+    assert sorted(df['sample_id'].unique()) == [1000, 1001, 1002, 2000, 2001, 2002]
+    assert (df.loc[df['sample_id'] == 2002, 'p_smart'] == 1.0).all()
+
+def test_parameter_filter_pushdown(experiments):
+    df = dataset(experiments).scan().filter('p_smart', '==', 0.5).collect()
+    assert sorted(df['sample_id'].unique()) == [1001, 2001]
+    assert 'p_smart' not in df
+
+def test_groupby_matches_pandas(experiments):
+    query = dataset(experiments).scan().trim_warmup(5).filter('iteration', '==', 0)
+    query.chunksize = 7  # force many partial aggregates
+    streamed = query.groupby('sample_id').mean().collect()
+    full = query.collect().groupby('sample_id').mean()
+    pd.testing.assert_frame_equal(streamed[full.columns], full, check_dtype=False)
+    extremes = query.groupby('sample_id').agg({'total_VTG_capacity': 'max', 'mean_charging': 'min'}).collect()
+    assert np.allclose(extremes['total_VTG_capacity'], full['total_VTG_capacity'] - 12 + 19)
+
+def test_to_csv_streams(experiments, tmp_path):
+    out = tmp_path / 'out.csv'
+    dataset(experiments).scan().select('total_VTG_capacity').to_csv(out)
+    df = pd.read_csv(out)
+    assert len(df) == 2 * 3 * 2 * 20
+    assert 'mean_charging' not in df
+
+def test_trim_reported_warmup(experiments):
+    # experiment1 reports a warm-up per run, experiment2 does not and falls back to the default
+    rows = [(s, i, 2 + s, 10 if s == 1 else np.nan) for s in range(3) for i in range(2)]
+    pd.DataFrame(rows, columns=['sample_id', 'iteration', 'warmup_length', 'warmup_horizon']) \
+        .to_csv(experiments[0] + '/reporters.csv', index=False)
+    df = dataset(experiments).scan().trim_warmup('auto', default=5).collect()
+    first = df.groupby('sample_id')['total_VTG_capacity'].min()
+    # total_VTG_capacity is sample + t (before the offset), so its minimum is sample + warm-up
+    assert list(first) == [0 + 2, 1 + 3, 2 + 4, 0 + 5, 1 + 5, 2 + 5]
+    assert df.groupby('sample_id')['t'].agg(['min', 'max']).values.tolist() == \
+        [[0, 17], [0, 9], [0, 15], [0, 14], [0, 14], [0, 14]]
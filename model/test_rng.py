@@ -0,0 +1,114 @@
+import random
+import pytest
+import numpy as np
+from etm_evs.rng import CounterStreams, Purpose, philox, philox_array, triangular, fold_seed, replicate_seed
+from agentpy.tools import AttrDict
+from etm_evs.components import draw_ev_attributes
+from etm_evs.model import EtmEVsModel
+
+
+@pytest.fixture
+def example_params(make_params):
+    return make_params(n_evs=20, steps=1, seed=4)
+
+# known answers of Philox4x32-10 from the Random123 distribution
+@pytest.mark.parametrize('counter, key, expected', [
+    ((0, 0, 0, 0), (0, 0), (0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8)),
+    ((0xffffffff,) * 4, (0xffffffff,) * 2, (0x408f276d, 0x41c83b0e, 0xa20bc7c6, 0x6d5451fd)),
+    ((0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344), (0xa4093822, 0x299f31d0),
+     (0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1)),
+])
+def test_philox_known_answers(counter, key, expected):
+    assert philox(*counter, *key) == expected
+    assert tuple(int(w) for w in philox_array(*counter, *key)) == expected
+
+def test_scalar_equals_vectorized():
+    streams = CounterStreams(421)
+    keys = np.arange(1000) * 7919
+    vector = streams.triangular(keys, 12, Purpose.BATTERY, 16.7, 59.6, 107.8)
+    scalar = [streams.triangular(int(k), 12, Purpose.BATTERY, 16.7, 59.6, 107.8) for k in keys]
+    assert vector.tolist() == scalar
+
+def test_draws_independent_of_order():
+    streams = CounterStreams(2 ** 100 + 5)
+    keys = np.arange(500)
+    shuffled = np.random.default_rng(1).permutation(keys)
+    forward = streams.random(keys, 3, Purpose.WEEKEND)
+    backward = streams.random(shuffled, 3, Purpose.WEEKEND)
+    assert np.array_equal(forward[shuffled], backward)
+    assert 0 <= forward.min() and forward.max() < 1
+
+def test_triangular_matches_random_module():
+    # random.triangular with a fixed uniform value gives the inverse transform
+    for u in [0.01, 0.3, 0.5, 0.77, 0.99]:
+        r = random.Random()
+        r.random = lambda: u
+        for low, high, mode in [(30, 34.5, 66), (16.7, 59.6, 107.8), (5.0, 6.0, 107.8)]:
+            assert float(triangular(u, low, high, mode)) == r.triangular(low, high, mode)
+
+def test_fold_seed():
+    assert fold_seed(421) == 421
+    assert fold_seed(86578097163493939736796028679458741811) < 2 ** 64
+
+def test_ev_draws_independent_of_fleet(example_params):
+    small = EtmEVsModel(dict(example_params, n_evs=20))
+    small.sim_setup()
+    large = EtmEVsModel(dict(example_params, n_evs=60))
+    large.sim_setup()
+    large_evs = {ev.key: ev for ev in large.EVs}
+    shared = [ev for ev in small.EVs if ev.key in large_evs]
+    assert shared
+    for ev in shared:
+        other = large_evs[ev.key]
+        for attribute in ['work_location_id', 'battery_volume', 'energy_rate', 'charging_speed',
+                          'departure_time', 'dwell_time', 'smart', 'charge_pref']:
+            assert getattr(ev, attribute) == getattr(other, attribute)
+
+def test_same_seed_same_run(example_params):
+    first = EtmEVsModel(dict(example_params, n_evs=20, steps=100))
+    first.run(display=False)
+    second = EtmEVsModel(dict(example_params, n_evs=20, steps=100))
+    second.run(display=False)
+    assert first.list_total_current_power_demand == second.list_total_current_power_demand
+
+
+def test_stratified_one_value_per_stratum():
+    streams = CounterStreams(421)
+    keys = np.arange(200) * 7919
+    u = streams.stratified(keys, 0, Purpose.BATTERY)
+    assert sorted(np.floor(u * 200).astype(int)) == list(range(200))
+    # the strata of different purposes are ordered independently
+    v = streams.stratified(keys, 0, Purpose.ENERGY_RATE)
+    assert abs(np.corrcoef(u, v)[0, 1]) < 0.2
+
+def test_replicate_seed():
+    assert replicate_seed(421, 0) == replicate_seed(421, 0)
+    assert len({replicate_seed(421, r) for r in range(100)}) == 100
+    assert replicate_seed(421, 0) != replicate_seed(422, 0)
+
+def test_common_random_numbers(example_params):
+    params = dict(example_params, crn=True, n_evs=20)
+    fleets = {}
+    for p_smart, replicate in [(0, 0), (1, 0), (0, 1)]:
+        model = EtmEVsModel(dict(params, p_smart=p_smart, replicate=replicate))
+        model.sim_setup()
+        fleets[p_smart, replicate] = list(model.EVs.battery_volume), list(model.EVs.departure_time)
+    assert fleets[0, 0] == fleets[1, 0]
+    assert fleets[0, 0] != fleets[0, 1]
+    # the iteration of an experiment is the replicate
+    model = EtmEVsModel(dict(params, p_smart=1), _run_id=(3, 1))
+    model.sim_setup()
+    assert list(model.EVs.battery_volume) == fleets[0, 1][0]
+
+def test_lhs_fleet(example_params):
+    p = AttrDict(example_params, fleet_sampling='lhs')
+    streams = CounterStreams(p.seed)
+    keys = np.arange(40) * 7919
+    fleet = draw_ev_attributes(streams, p, keys)
+    u = streams.stratified(keys, 0, Purpose.BATTERY)
+    assert fleet['battery_volume'].tolist() == triangular(u, p.l_vol, p.m_vol, p.h_vol).tolist()
+    # not stratified
+    assert fleet['charging_speed'].tolist() == draw_ev_attributes(streams, AttrDict(example_params), keys)[
+        'charging_speed'].tolist()
+    with pytest.raises(ValueError):
+        EtmEVsModel(dict(example_params, fleet_sampling='sobol')).sim_setup()
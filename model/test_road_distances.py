@@ -0,0 +1,74 @@
+import json
+import pytest
+import numpy as np
+import pandas as pd
+from etm_evs.data_providers import CachedDataProvider, SyntheticDataProvider
+from etm_evs.road_distances import read_lines, read_centroids, build_graph, od_distances, write_od, shortest_distances
+
+
+@pytest.fixture
+def road_files(tmp_path):
+    """a 2 by 1 km road loop with a detour, a detached road and three centroids"""
+    lines = [
+        [[0, 0], [1000, 0], [2000, 0]],
+        [[2000, 0], [2000, 1000]],
+        [[0, 0], [0, 1000], [2000.4, 1000]],  # ends within the snap tolerance of (2000, 1000)
+        {'type': 'MultiLineString', 'coordinates': [[[5000, 5000], [6000, 5000]]]},
+    ]
+    features = [{'type': 'Feature', 'properties': {},
+                 'geometry': line if isinstance(line, dict) else {'type': 'LineString', 'coordinates': line}}
+                for line in lines]
+    roads = tmp_path / 'roads.geojson'
+    roads.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+    points = {'GM0001': [0, -10], 'GM0002': [2000, 1000], 'GM0003': [5900, 5000]}
+    features = [{'type': 'Feature', 'properties': {'GM_CODE': code}, 'geometry': {'type': 'Point', 'coordinates': xy}}
+                for code, xy in points.items()]
+    centroids = tmp_path / 'centroids.geojson'
+    centroids.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+    return str(roads), str(centroids)
+
+def test_graph_merges_touching_lines(road_files):
+    graph, node_xy = build_graph(read_lines(road_files[0]), tolerance=1.0)
+    assert len(node_xy) == 7
+    assert graph.nnz == 6
+
+def test_od_distances(road_files):
+    codes, points = read_centroids(road_files[1])
+    distances = od_distances(read_lines(road_files[0]), points, n_jobs=1)
+    # shortest route to GM0002 is along the x axis, plus 10 m to the road
+    assert distances[0, 1] == pytest.approx(3010, abs=1)
+    assert distances[1, 0] == distances[0, 1]
+    # the centroid near the detached road is snapped to the main network
+    assert np.isfinite(distances).all()
+    assert np.diag(distances).tolist() == [0, 0, 0]
+
+def test_parallel_equals_serial(road_files):
+    graph, node_xy = build_graph(read_lines(road_files[0]))
+    nodes = np.arange(len(node_xy))
+    serial = shortest_distances(graph, nodes, n_jobs=1, chunk_size=2)
+    parallel = shortest_distances(graph, nodes, n_jobs=2, chunk_size=2)
+    assert np.array_equal(serial, parallel)
+
+def test_write_afstand_csv(road_files, tmp_path):
+    codes, points = read_centroids(road_files[1])
+    distances = od_distances(read_lines(road_files[0]), points, n_jobs=1)
+    path = str(tmp_path / 'afstand.csv')
+    write_od(path, codes, distances)
+    OD = pd.read_csv(path, sep=';')
+    assert list(OD.columns) == ['origin_id', 'destination_id', 'total_cost']
+    assert len(OD) == 9
+    assert OD.loc[(OD.origin_id == 'GM0001') & (OD.destination_id == 'GM0002'), 'total_cost'].iloc[0] \
+        == pytest.approx(distances[0, 1])
+
+def test_write_model_data_npz(road_files, tmp_path):
+    codes, points = read_centroids(road_files[1])
+    distances = od_distances(read_lines(road_files[0]), points, n_jobs=1)
+    path = str(tmp_path / 'model_data.npz')
+    write_od(path, codes, distances, SyntheticDataProvider(n_municipalities=3))
+    provider = CachedDataProvider(path)
+    assert provider.codes.tolist() == list(codes)
+    assert np.array_equal(provider.distance, distances)
+    assert provider.municipalities()['GM_NAAM'].tolist() == ['Municipality 1', 'Municipality 2', 'Municipality 3']
+    assert len(provider.prices()) == 365 * 96
+    with pytest.raises(ValueError):
+        write_od(path, codes, distances, SyntheticDataProvider(n_municipalities=2))
@@ -0,0 +1,42 @@
+import logging
+import numpy as np
+from etm_evs.sobol_stream import StreamingSobol
+
+NAMES = ['x1', 'x2', 'x3']
+BOUNDS = [(-np.pi, np.pi)] * 3
+
+
+def ishigami(design):
+    x1, x2, x3 = design['x1'].values, design['x2'].values, design['x3'].values
+    return {'y': np.sin(x1) + 7 * np.sin(x2) ** 2 + 0.1 * x3 ** 4 * np.sin(x1)}
+
+def test_ishigami_converges_early():
+    sobol = StreamingSobol(NAMES, BOUNDS, ['y'], seed=7)
+    si = sobol.run(ishigami, threshold=0.1, batch_size=128, max_base=8192)['y']
+    assert sobol.n_base < 8192
+    assert (si[['S1_conf', 'ST_conf']].values < 0.1).all()
+    # analytic indices of the Ishigami function
+    assert np.allclose(si['S1'], [0.314, 0.442, 0.0], atol=0.1)
+    assert np.allclose(si['ST'], [0.558, 0.442, 0.244], atol=0.1)
+
+def test_resume_gives_same_samples(tmp_path, caplog):
+    path = str(tmp_path / 'state.npz')
+    interrupted = StreamingSobol(NAMES, BOUNDS, ['y'], seed=3, path=path)
+    with caplog.at_level(logging.INFO, logger='EMA.sobol_stream'):
+        interrupted.run(ishigami, batch_size=32, min_base=96, max_base=64)
+    assert [record.getMessage()[:27] for record in caplog.records] == ['32 base samples (160 runs),',
+                                                                       '64 base samples (320 runs),']
+    resumed = StreamingSobol(NAMES, BOUNDS, ['y'], seed=3, path=path)
+    assert resumed.n_base == 64
+    resumed.run(ishigami, batch_size=32, min_base=96, max_base=128)
+    uninterrupted = StreamingSobol(NAMES, BOUNDS, ['y'], seed=3)
+    uninterrupted.run(ishigami, batch_size=32, min_base=96, max_base=128)
+    assert np.array_equal(resumed.Y, uninterrupted.Y)
+
+def test_design_layout():
+    sobol = StreamingSobol(['a', 'b'], [(0, 1), (2, 5)], ['y'], integer=['b'], seed=1)
+    design = sobol.design(4).values.reshape(4, 4, 2)
+    A, B = design[:, 0], design[:, -1]
+    assert np.array_equal(design[:, 1], np.column_stack([B[:, 0], A[:, 1]]))
+    assert np.array_equal(design[:, 2], np.column_stack([A[:, 0], B[:, 1]]))
+    assert set(design[:, :, 1].ravel()) <= {2, 3, 4, 5}
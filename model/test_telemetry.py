@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from etm_evs.event_log import read_events
+from etm_evs.telemetry import COUNTERS, PHASES, Telemetry, phase_summary, read_telemetry
+
+
+def test_telemetry_of_a_run(params, tmp_path, run):
+    model = run(dict(params, telemetry=str(tmp_path / 'telemetry'), telemetry_flush=10,
+                     event_log=str(tmp_path / 'events')))
+    telemetry = read_telemetry(str(tmp_path / 'telemetry' / 'run.csv'))
+    assert telemetry['t'].tolist() == list(range(97))
+    assert np.all(telemetry[PHASES] >= 0)
+    assert np.all(telemetry['evs'] == 200)
+    assert np.all(telemetry['rss_mb'] > 0)
+    # every closed trip is an arrival
+    assert telemetry['arrivals'].sum() == len(read_events(str(tmp_path / 'events' / 'run'), 'trips'))
+    assert telemetry['departures'].sum() >= telemetry['arrivals'].sum() > 0
+    assert 0 < telemetry['schedules'].sum() <= telemetry['arrivals'].sum()
+    assert phase_summary(telemetry)['share'].sum() == pytest.approx(1)
+    assert model.list_total_current_power_demand == run(params).list_total_current_power_demand
+
+def test_kernels_count_the_same_events(params, tmp_path, run):
+    run(dict(params, telemetry=str(tmp_path / 'agents')))
+    run(dict(params, telemetry=str(tmp_path / 'kernels'), kernels=True, threads=2, chunk_size=64))
+    agents = read_telemetry(str(tmp_path / 'agents' / 'run.csv'))
+    kernels = read_telemetry(str(tmp_path / 'kernels' / 'run.csv'))
+    assert kernels[COUNTERS].equals(agents[COUNTERS])
+
+def test_buffer_is_flushed(tmp_path):
+    telemetry = Telemetry(str(tmp_path / 'run.csv'), flush_ticks=4)
+    for t in range(10):
+        telemetry.start()
+        telemetry.lap('ev_step')
+        telemetry.count(departures=2)
+        telemetry.end_tick(t, 5)
+    assert telemetry.rows == 2
+    telemetry.close()
+    written = read_telemetry(str(tmp_path / 'run.csv'))
+    assert written['t'].tolist() == list(range(10))
+    assert np.all(written['departures'] == 2)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from etm_evs.model import EtmEVsModel
+from etm_evs.time_parallel import time_parallel, windows
+
+
+@pytest.fixture
+def params(make_params):
+    return make_params(6, n_evs=200, steps=144, seed=3, tick_minutes=60)
+
+def weekend_flags(params):
+    model = EtmEVsModel(params)
+    model.sim_setup()
+    flags = []
+    while model.running:
+        model.sim_step()
+        flags.append(model.weekend)
+    return flags
+
+def test_windows():
+    assert windows(10, 4, 2) == [(0, 4, 0), (2, 6, 2), (6, 4, 2)]
+    assert windows(8, 4, 0) == [(0, 4, 0), (4, 4, 0)]
+
+def test_start_tick_shifts_the_calendar(params):
+    serial = weekend_flags(dict(params, steps=24 * 14))
+    for days in [3, 5, 6]:
+        assert weekend_flags(dict(params, steps=24 * 7, start_tick=24 * days)) == serial[24 * days:24 * (days + 7)]
+    with pytest.raises(ValueError):
+        EtmEVsModel(dict(params, start_tick=5)).sim_setup()
+    with pytest.raises(ValueError):
+        EtmEVsModel(dict(params, start_tick=24, warm_start='steady_state')).sim_setup()
+
+def test_windows_follow_the_serial_run(params, run):
+    model = run(params)
+    reporters, series = time_parallel(params, 72, 48)
+    assert len(series['list_average_battery_percentage']) == 145
+    assert len(series['list_total_current_power_demand']) == 144
+    # the first window is the serial run
+    assert series['list_total_current_power_demand'][:72] == model.list_total_current_power_demand[:72]
+    assert np.mean(np.equal(series['list_total_current_power_demand'], model.list_total_current_power_demand)) > 0.9
+    for name, value in reporters.items():
+        assert value == pytest.approx(model.reporters[name], rel=0.05), name
+    assert time_parallel(params, 72, 48, n_jobs=2)[1] == series
+    with pytest.raises(ValueError):
+        time_parallel(params, 72, 30)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+from etm_evs.variance_reduction import DESIGNS, design_profiles, variance_reduction
+
+
+def test_design_profiles_share_seeds_only_with_crn():
+    profiles = design_profiles({'seed': 10}, [{'p_smart': 0}, {'p_smart': 1}], 3)
+    assert len(profiles) == len(DESIGNS) * 2 * 3
+    for design in DESIGNS:
+        runs = [p for p in profiles if p['design'] == design]
+        seeds = {(p['scenario'], p['replicate']): (p['seed'], p['replicate']) for p in runs}
+        if 'crn' in design:
+            assert seeds[0, 1] == seeds[1, 1] != seeds[0, 2]
+        else:
+            assert len({p['seed'] for p in runs}) == 6
+
+def test_variance_reduction_of_common_noise():
+    rng = np.random.default_rng(0)
+    rows = []
+    for design in ['independent', 'crn']:
+        for replicate in range(200):
+            common = rng.normal(0, 1)
+            for scenario in range(2):
+                noise = common if design == 'crn' else rng.normal(0, 1)
+                rows.append({'design': design, 'scenario': scenario, 'replicate': replicate,
+                             'mean_power_demand': 10 * scenario + noise + rng.normal(0, 0.1)})
+    table = variance_reduction(pd.DataFrame(rows), ['mean_power_demand']).set_index('design')
+    assert table.loc['independent', 'difference_reduction'] == 1
+    # the scenario variance stays, the variance of the difference drops from 2 to 0.02
+    assert 0.7 < table.loc['crn', 'reduction'] < 1.4
+    assert table.loc['crn', 'difference_reduction'] > 50
+    assert abs(table.loc['crn', 'mean'] - 5) < 0.3
@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import pytest
+from etm_evs.event_log import read_events
+from etm_evs.warm_start import SteadyStateLibrary, fleet_key
+
+
+@pytest.fixture
+def library(params, tmp_path, run):
+    root = str(tmp_path / 'steady_state')
+    run(dict(params, steps=168, save_steady_state=root))
+    return root
+
+def test_steady_state_library(params, library, run):
+    assert len(os.listdir(library)) == 1
+    state, _ = SteadyStateLibrary(library, params, params['data']).load()
+    assert len(state['location']) == 200
+    assert np.all((state['battery'] > 0) & (state['battery'] <= 1))
+    # the nearest scenario within the tolerance, the fleet must be the same
+    assert SteadyStateLibrary(library, dict(params, p_smart=0.6), params['data']).load() is not None
+    assert SteadyStateLibrary(library, dict(params, p_smart=0.9), params['data']).load() is None
+    assert fleet_key(dict(params, l_vol=params['l_vol'] + 1), params['data']) != fleet_key(params, params['data'])
+    assert fleet_key(dict(params, n_evs=5000, p_smart=0.1), params['data']) == fleet_key(params, params['data'])
+    with pytest.raises(ValueError):
+        run(dict(params, steps=100, save_steady_state=library))
+
+def test_warm_start_is_near_steady_state(params, library, run):
+    cold = run(params)
+    warm = run(dict(params, n_evs=300, warm_start=library))
+    assert warm.reporters['warm_started']
+    assert warm.number_evs == 300
+    assert warm.list_average_battery_percentage[0] < 100
+    # the first day of a warm start is closer to the second week of the reference run than a cold start
+    reference = run(dict(params, steps=264))
+    steady = np.mean(reference.list_average_battery_percentage[-96:])
+    assert abs(np.mean(warm.list_average_battery_percentage) - steady) < \
+        abs(np.mean(cold.list_average_battery_percentage) - steady)
+
+def test_warm_start_with_kernels_and_event_log(params, library, tmp_path, run):
+    warm = dict(params, warm_start=library)
+    agents = run(warm)
+    kernels = run(dict(warm, kernels=True))
+    assert kernels.reporters == agents.reporters
+    assert kernels.output.variables['Municipality'].fillna(-1).equals(
+        agents.output.variables['Municipality'].fillna(-1))
+    logged = run(dict(warm, event_log=str(tmp_path / 'events')))
+    assert logged.list_total_current_power_demand == agents.list_total_current_power_demand
+    assert len(read_events(str(tmp_path / 'events' / 'run'), 'trips')) > 0
+
+def test_cold_start_without_a_steady_state(params, tmp_path, run):
+    model = run(dict(params, warm_start=str(tmp_path)))
+    assert not model.reporters['warm_started']
+    assert model.list_total_current_power_demand == run(params).list_total_current_power_demand
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from etm_evs.fanout import fanout_reporters
+from etm_evs.model import EtmEVsModel
+from etm_evs.warmup import batch_means, detect_warmup, mser
+
+
+@pytest.fixture
+def params(make_params):
+    return make_params(n_evs=20, steps=168, tick_minutes=60)
+
+def test_mser_truncates_the_transient():
+    rng = np.random.default_rng(0)
+    days = np.arange(30)
+    values = np.repeat(50 + 40 * np.exp(-days / 2) + rng.normal(0, 0.5, len(days)), 24)
+    truncation, statistic = mser(values, 24)
+    assert len(statistic) == 16
+    assert truncation % 24 == 0 and 5 <= truncation // 24 <= 12
+
+def test_detect_warmup_converges_only_after_the_margin():
+    rng = np.random.default_rng(1)
+    stationary = rng.normal(10, 1, 24 * 21)
+    settling = np.concatenate([np.linspace(30, 10, 24 * 3), rng.normal(10, 1, 24 * 18)])
+    warmup, converged = detect_warmup([stationary, settling], 24)
+    assert converged and 3 * 24 <= warmup <= 5 * 24
+    trend = np.arange(24 * 21, dtype=float)
+    assert detect_warmup([stationary, trend], 24) == (10 * 24, False)
+    assert np.allclose(batch_means(np.arange(5), 2), [0.5, 2.5])
+
+def test_fixed_warmup_and_horizon(params):
+    model = EtmEVsModel(dict(params, warmup=24, horizon=48))
+    model.run(display=False)
+    assert model.t == 72
+    assert model.reporters['warmup_length'] == 24 and model.reporters['warmup_horizon'] == 48
+    assert model.reporters['mean_power_demand'] == np.mean(model.list_total_current_power_demand[23:71])
+    assert model.reporters['min_average_battery_percentage'] == min(model.list_average_battery_percentage[24:72])
+
+def test_auto_warmup_stops_after_the_horizon(params):
+    model = EtmEVsModel(dict(params, steps=24 * 28, warmup='auto', horizon=24,
+                             fanout={'VTG_percentage': [params['VTG_percentage']]}))
+    model.run(display=False)
+    length = model.reporters['warmup_length']
+    assert model.reporters['warmup_converged']
+    assert length % 24 == 0 and 0 < length <= 24 * 14
+    # accepted at the end of a day, the horizon had already passed
+    assert model.t % 24 == 0 and length + 24 <= model.t < 24 * 28
+    assert model.reporters['mean_power_demand'] == \
+        np.mean(model.list_total_current_power_demand[length - 1:length + 23])
+    # fanout outcomes are reported over the same ticks
+    assert fanout_reporters(model)[0]['mean_VTG_capacity'] == model.reporters['mean_VTG_capacity']
+
+def test_unconverged_run_reports_last_estimate(params):
+    model = EtmEVsModel(dict(params, steps=24 * 8, warmup='auto', horizon=24))
+    model.run(display=False)
+    assert model.t == 24 * 8
+    assert not model.reporters['warmup_converged'] and model.reporters['warmup_length'] <= 24 * 4
+
+def test_without_warmup_reporters_are_unchanged(params):
+    model = EtmEVsModel(params)
+    model.run(display=False)
+    assert 'warmup_length' not in model.reporters
+    assert model.reporters['mean_power_demand'] == np.mean(model.list_total_current_power_demand)